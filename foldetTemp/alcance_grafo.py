@@ -0,0 +1,243 @@
+######################################################################
+# Programa   : alcance_grafo.py                                      #
+# Descripción: Análisis de impacto sobre el grafo de llamadas        #
+#              (--impact y --graph-report en analizar_lua.py).       #
+#                                                                    #
+#              A partir del IndiceGrafo calcula una sola vez las     #
+#              componentes fuertemente conexas (Tarjan iterativo),   #
+#              el DAG condensado y, por cada componente, el conjunto #
+#              de componentes alcanzables hacia adelante y hacia     #
+#              atrás como bitsets (enteros de Python: un bit por     #
+#              componente). Con eso "¿A llega a B?" es un AND de     #
+#              bits y los ancestros o descendientes de un bloque se  #
+#              obtienen sin recorrer el grafo.                       #
+#                                                                    #
+#              También informa los ciclos, los bloques raíz (sin     #
+#              llamadores) y los bloques locales muertos (a los que  #
+#              no se llega desde ninguna raíz o entrada).            #
+######################################################################
+
+
+def _posiciones(bits):
+    ''' Posiciones de los bits en 1 de 'bits', de menor a mayor '''
+    texto = bin(bits)[:1:-1]
+    posicion = texto.find('1')
+    while posicion != -1:
+        yield posicion
+        posicion = texto.find('1', posicion + 1)
+
+
+def componentes_fuertes(sucesores):
+    '''
+    Tarjan sin recursión sobre listas de adyacencia por id.
+    Retorna (componente de cada nodo, nodos de cada componente). Las
+    componentes quedan en orden topológico inverso: toda arista entre
+    componentes va de una de id mayor a una de id menor.
+    '''
+    cantidad = len(sucesores)
+    orden = [-1] * cantidad
+    bajo = [0] * cantidad
+    en_pila = [False] * cantidad
+    pila = []
+    componente = [-1] * cantidad
+    miembros = []
+    contador = 0
+
+    for raiz in range(cantidad):
+        if orden[raiz] != -1:
+            continue
+        orden[raiz] = bajo[raiz] = contador
+        contador = contador + 1
+        pila.append(raiz)
+        en_pila[raiz] = True
+        # Llamadas pendientes como [nodo, próximo sucesor a visitar]
+        llamadas = [[raiz, 0]]
+        while llamadas:
+            llamada = llamadas[-1]
+            nodo, posicion = llamada
+            vecinos = sucesores[nodo]
+            if posicion < len(vecinos):
+                llamada[1] = posicion + 1
+                vecino = vecinos[posicion]
+                if orden[vecino] == -1:
+                    orden[vecino] = bajo[vecino] = contador
+                    contador = contador + 1
+                    pila.append(vecino)
+                    en_pila[vecino] = True
+                    llamadas.append([vecino, 0])
+                elif en_pila[vecino] and orden[vecino] < bajo[nodo]:
+                    bajo[nodo] = orden[vecino]
+                continue
+
+            llamadas.pop()
+            if llamadas and bajo[nodo] < bajo[llamadas[-1][0]]:
+                bajo[llamadas[-1][0]] = bajo[nodo]
+            if bajo[nodo] == orden[nodo]:
+                id_componente = len(miembros)
+                grupo = []
+                while True:
+                    miembro = pila.pop()
+                    en_pila[miembro] = False
+                    componente[miembro] = id_componente
+                    grupo.append(miembro)
+                    if miembro == nodo:
+                        break
+                miembros.append(grupo)
+
+    return componente, miembros
+
+
+class AlcanceGrafo():
+
+    def __init__(self, indice):
+        '''
+        indice (IndiceGrafo) -> índice del grafo de llamadas. Si el índice
+                                cambia (aplicar_cambios) hay que volver a
+                                crear el AlcanceGrafo.
+        '''
+        self.indice = indice
+        self.componente, self.miembros = componentes_fuertes(indice.sucesores)
+        cant_componentes = len(self.miembros)
+
+        # DAG condensado: aristas entre componentes distintas, sin repetidos
+        self.sucesores_dag = [set() for _ in range(cant_componentes)]
+        self.predecesores_dag = [set() for _ in range(cant_componentes)]
+        self._con_ciclo = [len(grupo) > 1 for grupo in self.miembros]
+        for origen, destino in indice.aristas:
+            c_origen, c_destino = self.componente[origen], self.componente[destino]
+            if c_origen == c_destino:
+                self._con_ciclo[c_origen] = True
+            else:
+                self.sucesores_dag[c_origen].add(c_destino)
+                self.predecesores_dag[c_destino].add(c_origen)
+
+        # Bitsets de alcance (incluyen a la propia componente). Los sucesores
+        # de una componente tienen id menor, así que ya están calculados.
+        self.descendientes_bits = [0] * cant_componentes
+        for id_componente in range(cant_componentes):
+            bits = 1 << id_componente
+            for sucesor in self.sucesores_dag[id_componente]:
+                bits |= self.descendientes_bits[sucesor]
+            self.descendientes_bits[id_componente] = bits
+
+        self.ancestros_bits = [0] * cant_componentes
+        for id_componente in reversed(range(cant_componentes)):
+            bits = 1 << id_componente
+            for predecesor in self.predecesores_dag[id_componente]:
+                bits |= self.ancestros_bits[predecesor]
+            self.ancestros_bits[id_componente] = bits
+
+    def _nodos(self, bitsets, id_componente):
+        '''
+        Nombres (ordenados) de los nodos de las componentes alcanzadas desde
+        'id_componente' según 'bitsets'. La propia componente solo se incluye
+        si es un ciclo: todos sus bloques tienen el mismo resultado.
+        '''
+        bits = bitsets[id_componente]
+        if not self._con_ciclo[id_componente]:
+            bits &= ~(1 << id_componente)
+        nombres = self.indice.nombres
+        return sorted(nombres[nodo] for id_alcanzada in _posiciones(bits) for nodo in self.miembros[id_alcanzada])
+
+    def alcanza(self, origen, destino):
+        ''' True si el bloque 'origen' llega a 'destino' (nombres normalizados) llamando bloques '''
+        ids = self.indice.ids
+        if (origen not in ids) or (destino not in ids):
+            return False
+        c_origen, c_destino = self.componente[ids[origen]], self.componente[ids[destino]]
+        if c_origen == c_destino:
+            return (origen != destino) or self._con_ciclo[c_origen]
+        return bool(self.descendientes_bits[c_origen] >> c_destino & 1)
+
+    def ancestros(self, nombre):
+        ''' Bloques que llegan a 'nombre' (normalizado). None si no está en el grafo '''
+        id_nodo = self.indice.ids.get(nombre)
+        if id_nodo is None:
+            return None
+        return self._nodos(self.ancestros_bits, self.componente[id_nodo])
+
+    def descendientes(self, nombre):
+        ''' Bloques a los que llega 'nombre' (normalizado). None si no está en el grafo '''
+        id_nodo = self.indice.ids.get(nombre)
+        if id_nodo is None:
+            return None
+        return self._nodos(self.descendientes_bits, self.componente[id_nodo])
+
+    def ciclos(self):
+        ''' Bloques de cada ciclo (componentes con más de un bloque o que se llaman a sí mismas) '''
+        nombres = self.indice.nombres
+        return sorted(sorted(nombres[nodo] for nodo in self.miembros[id_componente])
+                      for id_componente, con_ciclo in enumerate(self._con_ciclo) if con_ciclo)
+
+    def definidos(self):
+        ''' Bloques definidos en el inventario (sin PHONE_NUMBER y demás extendidos) '''
+        return sorted(self.indice.definidos())
+
+    def raices(self):
+        ''' Bloques definidos a los que no llama ningún otro bloque '''
+        ids = self.indice.ids
+        predecesores = self.indice.predecesores
+        return [nombre for nombre in self.definidos()
+                if (nombre not in ids) or all(llamador == ids[nombre] for llamador in predecesores[ids[nombre]])]
+
+    def bloques_muertos(self, entradas=None):
+        '''
+        Bloques definidos a los que no se llega desde ninguna entrada.
+
+        entradas (list) -> nombres normalizados de los bloques de entrada.
+                           None = las raíces (bloques sin llamadores): quedan
+                           muertos los ciclos a los que nadie llama y lo que
+                           solo se llama desde ellos.
+        '''
+        if entradas is None:
+            entradas = self.raices()
+        ids = self.indice.ids
+        entradas = set(entradas)
+        alcanzados = 0
+        for nombre in entradas:
+            if nombre in ids:
+                alcanzados |= self.descendientes_bits[self.componente[ids[nombre]]]
+        return [nombre for nombre in self.definidos() if nombre not in entradas
+                and ((nombre not in ids) or not (alcanzados >> self.componente[ids[nombre]] & 1))]
+
+    def impacto(self, bloques):
+        '''
+        Consulta en lote: un resultado (dict) por cada bloque de 'bloques'
+        (nombres sin parámetros, como en -m y -r) con los bloques que lo
+        llaman directa o indirectamente, las raíces afectadas si cambia y
+        los bloques que llama.
+        '''
+        raices = set(self.raices())
+        # Los bloques de una misma componente comparten el resultado
+        por_componente = {}
+        resultados = []
+        for bloque in bloques:
+            resultado = {'bloque': bloque}
+            id_nodo = self.indice.ids.get(bloque + '(...)')
+            if id_nodo is None:
+                resultado['error'] = 'Bloque inexistente'
+                resultados.append(resultado)
+                continue
+            id_componente = self.componente[id_nodo]
+            if id_componente not in por_componente:
+                llamadores = self._nodos(self.ancestros_bits, id_componente)
+                por_componente[id_componente] = {
+                    'en_ciclo': self._con_ciclo[id_componente],
+                    'llamadores': llamadores,
+                    'raices_afectadas': [llamador for llamador in llamadores if llamador in raices],
+                    'llamados': self._nodos(self.descendientes_bits, id_componente),
+                }
+            resultado.update(por_componente[id_componente])
+            resultados.append(resultado)
+        return resultados
+
+    def informe(self, entradas=None):
+        ''' Resumen: componentes, ciclos, raíces y bloques locales muertos '''
+        return {
+            'nodos': len(self.indice.nombres),
+            'aristas': len(self.indice.aristas),
+            'componentes': len(self.miembros),
+            'ciclos': self.ciclos(),
+            'raices': self.raices(),
+            'bloques_muertos': self.bloques_muertos(entradas),
+        }
@@ -0,0 +1,244 @@
+######################################################################
+# Programa   : almacen_sqlite.py                                     #
+# Descripción: Inventarios de bloques en una base SQLite local       #
+#              (--db en analizar_lua.py).                            #
+#                                                                    #
+#              Guarda bloques, interprets, queries, casos de prueba  #
+#              y aristas "bloque" -> "bloque llamado" de todos los   #
+#              archivos, con índices por nombre de bloque, nombre    #
+#              normalizado, archivo y extremos de las aristas, para  #
+#              consultar entre archivos sin cargar cada inventario   #
+#              JSON.                                                 #
+#                                                                    #
+#              Cada archivo se reemplaza completo (upsert) solo si   #
+#              cambió su tamaño o mtime, y se borra cuando ya no     #
+#              existe. Los archivos se guardan con su path absoluto. #
+######################################################################
+import os
+import sqlite3
+from itertools import groupby
+
+from registros_terrier import Bloque
+from indice_grafo import normalizar_nombre
+
+
+ESQUEMA = '''
+CREATE TABLE IF NOT EXISTS archivos (
+    id          INTEGER PRIMARY KEY,
+    path        TEXT NOT NULL UNIQUE,
+    size        INTEGER NOT NULL,
+    mtime_ns    INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bloques (
+    id          INTEGER PRIMARY KEY,
+    archivo_id  INTEGER NOT NULL REFERENCES archivos(id) ON DELETE CASCADE,
+    orden       INTEGER NOT NULL,
+    nombre      TEXT NOT NULL,
+    normalizado TEXT NOT NULL,
+    lin_inicio  INTEGER NOT NULL,
+    lin_fin     INTEGER,
+    hash        TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS interprets (
+    id           INTEGER PRIMARY KEY,
+    bloque_id    INTEGER NOT NULL REFERENCES bloques(id) ON DELETE CASCADE,
+    orden        INTEGER NOT NULL,
+    raw_string   TEXT NOT NULL,
+    terrier_expr TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS queries (
+    bloque_id   INTEGER NOT NULL REFERENCES bloques(id) ON DELETE CASCADE,
+    orden       INTEGER NOT NULL,
+    query       TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tests (
+    bloque_id          INTEGER NOT NULL REFERENCES bloques(id) ON DELETE CASCADE,
+    orden              INTEGER NOT NULL,
+    test_input         TEXT NOT NULL,
+    test_expected      TEXT NOT NULL,
+    lin_inicio         INTEGER NOT NULL,
+    lin_fin            INTEGER NOT NULL,
+    delta_request_info INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS aristas (
+    interpret_id INTEGER NOT NULL REFERENCES interprets(id) ON DELETE CASCADE,
+    orden        INTEGER NOT NULL,
+    origen       TEXT NOT NULL,
+    destino      TEXT NOT NULL,
+    llamado      TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS bloques_nombre ON bloques(nombre);
+CREATE INDEX IF NOT EXISTS bloques_normalizado ON bloques(normalizado);
+CREATE INDEX IF NOT EXISTS bloques_archivo ON bloques(archivo_id, orden);
+CREATE INDEX IF NOT EXISTS interprets_bloque ON interprets(bloque_id, orden);
+CREATE INDEX IF NOT EXISTS queries_bloque ON queries(bloque_id, orden);
+CREATE INDEX IF NOT EXISTS tests_bloque ON tests(bloque_id, orden);
+CREATE INDEX IF NOT EXISTS aristas_interpret ON aristas(interpret_id, orden);
+CREATE INDEX IF NOT EXISTS aristas_origen ON aristas(origen);
+CREATE INDEX IF NOT EXISTS aristas_destino ON aristas(destino);
+'''
+
+
+# Versión del esquema (PRAGMA user_version). Una base de otra versión se
+# vacía y se vuelve a cargar. 2: tabla tests. 3: hash de los bloques.
+# 4: paths absolutos.
+VERSION_ESQUEMA = 4
+TABLAS = ('aristas', 'tests', 'queries', 'interprets', 'bloques', 'archivos')
+
+
+class AlmacenInventario():
+
+    def __init__(self, path):
+        ''' path (str) -> archivo de la base SQLite (se crea si no existe) '''
+        self.path = path
+        self.conexion = sqlite3.connect(path)
+        self.conexion.execute('PRAGMA foreign_keys = ON')
+        self.conexion.execute('PRAGMA journal_mode = WAL')
+        if self.conexion.execute('PRAGMA user_version').fetchone()[0] != VERSION_ESQUEMA:
+            with self.conexion:
+                for tabla in TABLAS:
+                    self.conexion.execute(f'DROP TABLE IF EXISTS {tabla}')
+        self.conexion.executescript(ESQUEMA)
+        self.conexion.execute(f'PRAGMA user_version = {VERSION_ESQUEMA}')
+
+    def cerrar(self):
+        self.conexion.close()
+
+    def vigente(self, archi):
+        ''' True si 'archi' está guardado con su tamaño y mtime actuales '''
+        archi = os.path.abspath(archi)
+        stat = os.stat(archi)
+        fila = self.conexion.execute('SELECT size, mtime_ns FROM archivos WHERE path = ?', (archi,)).fetchone()
+        return fila == (stat.st_size, stat.st_mtime_ns)
+
+    def guardar_archivo(self, archi, bloques):
+        '''
+        Reemplaza el inventario de 'archi' (lista de Bloque) en una única
+        transacción. Los bloques, interprets, queries y aristas anteriores
+        se borran en cascada.
+        '''
+        archi = os.path.abspath(archi)
+        stat = os.stat(archi)
+        with self.conexion:
+            cursor = self.conexion.cursor()
+            cursor.execute('DELETE FROM archivos WHERE path = ?', (archi,))
+            cursor.execute('INSERT INTO archivos (path, size, mtime_ns) VALUES (?, ?, ?)',
+                           (archi, stat.st_size, stat.st_mtime_ns))
+            archivo_id = cursor.lastrowid
+            for orden, bloque in enumerate(bloques):
+                normalizado = normalizar_nombre(bloque.block_name)
+                cursor.execute(
+                    'INSERT INTO bloques (archivo_id, orden, nombre, normalizado, lin_inicio, lin_fin, hash) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (archivo_id, orden, bloque.block_name, normalizado, bloque.block_lin_nro.start, bloque.block_lin_nro.end,
+                     bloque.block_hash))
+                bloque_id = cursor.lastrowid
+                cursor.executemany('INSERT INTO queries (bloque_id, orden, query) VALUES (?, ?, ?)',
+                                   [(bloque_id, nro, query) for nro, query in enumerate(bloque.queries)])
+                cursor.executemany(
+                    'INSERT INTO tests (bloque_id, orden, test_input, test_expected, lin_inicio, lin_fin, delta_request_info) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    [(bloque_id, nro, caso.test_input, caso.test_expected, caso.test_lin_nro.start, caso.test_lin_nro.end,
+                      int(caso.delta_request_info)) for nro, caso in enumerate(bloque.tests)])
+                for nro, interpret in enumerate(bloque.interprets):
+                    cursor.execute('INSERT INTO interprets (bloque_id, orden, raw_string, terrier_expr) VALUES (?, ?, ?, ?)',
+                                   (bloque_id, nro, interpret.raw_string, interpret.terrier_expr))
+                    interpret_id = cursor.lastrowid
+                    cursor.executemany(
+                        'INSERT INTO aristas (interpret_id, orden, origen, destino, llamado) VALUES (?, ?, ?, ?, ?)',
+                        [(interpret_id, nro_arista, normalizado, normalizar_nombre(llamado), llamado)
+                         for nro_arista, llamado in enumerate(interpret.blocks_usados)])
+
+    def borrar_archivo(self, archi):
+        with self.conexion:
+            self.conexion.execute('DELETE FROM archivos WHERE path = ?', (os.path.abspath(archi),))
+
+    def purgar(self, directorio):
+        ''' Borra los archivos guardados dentro de 'directorio' que ya no existen. Retorna sus paths '''
+        prefijo = os.path.join(os.path.abspath(directorio), '')
+        borrados = [archi for archi in self.archivos() if archi.startswith(prefijo) and not os.path.exists(archi)]
+        for archi in borrados:
+            self.borrar_archivo(archi)
+        return borrados
+
+    def archivos(self):
+        return [fila[0] for fila in self.conexion.execute('SELECT path FROM archivos ORDER BY path')]
+
+    def bloques(self, archi=None):
+        '''
+        Generador de los bloques (dict, como en el inventario JSON) de 'archi'
+        o de todos los archivos, en el orden en que fueron inventariados.
+        '''
+        sql = '''SELECT b.id, b.nombre, a.path, b.lin_inicio, b.lin_fin, b.hash
+                 FROM bloques b JOIN archivos a ON a.id = b.archivo_id'''
+        parametros = ()
+        if archi is not None:
+            sql = sql + ' WHERE a.path = ?'
+            parametros = (os.path.abspath(archi),)
+        sql = sql + ' ORDER BY a.path, b.orden'
+        for bloque_id, nombre, path, inicio, fin, hash_bloque in self.conexion.execute(sql, parametros).fetchall():
+            interprets = []
+            for interpret_id, raw_string, terrier_expr in self.conexion.execute(
+                    'SELECT id, raw_string, terrier_expr FROM interprets WHERE bloque_id = ? ORDER BY orden', (bloque_id,)):
+                llamados = [fila[0] for fila in self.conexion.execute(
+                    'SELECT llamado FROM aristas WHERE interpret_id = ? ORDER BY orden', (interpret_id,))]
+                interprets.append({'raw_string': raw_string, 'terrier_expr': terrier_expr, 'blocks_usados': llamados})
+            yield {
+                'block_name': nombre,
+                'block_at_file': path,
+                'block_lin_nro': {'start': inicio, 'end': fin},
+                'interprets': interprets,
+                'queries': self._queries(bloque_id),
+                'tests': self._tests(bloque_id),
+                'block_hash': hash_bloque,
+            }
+
+    def inventario(self, archi):
+        ''' Lista de Bloque de 'archi' '''
+        return [Bloque.desde_dict(bloque) for bloque in self.bloques(archi)]
+
+    def _queries(self, bloque_id):
+        return [fila[0] for fila in self.conexion.execute(
+            'SELECT query FROM queries WHERE bloque_id = ? ORDER BY orden', (bloque_id,))]
+
+    def _tests(self, bloque_id):
+        sql = '''SELECT test_input, test_expected, lin_inicio, lin_fin, delta_request_info
+                 FROM tests WHERE bloque_id = ? ORDER BY orden'''
+        return [{'test_input': test_input, 'test_expected': test_expected, 'test_lin_nro': {'start': inicio, 'end': fin},
+                 'delta_request_info': bool(delta)}
+                for test_input, test_expected, inicio, fin, delta in self.conexion.execute(sql, (bloque_id,))]
+
+    def queries_por_bloque(self):
+        ''' Generador de (nombre de bloque, lista de queries), sin leer interprets '''
+        sql = '''SELECT b.id, b.nombre, q.query
+                 FROM bloques b JOIN archivos a ON a.id = b.archivo_id
+                 LEFT JOIN queries q ON q.bloque_id = b.id
+                 ORDER BY a.path, b.orden, q.orden'''
+        for (_, nombre), filas in groupby(self.conexion.execute(sql), key=lambda fila: fila[:2]):
+            yield nombre, [query for _, _, query in filas if query is not None]
+
+    def llamados_primer_interpret(self):
+        ''' Generador de (nombre de bloque, bloques llamados en su primer interpret, queries) '''
+        sql = '''SELECT b.id, b.nombre, i.id
+                 FROM bloques b JOIN archivos a ON a.id = b.archivo_id
+                 LEFT JOIN interprets i ON i.bloque_id = b.id AND i.orden = 0
+                 ORDER BY a.path, b.orden'''
+        for bloque_id, nombre, interpret_id in self.conexion.execute(sql).fetchall():
+            llamados = [fila[0] for fila in self.conexion.execute(
+                'SELECT llamado FROM aristas WHERE interpret_id = ? ORDER BY orden', (interpret_id,))]
+            yield nombre, llamados, self._queries(bloque_id)
+
+    def buscar_bloque(self, nombre):
+        ''' Archivos y líneas dónde se define el bloque 'nombre' (sin parámetros) '''
+        sql = '''SELECT b.nombre, a.path, b.lin_inicio, b.lin_fin
+                 FROM bloques b JOIN archivos a ON a.id = b.archivo_id
+                 WHERE b.normalizado = ?'''
+        return self.conexion.execute(sql, (nombre + '(...)',)).fetchall()
+
+    def llamadores(self, nombre):
+        ''' Bloques (de cualquier archivo) que llaman a 'nombre' (sin parámetros) '''
+        sql = 'SELECT DISTINCT origen FROM aristas WHERE destino = ? ORDER BY origen'
+        return [fila[0] for fila in self.conexion.execute(sql, (nombre + '(...)',))]
+
+    def llamados(self, nombre):
+        ''' Bloques llamados por 'nombre' (sin parámetros) '''
+        sql = 'SELECT DISTINCT destino FROM aristas WHERE origen = ? ORDER BY destino'
+        return [fila[0] for fila in self.conexion.execute(sql, (nombre + '(...)',))]
@@ -29,7 +29,10 @@
 #Argumentos:                                                         #
 #  -h, --help            show this help message and exit             #
 #  -i INPUT_FILE, --input-file INPUT_FILE                            #
-#                        Archivo lua.ter a leer.                     #
+#                        Archivo lua.ter a leer. Acepta también un   #
+#                        directorio o un glob ('dom/*.lua.ter').     #
+#                        El inventario combinado se graba dentro     #
+#                        del directorio ('dom/dom_inventario.json'). #
 #  -g, --graph           Graficar relación                           #
 #                        Bloque_A->llama a-> Bloque_B                #
 #  -l, --local-blocks    Graficar solo bloques locales del Dominio.  #
@@ -40,7 +43,81 @@
 #                        Para múltples bloques separar con comas.    #
 #  -r REVERSE_PATH_BLOCK, --reverse-path-block REVERSE_PATH_BLOCK    #
 #                        Bloque origen del camino inverso.           #
-#  -d, --debug           Imprimir Log DEBUG                          #
+#  -d, --debug           Imprimir Log DEBUG y grabar la traza de     #
+#                        eventos del inventario.                     #
+#  --trace-file TRACE_FILE                                           #
+#                        Archivo de la traza (JSON Lines).           #
+#  -w WORKERS, --workers WORKERS                                     #
+#                        Procesos para inventariar varios archivos   #
+#                        (directorio o glob en -i).                  #
+#  -s, --split           Divide el archivo en tramos (por bloque) y  #
+#                        los procesa en paralelo con --workers.      #
+#                        Solo con un único lua.ter, sin cache.       #
+#  -f {json,jsonl,snap}, --format {json,jsonl,snap}                  #
+#                        Formato del inventario. 'jsonl' graba cada  #
+#                        bloque a medida que se procesa; 'snap' es   #
+#                        un snapshot binario de carga rápida (ver    #
+#                        snapshot_inventario.py).                    #
+#  --offsets             Interprets como offsets en el archivo.      #
+#                        Solo con un único lua.ter, sin cache ni     #
+#                        tramos.                                     #
+#  -q {callers,callees}, --query {callers,callees}                   #
+#                        Consulta de caminos sin Graphviz desde los  #
+#                        bloques de --query-blocks (B1,B2,...).      #
+#  --depth DEPTH         Profundidad máxima de la consulta.          #
+#  --query-format {json,dot}                                         #
+#  --query-output QUERY_OUTPUT                                       #
+#                        Archivo del resultado de la consulta.       #
+#  --impact IMPACT       Bloques que llegan (directa o indirecta-    #
+#                        mente) a cada bloque y raíces afectadas.    #
+#  --graph-report        Ciclos, raíces y bloques locales muertos.   #
+#  --entry-blocks ENTRY_BLOCKS                                       #
+#                        Entradas para los bloques muertos.          #
+#  --impact-output IMPACT_OUTPUT                                     #
+#                        Archivo JSON de --impact/--graph-report.    #
+#  --diff DIFF           Versión anterior (lua.ter o inventario) a   #
+#                        comparar con -i: bloques y aristas          #
+#                        agregados, quitados y modificados.          #
+#  --diff-output DIFF_OUTPUT                                         #
+#                        Archivo JSON de las diferencias.            #
+#  --diff-graph          Grafica solo el vecindario de los cambios.  #
+#  --diff-depth DIFF_DEPTH                                           #
+#                        Saltos de vecinos en --diff-graph.          #
+#  --gv-only             Solo graba los .gv (sin layout).            #
+#  --render-formats RENDER_FORMATS                                   #
+#                        Formatos de imagen (png,svg,...).           #
+#  --render-workers RENDER_WORKERS                                   #
+#                        Gráficos renderizados a la vez.             #
+#  --render-timeout RENDER_TIMEOUT                                   #
+#                        Segundos de layout máximos por gráfico.     #
+#  --render-fallback RENDER_FALLBACK                                 #
+#                        Motor para grafos grandes (sfdp).           #
+#  --render-max-nodes RENDER_MAX_NODES                               #
+#                        Nodos desde los que se usa el fallback.     #
+#  --partition {auto,none,components,files,local}                    #
+#                        Renderiza el gráfico general por partes     #
+#                        (componentes, archivos o locales/externos)  #
+#                        con un gráfico resumen que las enlaza.      #
+#  --partition-max-nodes PARTITION_MAX_NODES                         #
+#                        Nodos desde los que se parte con 'auto'.    #
+#  --render-cache RENDER_CACHE                                       #
+#                        Directorio del cache de imágenes.           #
+#  --render-cache-max-mb RENDER_CACHE_MAX_MB                         #
+#                        Tamaño máximo del cache de imágenes en MB.  #
+#  --cache-dir CACHE_DIR Directorio del cache de inventarios.        #
+#  --cache-max-mb CACHE_MAX_MB                                       #
+#                        Tamaño máximo del cache en MB.              #
+#  --db DB               Base SQLite de inventarios (incremental).   #
+#  --serve [SERVE]       Modo servidor de consultas (HOST:PUERTO o   #
+#                        unix:PATH). Ver servidor_consultas.py.      #
+#  --serve-interval SERVE_INTERVAL                                   #
+#                        Segundos entre revisiones de archivos.      #
+#  --watch               Vigila los archivos y actualiza inventario  #
+#                        y grafos ante cada cambio.                  #
+#  --watch-delay WATCH_DELAY                                         #
+#                        Segundos que agrupan ráfagas de cambios.    #
+#  --stats [STATS]       Tiempos y contadores por fase (log o JSON). #
+#  --profile PROFILE     Fase/s a perfilar con cProfile/tracemalloc. #
 #                                                                    #
 # Versión    : 1.2.0                                                 #
 # Autor      : Sergio Vigo                                           #
@@ -48,28 +125,263 @@
 ######################################################################
 import os
 import sys
+import io
 import re
-import pprint as pp
+import mmap
+import locale
+import glob
+from functools import partial
 import json
-import copy
 from collections import OrderedDict
 import logging
-import pygraphviz as pgv
-import networkx as nx
-from networkx.drawing.nx_pydot import read_dot, write_dot
 import argparse
 
-# Librería para debugging
-import pdb
-
+from cache_inventario import CacheInventario
+from registros_terrier import Bloque, Interpret, RangoLineas, FuenteTerrier, CasoPrueba
+from inventario_io import linea_jsonl, leer_inventario, es_base_sqlite, es_snapshot
+from indice_grafo import IndiceGrafo, resultado_a_dot
+from alcance_grafo import AlcanceGrafo
+from render_grafos import OpcionesRender, TrabajoRender, CacheRender, renderizar_trabajos
+from estadisticas import Estadisticas, SIN_ESTADISTICAS, FASES
+from traza import Traza
+
+# pygraphviz, networkx, el pool de procesos y los módulos de --serve, --db,
+# --watch y del snapshot se importan recién en las funciones que los usan:
+# un inventario sin -g arranca más rápido y funciona aunque Graphviz no
+# esté instalado.
+# Para depurar: import pdb; pdb.set_trace()
+
+
+
+class _EscanerInterpret():
+    '''
+    Detecta de forma incremental (línea a línea) el momento en que el texto
+    acumulado de un interpret ya cumple con el regex 'interpret{...}as{...};'
+    sin volver a correr el regex completo sobre el buffer en cada línea.
+
+    Recorre tres fases en orden: 'interpret {', '} as {' y '};'. Entre líneas
+    solo conserva el sufijo que podría ser el comienzo de la fase pendiente
+    (con los espacios colapsados), por lo que el costo es lineal en el largo
+    del interpret.
+    '''
+
+    FASES = (
+        re.compile(r'interpret\s*{'),
+        re.compile(r'}\s*as\s*{'),
+        re.compile(r'};'),
+    )
+
+    # Sufijos que pueden ser el inicio de cada fase si llegan más líneas
+    PARCIALES = (
+        re.compile(r'(?:interpret\s*|i(?:n(?:t(?:e(?:r(?:p(?:r(?:e)?)?)?)?)?)?)?)\Z'),
+        re.compile(r'}\s*(?:a(?:s\s*)?)?\Z'),
+        re.compile(r'}\Z'),
+    )
+
+    ESPACIOS = re.compile(r'\s+')
+
+    def __init__(self):
+        self.fase = 0
+        self.resto = ''
+        # Llamadas a regex (para las estadísticas)
+        self.regex = 0
+
+    def completo(self):
+        return self.fase == len(self.FASES)
+
+    def alimentar(self, linea):
+        ''' Procesa una nueva línea. Retorna True si el interpret ya está completo '''
+        texto = self.resto + linea
+        while not self.completo():
+            encontrado = self.FASES[self.fase].search(texto)
+            self.regex = self.regex + 1
+            if encontrado == None:
+                parcial = self.PARCIALES[self.fase].search(texto)
+                self.resto = self.ESPACIOS.sub(' ', parcial.group()) if parcial != None else ''
+                self.regex = self.regex + (2 if parcial != None else 1)
+                return False
+            texto = texto[encontrado.end():]
+            self.fase = self.fase + 1
+        self.resto = ''
+        return True
+
+
+class _EscanerTests():
+    '''
+    Máquina de estados (línea a línea) de la sección de casos de prueba de
+    un bloque:
+
+        tests = {
+            { "consulta", delta_request_info = {...}, [[
+                resultado esperado
+            ]] },
+            ...
+        };
+
+    Estados: 'fuera' (busca 'tests = {'), 'tests' (busca el '{' de un caso
+    o el '}' final, fuera de comentarios) y dentro de un caso 'entrada'
+    (hasta '[[' o hasta el '}' que cierra el caso), 'esperado' (hasta ']]')
+    y 'cierre' (hasta el '}' del caso, solo con espacios en el medio). En
+    la entrada se cuentan las llaves de las tablas anidadas (p.ej.
+    delta_request_info = {...}) y se saltean strings y comentarios: un caso
+    sin string largo se cierra con su '}' y queda sin resultado esperado.
+    Si tras ']]' sigue otro valor, el string largo anterior pasa a ser
+    parte de la entrada.
+
+    Solo se guardan las partes del caso en curso: la memoria no depende del
+    largo de la sección y cada carácter se revisa una vez.
+    '''
+
+    INICIO = re.compile(r'tests\s*=\s*{')
+
+    # Lo que cambia de estado entre casos y dentro de la entrada de un caso
+    SIMBOLO_TESTS = re.compile(r'--|[{}]')
+    SIMBOLO_ENTRADA = re.compile(r'\[\[|--|[{}]|"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'')
+
+    def __init__(self):
+        self.casos = None
+        self.estado = 'fuera'
+        self.desde = None
+        self.nivel = 0
+        self.entrada = []
+        self.esperado = []
+        # Llamadas a regex (para las estadísticas)
+        self.regex = 0
+
+    def reiniciar(self, casos):
+        ''' Empieza un bloque nuevo. Los casos se agregan a la lista 'casos'. Retorna True si quedó un caso sin cerrar '''
+        sin_cerrar = self.en_caso()
+        self.casos = casos
+        self.estado = 'fuera'
+        self.nivel = 0
+        self.entrada = []
+        self.esperado = []
+        return sin_cerrar
+
+    def activo(self):
+        return self.estado != 'fuera'
+
+    def en_caso(self):
+        return self.estado in ('entrada', 'esperado', 'cierre')
+
+    def alimentar(self, linea, nro_linea):
+        '''
+        Procesa una línea del bloque. Los casos cerrados se agregan a
+        self.casos. La línea se revisa igual en busca de interprets y
+        queries (como antes de extraer los tests).
+        '''
+        texto = linea
+        while texto:
+            if self.estado == 'fuera':
+                if texto.lstrip().startswith('--'):
+                    break
+                encontrado = self.INICIO.search(texto)
+                self.regex = self.regex + 1
+                if encontrado is None:
+                    break
+                texto = texto[encontrado.end():]
+                self.estado = 'tests'
+
+            elif self.estado == 'tests':
+                encontrado = self.SIMBOLO_TESTS.search(texto)
+                self.regex = self.regex + 1
+                if (encontrado is None) or (encontrado.group() == '--'):
+                    break
+                if encontrado.group() == '{':
+                    self.desde = nro_linea
+                    self.nivel = 0
+                    self.estado = 'entrada'
+                else:
+                    # '};' fin de la sección
+                    self.estado = 'fuera'
+                texto = texto[encontrado.end():]
+
+            elif self.estado == 'entrada':
+                encontrado = self.SIMBOLO_ENTRADA.search(texto)
+                self.regex = self.regex + 1
+                if encontrado is None:
+                    self.entrada.append(texto)
+                    break
+                simbolo = encontrado.group()
+                if simbolo == '--':
+                    # El comentario queda en la entrada, sin revisar sus llaves
+                    self.entrada.append(texto)
+                    break
+                if (simbolo == '}') and (self.nivel == 0):
+                    # Caso sin string largo: no tiene resultado esperado
+                    self.entrada.append(texto[:encontrado.start()])
+                    self._cerrar_caso(nro_linea)
+                elif (simbolo == '[[') and (self.nivel == 0):
+                    self.entrada.append(texto[:encontrado.start()])
+                    self.estado = 'esperado'
+                else:
+                    if simbolo == '{':
+                        self.nivel = self.nivel + 1
+                    elif simbolo == '}':
+                        self.nivel = self.nivel - 1
+                    self.entrada.append(texto[:encontrado.end()])
+                texto = texto[encontrado.end():]
+
+            elif self.estado == 'esperado':
+                pos = texto.find(']]')
+                if pos == -1:
+                    self.esperado.append(texto)
+                    break
+                self.esperado.append(texto[:pos])
+                self.estado = 'cierre'
+                texto = texto[pos + 2:]
+
+            else:
+                resto = texto.lstrip()
+                if (resto == '') or resto.startswith('--'):
+                    break
+                if resto.startswith('}'):
+                    self._cerrar_caso(nro_linea)
+                    texto = resto[1:]
+                else:
+                    # Otro valor después del string largo: era parte de la entrada
+                    self.entrada.extend(['[[', *self.esperado, ']]'])
+                    self.esperado = []
+                    self.estado = 'entrada'
+                    texto = resto
+
+    def _cerrar_caso(self, nro_linea):
+        entrada = ''.join(self.entrada).strip().rstrip(',').strip()
+        esperado = ''.join(self.esperado)
+        # Como en Lua, se omite el salto de línea inmediato a '[['
+        if esperado.startswith('\n'):
+            esperado = esperado[1:]
+        if self.casos is not None:
+            self.casos.append(CasoPrueba(entrada, esperado, RangoLineas(self.desde, nro_linea),
+                                         ('delta_request_info' in entrada) or ('delta_request_info' in esperado)))
+        self.entrada = []
+        self.esperado = []
+        self.estado = 'tests'
 
 
 class InventarioTerrierFile():
 
 
-    def __init__(self, archi, graficar, ver_bloq_locales, marcar, bloq_reverse_path ,debug=False):
+    def __init__(self, archi, graficar, ver_bloq_locales, marcar, bloq_reverse_path ,debug=False, inventario=None, cache=None, tramos=None, offsets=False, formato='json', retener=False, render=None, stats=None, traza=None):
         '''
         debug (boolean) -> activa o no los mensajes de logging en la pantalla
+        inventario (list) -> inventario ya armado (p.ej. combinado de varios
+                             archivos). Si se define no se lee 'archi'.
+        cache (CacheInventario) -> cache en disco de inventarios ya procesados.
+        tramos (int) -> si se define, el archivo se divide en tramos en los
+                        límites de bloque y se procesa con esa cantidad de
+                        procesos (0 = uno por core).
+        offsets (boolean) -> los interprets guardan offsets de bytes en el
+                             archivo en lugar de copias de sus textos.
+        formato (str) -> 'json', 'jsonl' o 'snap'. Con 'jsonl' cada bloque
+                         se graba apenas se cierra y, si no se grafica, no
+                         se retiene en memoria. 'snap' es el snapshot
+                         binario de snapshot_inventario.py.
+        retener (boolean) -> con 'jsonl' conservar igual los bloques en
+                             memoria (p.ej. para consultas sobre el grafo).
+        render (OpcionesRender) -> opciones del render de los gráficos.
+        stats (Estadisticas) -> tiempos y contadores por fase. None = sin medir.
+        traza (Traza) -> eventos de depuración del inventario. None = sin traza.
         '''
         self.n_archi = archi
         self.graficar = graficar
@@ -77,6 +389,18 @@ class InventarioTerrierFile():
         self.marcar = marcar
         self.bloq_reverse_path = bloq_reverse_path
         self.debug = debug
+        self.cache = cache
+        self.tramos = tramos
+        self.offsets = offsets
+        self.fuente = None
+        # Llamadas a regex de es_linea_bloque() (para las estadísticas)
+        self.regex_bloques = 0
+        self.formato = formato
+        self.salida_jsonl = None
+        self.retener = retener or graficar
+        self.render = render if render is not None else OpcionesRender()
+        self.stats = stats if stats is not None else SIN_ESTADISTICAS
+        self.traza = traza
 
         # Nombre del lua.ter sin path
         basename = os.path.basename(self.n_archi)
@@ -92,34 +416,28 @@ class InventarioTerrierFile():
 
         self.interpret = re.compile(r'interpret\s*{([\s\S]*)?}\s*as\s*{[\s\S]*};',re.MULTILINE)
 
-        self.tests = re.compile(r'tests\s*=\s*{\s*({[\s\S]*]]\s*})\s*};',re.MULTILINE)
-        # re.compile(r'tests\s*=\s*{[\s\S]*?};',re.MULTILINE)
-
-        self.tests_line = re.compile(r'tests\s*=\s*',re.MULTILINE)
-        self.tests_end = re.compile(r'};',re.MULTILINE)
-
-        self.testcase_end  = re.compile(r']]\s*}', re.MULTILINE)
-
-        self.delta_request_info = re.compile(r'delta_request_info')
+        # Los casos de 'tests = { {... [[...]] }, ... };' (con sus delta_request_info)
+        # se extraen línea a línea con _EscanerTests, en la misma pasada
 
         # Estructuras de almacenamiento
         self.texto_int = ''
         self.inventario = []
-        self.block_data = {}
-        self.interpret_data = {}
-        self.tests_data = []
-        self.testcase = {}
-        self.testscases = {}
+        self.jsonl_grabado = False
+        self._indice = None
+        self._alcance = None
+        self.block_data = None
         self.sen = False
 
         # Setting del Logging
-        logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=logging.INFO)
-        logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=logging.DEBUG)
+        logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=logging.DEBUG if self.debug else logging.INFO)
         if self.debug == False:
             logging.disable(logging.DEBUG)
 
         # Inventariar bloques e interprets
-        self.inventariar()
+        if inventario is None:
+            self.inventariar()
+        else:
+            self.inventario = inventario
 
         # Si se agregó parámetro -g
         if self.graficar:
@@ -133,175 +451,493 @@ class InventarioTerrierFile():
         ''' Lectura y procesado del archivo lua.ter  '''
 
         logging.info(f'✓ Creando inventario de {self.n_archi}.')
+        with self.stats.fase('inventariar'):
+            try:
+                self._inventariar()
+            finally:
+                # Con offsets el archivo se vuelve a abrir recién al leer un interpret
+                self.cerrar()
+
+    def cerrar(self):
+        ''' Libera el mmap del archivo fuente de los interprets guardados como offsets '''
+        if self.fuente is not None:
+            self.fuente.cerrar()
+
+    def _inventariar(self):
+        if self.cache is not None:
+            # Solo se procesan los tramos editados: se cuenta sobre el resultado,
+            # con las llamadas a regex de lo que sí se procesó
+            stats, self.stats = self.stats, Estadisticas()
+            self.regex_bloques = 0
+            try:
+                self.inventario = self.cache.inventario(self)
+            finally:
+                tramos, self.stats = self.stats, stats
+            if self.stats is not SIN_ESTADISTICAS:
+                contar_inventario(self.stats, self.inventario, contar_lineas_archivo(self.n_archi),
+                                  tramos.contadores.get('regex', 0) + self.regex_bloques)
+            return
+
+        if self.tramos is not None:
+            inventario = self.inventariar_en_tramos(self.tramos or None)
+            if inventario is not None:
+                # Los tramos se procesan en otros procesos: se cuenta sobre el resultado
+                # y las llamadas a regex quedan sin dato
+                self.inventario = inventario
+                if self.stats is not SIN_ESTADISTICAS:
+                    contar_inventario(self.stats, inventario, contar_lineas_archivo(self.n_archi))
+                return
+
+        if self.offsets:
+            self.fuente = self._fuente_para_offsets()
+
+        if self.formato == 'jsonl':
+            # Los bloques se graban a medida que se cierran
+            with open(self.nombre_inventario(), 'w', encoding='utf-8') as salida:
+                self.salida_jsonl = salida
+                with open(self.n_archi,'r') as archivo:
+                    self._inventariar_lineas(archivo)
+            self.salida_jsonl = None
+            self.jsonl_grabado = True
+            return
+
         with open(self.n_archi,'r') as archivo:
-            linea = archivo.readline()
-            cont_lin = 0
-            while linea:
-
-                plin = linea
-                logging.debug('>>> ' + plin)
-                cont_lin = cont_lin + 1
-                if self.block.search(plin) != None:
-
-                    if self.sen == True :
-                        # Se guarda lína de finalización de bloque anterior
-                        # línea de nvo. bloque -1
-                        #MARK Si hay commentarios quedan en el bloque anterior las líneas
-                        ln_end_block = cont_lin - 1
-                        self.block_data['block_lin_nro']['end'] = ln_end_block
-
-                        blk_dict = copy.deepcopy(self.block_data)
-                        logging.debug('✓ Bloque encontrado')
-                        self.inventario.append(blk_dict)
-
-                        self.block_data = {}
-                        self.interpret_data = {}
-                        self.tests_data = []
-                        self.testcase = {}
-                        self.testscases = {}
-
-                        self.block_data.clear()
-                        self.interpret_data.clear()
-                        self.tests_data.clear()
-                        self.testscases.clear()
-                        self.sen = False
-
-                    sent_blk = self.block.search(plin)
-                    #logging.info('Bloque Sentencia: ' + sent_blk.group())
-                    nom_blk = self.blk_name.search(sent_blk.group())
-                    logging.debug('[Bloque Nombre]:\t' + nom_blk.group())
-
-                    self.block_data['block_name'] = nom_blk.group()
-                    self.block_data['block_at_file'] = self.n_archi
-
-                    self.block_data['block_lin_nro']= {}
-                    self.block_data['block_lin_nro']['start'] = cont_lin
-
-                    self.block_data['interprets'] = list()
-                    self.block_data['queries'] = list()
-
-                    self.sen = True
-                    #cont = 0
-
-
-                # Detección y guardado de queries ejemplo del bloque
-                if '--&' in plin:
-                    query = plin.strip()[4:]
-                    self.block_data['queries'].append(query)
-
-
-                #TODO Mejorar la busqueda del 'interpret' para evitar falsos positivos en comentarios
-                if ('interpret' in plin) and (not plin.startswith('--')) and (plin.lstrip().startswith('interpret')):
-
-                    logging.debug('✓ Entró en interpret')
-                    self.texto_int = self.texto_int + plin
-                    logging.debug(' Buscando todo el interpret...')
-                    while True:
-
-                        linea = ''
-                        linea = archivo.readline()
-                        plin = linea
-                        cont_lin = cont_lin + 1
-                        self.texto_int = self.texto_int + plin
-                        logging.debug(f'Linea <{cont_lin}>  {self.texto_int}')
-                        if self.interpret.search(self.texto_int) != None:
-                            break
-
-                    # Busca string "todo" el interpret
-                    int_sent = self.interpret.search(self.texto_int)
-                    logging.debug('✓ Registrando interpret')
-                    #print(self.block_data['interprets'])
-
-                    # Guardo todo el interpret encontrado ( {}as{}; )
-                    self.interpret_data['raw_string'] = int_sent.group()
-
-                    # Guardo la expresión terrier antes del 'as'
-                    self.interpret_data['terrier_expr'] = int_sent.group(1)
-
-                    # Guardo los nombres de bloques ( NOMBRE() ) que hay en la expresión terrier
-                    #interpret_data['blocks_usados'] = [ elem[0] for elem in blk_name.findall(self.texto_int)]
-                    self.interpret_data['blocks_usados'] = list(OrderedDict.fromkeys([ elem for elem in self.blk_name.findall(self.texto_int)]))
-
-                    # Almaceno el interpret encontrado en la lista de interpret del bloque al que pertenece
-                    self.block_data['interprets'].append(self.interpret_data)
-
-                    logging.debug('✓ Encontrado interpret!')
-                    logging.debug('-----------------------------')
-                    logging.debug(f'\t{int_sent.group()}')
-                    logging.debug('-----------------------------')
-                    logging.debug(f'\t\t{int_sent.group(1)}')
-                    self.texto_int = ''
-                    self.interpret_data = {}
+            self._inventariar_lineas(archivo)
 
-                # Lee nueva linea del archivo
-                linea = archivo.readline()
+    def _agregar_bloque(self, bloque):
+        ''' Registra un bloque cerrado en el inventario y/o en la salida JSON Lines '''
+        if self.salida_jsonl is not None:
+            self.salida_jsonl.write(linea_jsonl(bloque.a_dict()))
+            if not self.retener:
+                return
+        self.inventario.append(bloque)
+
+    def _fuente_para_offsets(self):
+        '''
+        Fuente de la que leer los interprets guardados como offsets. Si el
+        archivo tiene fines de línea con CR (que open() traduce) los offsets
+        no coinciden con el texto leído y se guardan las copias.
+        '''
+        with open(self.n_archi, 'rb') as fp:
+            if os.fstat(fp.fileno()).st_size == 0:
+                return None
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as datos:
+                if datos.find(b'\r') != -1:
+                    logging.info('    * Fines de línea con CR: se guardan los textos de los interprets.')
+                    return None
+        return FuenteTerrier(self.n_archi, locale.getpreferredencoding(False))
+
+    def _inventariar_lineas(self, archivo, cont_lin=0, es_segmento=False):
+        '''
+        Procesa las líneas de 'archivo' (cualquier objeto con readline())
+        agregando los bloques encontrados a self.inventario.
+
+        cont_lin (int) -> cantidad de líneas previas a la primera de 'archivo',
+                          para registrar números de línea absolutos.
+        es_segmento (boolean) -> 'archivo' es solo un tramo del lua.ter. Si un
+                          interpret llega al final del tramo se corta el proceso
+                          y queda self.interpret_cortado en True.
+        '''
+        self.interpret_cortado = False
+        # Contadores para las estadísticas (se informan una vez al final)
+        lin_inicial = cont_lin
+        cant_bloques = 0
+        cant_interprets = 0
+        cant_regex = 0
+        cant_tests = 0
+        escaner_tests = _EscanerTests()
+        # Traza de depuración (-d). Sin traza ningún evento se arma ni formatea
+        traza = self.traza
+        # Offset en bytes de la línea actual (solo si se guardan offsets)
+        fuente = self.fuente
+        pos_bytes = 0
+        linea = archivo.readline()
+        while linea:
+
+            plin = linea
+            cont_lin = cont_lin + 1
+            cant_regex = cant_regex + 1
+            if self.block.search(plin) != None:
+
+                if self.sen == True :
+                    # Se guarda lína de finalización de bloque anterior
+                    # línea de nvo. bloque -1
+                    #MARK Si hay commentarios quedan en el bloque anterior las líneas
+                    ln_end_block = cont_lin - 1
+                    self.block_data.block_lin_nro.end = ln_end_block
+
+                    if traza is not None:
+                        traza.evento(cont_lin, 'fin_bloque', self.block_data.block_name, desde=self.block_data.block_lin_nro.start, hasta=ln_end_block)
+                    self._agregar_bloque(self.block_data)
+
+                    self.block_data = None
+                    self.sen = False
+
+                sent_blk = self.block.search(plin)
+                #logging.info('Bloque Sentencia: ' + sent_blk.group())
+                nom_blk = self.blk_name.search(sent_blk.group())
+                cant_regex = cant_regex + 2
+                if traza is not None:
+                    traza.evento(cont_lin, 'bloque', nom_blk.group())
+
+                self.block_data = Bloque(nom_blk.group(), self.n_archi, RangoLineas(cont_lin))
+                cant_bloques = cant_bloques + 1
+                if escaner_tests.reiniciar(self.block_data.tests):
+                    logging.warning(f'Caso de prueba sin cerrar antes de la línea {cont_lin} de {self.n_archi}.')
+
+                self.sen = True
+                #cont = 0
+
+
+            # Casos de prueba del bloque. Solo se revisan las líneas con 'tests' o
+            # las que siguen a 'tests = {' hasta el '};' de cierre. Como antes, en
+            # esas líneas también se buscan interprets y queries
+            if (self.block_data is not None) and (escaner_tests.activo() or 'tests' in plin):
+                cant_tests = cant_tests + self._alimentar_tests(escaner_tests, plin, cont_lin)
+
+            # Detección y guardado de queries ejemplo del bloque
+            if '--&' in plin:
+                query = plin.strip()[4:]
+                self.block_data.queries.append(query)
+                if traza is not None:
+                    traza.evento(cont_lin, 'query', self.block_data.block_name, query=query)
+
+
+            #TODO Mejorar la busqueda del 'interpret' para evitar falsos positivos en comentarios
+            if ('interpret' in plin) and (not plin.startswith('--')) and (plin.lstrip().startswith('interpret')):
+
+                if traza is not None:
+                    traza.evento(cont_lin, 'interpret', self.block_data.block_name if self.block_data is not None else None)
+                # Las líneas del interpret se acumulan en una lista y se unen una sola vez
+                lineas_int = [plin]
+                pos_int = pos_bytes
+                escaner = _EscanerInterpret()
+                escaner.alimentar(plin)
+                while True:
+
+                    linea = ''
+                    linea = archivo.readline()
+                    plin = linea
+                    if plin == '':
+                        # Fin de archivo sin cerrar el interpret
+                        self.interpret_cortado = True
+                        break
+                    cont_lin = cont_lin + 1
+                    lineas_int.append(plin)
+                    if (self.block_data is not None) and (escaner_tests.activo() or 'tests' in plin):
+                        # Las líneas que consume el interpret (incluso la siguiente a
+                        # uno de una sola línea) también pueden ser parte de los tests
+                        cant_tests = cant_tests + self._alimentar_tests(escaner_tests, plin, cont_lin)
+                    if escaner.alimentar(plin):
+                        break
+
+                cant_regex = cant_regex + escaner.regex
+                if self.interpret_cortado and es_segmento:
+                    # El interpret sigue en el tramo siguiente
+                    if traza is not None:
+                        traza.evento(cont_lin, 'interpret_cortado', self.block_data.block_name if self.block_data is not None else None)
+                    self._contar_lineas(cont_lin - lin_inicial, cant_bloques, cant_interprets, cant_regex + escaner_tests.regex, cant_tests)
+                    return
+
+                self.texto_int = ''.join(lineas_int)
+                if fuente is not None:
+                    pos_bytes = pos_int + len(self.texto_int.encode(fuente.encoding)) - len(plin.encode(fuente.encoding))
+
+                # Busca string "todo" el interpret (una única vez, ya completo)
+                int_sent = self.interpret.search(self.texto_int) if escaner.completo() else None
+                cant_regex = cant_regex + escaner.completo()
+                if int_sent == None:
+                    logging.warning(f'Interpret sin cerrar en línea {cont_lin} de {self.n_archi}.')
+                    if traza is not None:
+                        traza.evento(cont_lin, 'interpret_sin_cerrar', self.block_data.block_name if self.block_data is not None else None, lineas=len(lineas_int))
+                    self.texto_int = ''
+                    linea = archivo.readline()
+                    continue
+
+                # Guardo los nombres de bloques ( NOMBRE() ) que hay en la expresión terrier
+                blocks_usados = list(OrderedDict.fromkeys(self.blk_name.findall(self.texto_int)))
+                cant_regex = cant_regex + 1
+
+                if fuente is None:
+                    # Guardo todo el interpret encontrado ( {}as{}; ) y la expresión terrier antes del 'as'
+                    interpret_data = Interpret(int_sent.group(), int_sent.group(1), blocks_usados)
+                else:
+                    # Solo offsets en bytes dentro del archivo fuente
+                    interpret_data = Interpret.con_offsets(
+                        fuente,
+                        self._offsets_bytes(pos_int, int_sent.span(), fuente.encoding),
+                        self._offsets_bytes(pos_int, int_sent.span(1), fuente.encoding),
+                        blocks_usados)
+
+                # Almaceno el interpret encontrado en la lista de interpret del bloque al que pertenece
+                self.block_data.interprets.append(interpret_data)
+                cant_interprets = cant_interprets + 1
+
+                if traza is not None:
+                    traza.evento(cont_lin, 'fin_interpret', self.block_data.block_name, lineas=len(lineas_int), blocks_usados=blocks_usados)
+                self.texto_int = ''
+
+            if fuente is not None:
+                pos_bytes = pos_bytes + len(plin.encode(fuente.encoding))
+
+            # Lee nueva linea del archivo
+            linea = archivo.readline()
 
 
         # Se registra ln de finalización del bloque (linea bloque nuevo -1)
         # Se graba el último bloque que queda sin grabar
-        ln_end_block = cont_lin
-        self.block_data['block_lin_nro']['end'] = ln_end_block
-        self.inventario.append(self.block_data)
-        self.block_data= {}
+        if escaner_tests.reiniciar(None):
+            logging.warning(f'Caso de prueba sin cerrar al final de {self.n_archi}.')
+        if self.sen == True:
+            ln_end_block = cont_lin
+            self.block_data.block_lin_nro.end = ln_end_block
+            if traza is not None:
+                traza.evento(cont_lin, 'fin_bloque', self.block_data.block_name, desde=self.block_data.block_lin_nro.start, hasta=ln_end_block)
+            self._agregar_bloque(self.block_data)
+        self.block_data = None
+        self.sen = False
+        self._contar_lineas(cont_lin - lin_inicial, cant_bloques, cant_interprets, cant_regex + escaner_tests.regex, cant_tests)
 
+    def _alimentar_tests(self, escaner_tests, linea, nro_linea):
+        '''
+        Pasa una línea del bloque actual al escáner de casos de prueba.
+        Retorna la cantidad de casos cerrados en ella.
+        '''
+        cant_casos = len(self.block_data.tests)
+        escaner_tests.alimentar(linea, nro_linea)
+        nuevos = self.block_data.tests[cant_casos:]
+        if self.traza is not None:
+            for caso in nuevos:
+                self.traza.evento(nro_linea, 'test', self.block_data.block_name, desde=caso.test_lin_nro.start,
+                                  delta_request_info=caso.delta_request_info)
+        return len(nuevos)
+
+    def _contar_lineas(self, lineas, bloques, interprets, regex, tests=0):
+        '''
+        Suma a las estadísticas lo procesado por _inventariar_lineas. 'regex'
+        son las llamadas a regex contadas dónde se ejecutan (bloques,
+        interprets y los escáneres de interprets y de tests).
+        '''
+        self.stats.contar('lineas', lineas)
+        self.stats.contar('bloques', bloques)
+        self.stats.contar('interprets', interprets)
+        self.stats.contar('tests', tests)
+        self.stats.contar('regex', regex)
+
+    def _offsets_bytes(self, pos_int, span, encoding):
+        ''' Pasa un span (en caracteres) de self.texto_int a offsets de bytes en el archivo '''
+        desde = pos_int + len(self.texto_int[:span[0]].encode(encoding))
+        hasta = desde + len(self.texto_int[span[0]:span[1]].encode(encoding))
+        return (desde, hasta)
+
+    def es_linea_bloque(self, linea):
+        ''' True si la línea es la declaración de un bloque '''
+        # El literal evita correr el regex en la mayoría de las líneas
+        if '"Español"' not in linea:
+            return False
+        self.regex_bloques = self.regex_bloques + 1
+        return self.block.search(linea) != None
+
+    def inventariar_segmento(self, lineas, lin_inicio, ultimo=False):
+        '''
+        Inventaría un tramo del archivo que empieza en una línea de bloque
+        (o al comienzo del archivo) y termina antes del bloque siguiente.
+
+        lineas (list) -> líneas del tramo, con su fin de línea.
+        lin_inicio (int) -> número (desde 1) de la primera línea del tramo.
+        ultimo (boolean) -> el tramo llega hasta el final del archivo.
+
+        Retorna la lista de bloques del tramo, o None si un interpret continúa
+        más allá del tramo (en ese caso el tramo no puede procesarse aislado).
+        '''
+        inventario = self.inventario
+        self.inventario = []
+        try:
+            self._inventariar_lineas(io.StringIO(''.join(lineas)), lin_inicio - 1, es_segmento=not ultimo)
+            bloques = self.inventario
+        finally:
+            self.inventario = inventario
+            self.block_data = None
+            self.texto_int = ''
+            self.sen = False
+        if self.interpret_cortado and not ultimo:
+            return None
+        return bloques
+
+    def limites_de_bloque(self, datos):
+        '''
+        Pre-escaneo rápido de los bytes del archivo (p.ej. un mmap) buscando
+        las declaraciones de bloque. Retorna la lista de tuplas
+        (offset de la línea, número de línea) de cada una.
+        '''
+        encoding = locale.getpreferredencoding(False)
+        marca = '"Español"'.encode(encoding)
+        limites = []
+        pos_anterior = 0
+        nro_anterior = 1
+        pos = datos.find(marca)
+        while pos != -1:
+            inicio = datos.rfind(b'\n', 0, pos) + 1
+            fin = datos.find(b'\n', pos)
+            fin = len(datos) if fin == -1 else fin + 1
+            if self.es_linea_bloque(datos[inicio:fin].decode(encoding)):
+                nro_anterior = nro_anterior + datos[pos_anterior:inicio].count(b'\n')
+                pos_anterior = inicio
+                limites.append((inicio, nro_anterior))
+            pos = datos.find(marca, fin)
+        return limites
+
+    def inventariar_en_tramos(self, workers=None):
+        '''
+        Divide el archivo (vía mmap) en tramos que empiezan en una declaración
+        de bloque y los inventaría en paralelo, uno por proceso.
+        Retorna None si el archivo no puede dividirse de forma segura (fines
+        de línea con CR o un interpret que cruza de un tramo a otro) y debe
+        procesarse de forma secuencial.
+        '''
+        with open(self.n_archi, 'rb') as fp:
+            if os.fstat(fp.fileno()).st_size == 0:
+                return None
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as datos:
+                if datos.find(b'\r') != -1:
+                    # open() traduce '\r' a fin de línea: se procesa secuencial
+                    return None
+                limites = self.limites_de_bloque(datos)
+                largo = len(datos)
+
+        if len(limites) == 0 or limites[0][0] != 0:
+            limites.insert(0, (0, 1))
+
+        # Se agrupan bloques consecutivos en tramos de tamaño similar
+        workers = workers or os.cpu_count() or 1
+        tam_tramo = max(1, largo // (workers * 4))
+        tramos = []
+        desde, lin_desde = limites[0]
+        for pos, nro in limites[1:]:
+            if pos - desde >= tam_tramo:
+                tramos.append((desde, pos, lin_desde))
+                desde, lin_desde = pos, nro
+        tramos.append((desde, largo, lin_desde))
+
+        from concurrent.futures import ProcessPoolExecutor
+
+        logging.info(f'    * {len(tramos)} tramos en {workers} procesos.')
+        inventario = []
+        procesar = partial(_inventariar_tramo, self.n_archi, largo)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for bloques in pool.map(procesar, tramos):
+                if bloques is None:
+                    logging.info('    * Interpret entre tramos, se procesa secuencial.')
+                    return None
+                inventario.extend(bloques)
+        return inventario
 
     def mostrar(self):
         ''' Imprime el inventario json '''
-        inventario_json = json.dumps(self.inventario)
+        import pprint as pp
+
+        inventario_json = json.dumps([bloque.a_dict() for bloque in self.inventario])
         pp.pprint(inventario_json)
 
 
-    def to_file(self):
-        ''' Graba el inventario de bloques en formato JSON '''
-        nombre_inventario = self.n_archi + '_inventario.json'
-        with open( nombre_inventario, 'w') as fp:
-            json.dump(self.inventario, fp, indent=4, ensure_ascii=False, separators=(',', ': '), sort_keys=True)
-        logging.info('✓ Inventario de bloques bajado a JSON.')
+    def nombre_inventario(self):
+        ''' Nombre del archivo de inventario según el formato '''
+        return self.n_archi + '_inventario.' + self.formato
+
+    def to_file(self, solo_si_cambia=False):
+        '''
+        Graba el inventario de bloques en formato JSON (o JSON Lines o
+        snapshot binario). Con solo_si_cambia no se reescribe si el contenido
+        es igual al ya grabado. Retorna True si se grabó.
+        '''
+        nombre_inventario = self.nombre_inventario()
+        if self.formato == 'snap':
+            # El snapshot incluye los nodos y aristas del índice del grafo
+            self.indice_grafo()
+        with self.stats.fase('to_file'):
+            if solo_si_cambia:
+                texto, encoding = self._texto_inventario()
+                if _contenido_igual(nombre_inventario, texto, encoding):
+                    logging.info(f'    * Inventario sin cambios: {nombre_inventario}')
+                    return False
+                with open(nombre_inventario, 'w' if isinstance(texto, str) else 'wb', encoding=encoding) as fp:
+                    fp.write(texto)
+            elif self.formato == 'snap':
+                from snapshot_inventario import grabar_snapshot
+                grabar_snapshot(nombre_inventario, self.inventario, self._indice)
+            elif self.formato == 'jsonl':
+                if not self.jsonl_grabado:
+                    with open(nombre_inventario, 'w', encoding='utf-8') as fp:
+                        for bloque in self.inventario:
+                            fp.write(linea_jsonl(bloque.a_dict()))
+            else:
+                with open( nombre_inventario, 'w') as fp:
+                    json.dump([bloque.a_dict() for bloque in self.inventario], fp, indent=4, ensure_ascii=False, separators=(',', ': '), sort_keys=True)
+        logging.info(f'✓ Inventario de bloques bajado a {self.formato.upper()}.')
         logging.info(f'    * Archivo: {nombre_inventario}')
+        return True
+
+    def _texto_inventario(self):
+        ''' (texto, encoding) del inventario tal como lo graba to_file(). El snapshot es binario (bytes) '''
+        if self.formato == 'snap':
+            from snapshot_inventario import snapshot_bytes
+            return snapshot_bytes(self.inventario, self._indice), None
+        if self.formato == 'jsonl':
+            return ''.join(linea_jsonl(bloque.a_dict()) for bloque in self.inventario), 'utf-8'
+        return json.dumps([bloque.a_dict() for bloque in self.inventario], indent=4, ensure_ascii=False, separators=(',', ': '), sort_keys=True), None
 
 
     def implrimir_blocks(self):
         ''' Imprime los bloques "locales" '''
         for elem in self.inventario:
-            print(elem['block_name'])
+            print(elem.block_name)
 
 
     def bloques_locales(self):
         '''Retorna lista de bloques "locales" '''
-        return [elem['block_name'] for elem in self.inventario]
+        return [elem.block_name for elem in self.inventario]
 
 
-    def graficar_relaciones(self, ver_bloq_locales=False, marcar="", bloque_origen=""):
-        '''
-        Genera un gráfico de la relación bloque -> bloques llamados dentro de él
-        Puede recibir un nombre de bloque o una lista de nombres de bloque a
-        buscar y marcar con otro color.
-        Los nombres deben ser en mayúsculas, sin (), ni parámetros.
+    def indice_grafo(self):
+        ''' Índice del grafo de llamadas del inventario (se arma una sola vez) '''
+        if self._indice is None:
+            with self.stats.fase('indice_grafo'):
+                self._indice = IndiceGrafo(self.inventario)
+            self.stats.contar('nodos', len(self._indice.nombres))
+            self.stats.contar('aristas', len(self._indice.aristas))
+        return self._indice
 
-        Argumentos:
-           * ver_bloq_locales (boolean) -> True: grafica solo relaciones de bloques locales.
-                                        -> False: grafica relaciones de bloques locales y externos.
-           * marcar (str) -> string con los nombres de los bloques a marcar.
+    def alcance_grafo(self):
+        ''' Componentes y bitsets de alcance del grafo para el análisis de impacto (se arman una sola vez) '''
+        if self._alcance is None:
+            indice = self.indice_grafo()
+            with self.stats.fase('alcance'):
+                self._alcance = AlcanceGrafo(indice)
+            self.stats.contar('componentes', len(self._alcance.miembros))
+        return self._alcance
 
-           * bloque_origen (str) -> nombre del bloque desde dónde se
-             inicial el camino inverso. Si se deja vacío no se grafica.
-        '''
 
-        bloques_a_marcar = []
+    def armar_grafo(self, ver_bloq_locales=False, marcar=""):
+        '''
+        Arma el grafo Graphviz de la relación bloque -> bloques llamados a
+        partir del índice del grafo. Retorna (grafo, sufijo del nombre de archivo).
+        '''
         file_name_sufijo = ""
 
-        # Se arma la lista a buscar con uno o varios bloques
+        # Se arma el set a buscar con uno o varios bloques
         lista_marcar = marcar.split(',')
-        bloques_a_marcar = [elem+'(...)' for elem in lista_marcar]
+        bloques_a_marcar = set(elem+'(...)' for elem in lista_marcar)
 
-        if bloque_origen != "":
-            bloque_origen = bloque_origen + '(...)'
+        # Índice del grafo: nombres ya normalizados (sin parámetros) y bloques locales
+        indice = self.indice_grafo()
 
-        # Se normalizan los nombres de los bloques locales quitándoles los parámetros
-        bloques_locales = [re.sub("\(.*\)", '(...)', elem) for elem in self.bloques_locales()]
+        # Los mensajes por arista solo se arman con -d
+        depurar = logging.getLogger().isEnabledFor(logging.DEBUG)
+        if depurar:
+            logging.debug('✓ Bloques locales:')
+            logging.debug('  * %s', indice.locales)
 
-        logging.debug('✓ Bloques locales:')
-        logging.debug(f'  * {bloques_locales}')
+        import pygraphviz as pgv
 
         G = pgv.AGraph(directed = True, rankdir="LR", ranksep=8.0, id="mi_luar_ter", name="mi_lua_ter")
         # Atributos del gráfico
@@ -314,65 +950,71 @@ class InventarioTerrierFile():
         G.node_attr["color"] = "goldenrod"
         G.node_attr["style"] = "rounded, filled"
 
-        for elem in self.inventario:
-            for interpret in elem["interprets"]:
-                # Normalizado de campos para representar en Dot (bloques sin parámetros)
-                elemento = elem["block_name"].replace("\n","")
-                elemento = re.sub('\s+', ' ', elemento)
-                elemento = re.sub('\"', '\'', elemento)
-                elemento = re.sub("\(.*\)", '(...)', elemento)
-
-                logging.debug(f'✓ Bloque: {elemento}')
-                #G.add_node(elemento)
-                for bloque in interpret["blocks_usados"]:
-                    # Normalizado de campos para representar en Dot (bloques sin parámetros)
-                    bloque = bloque.replace("\n", "")
-                    bloque = re.sub('\s+', ' ', bloque)
-                    bloque = re.sub('\"', '\'', bloque)
-                    bloque = re.sub("\(.*\)", '(...)', bloque)
-
-                    logging.debug(f'✓    Relación {elemento} -> {bloque} ')
-                    # Agrega la relación entre bloques
-                    if ver_bloq_locales:
-                        file_name_sufijo = "_locales"
-                        if bloque in bloques_locales or bloque =="PHONE_NUMBER(...)": # PHONE_NUMBER() es un extended block de SH
-                           G.add_edge(elemento, bloque)
-                           # Si bloque está en bloques_a_marcar lo pinta de verde
-                           if  bloque in bloques_a_marcar:
-                               n = G.get_node(bloque)
-                               n.attr["fillcolor"] = "green"
-
-                           if  elemento in bloques_a_marcar:
-                               n = G.get_node(elemento)
-                               n.attr["fillcolor"] = "green"
-
-                    else:
-                        file_name_sufijo = "_todos"
-                        G.add_edge(elemento, bloque)
-                        # Si bloque está en bloques_a_marcar lo pinta de verde
-                        if  bloque in bloques_a_marcar:
-                            n = G.get_node(bloque)
-                            n.attr["fillcolor"] = "green"
-
-                        if  elemento in bloques_a_marcar:
-                               n = G.get_node(elemento)
-                               n.attr["fillcolor"] = "green"
+        if len(indice.aristas) > 0:
+            file_name_sufijo = "_locales" if ver_bloq_locales else "_todos"
+
+        # Agrega las relaciones entre bloques (solo locales si se pidió)
+        for elemento, bloque in indice.aristas_a_graficar(ver_bloq_locales):
+            if depurar:
+                logging.debug('✓    Relación %s -> %s ', elemento, bloque)
+            G.add_edge(elemento, bloque)
+
+        # Los bloques graficados que están en bloques_a_marcar se pintan de verde
+        for bloque in bloques_a_marcar:
+            if G.has_node(bloque):
+                n = G.get_node(bloque)
+                n.attr["fillcolor"] = "green"
+
+        return G, file_name_sufijo
+
+
+    def graficar_relaciones(self, ver_bloq_locales=False, marcar="", bloque_origen="", solo_si_cambia=False):
+        '''
+        Genera un gráfico de la relación bloque -> bloques llamados dentro de él
+        Puede recibir un nombre de bloque o una lista de nombres de bloque a
+        buscar y marcar con otro color.
+        Los nombres deben ser en mayúsculas, sin (), ni parámetros.
+
+        Argumentos:
+           * ver_bloq_locales (boolean) -> True: grafica solo relaciones de bloques locales.
+                                        -> False: grafica relaciones de bloques locales y externos.
+           * marcar (str) -> string con los nombres de los bloques a marcar.
+
+           * bloque_origen (str) -> nombre del bloque desde dónde se
+             inicial el camino inverso. Si se deja vacío no se grafica.
+
+           * solo_si_cambia (boolean) -> no reescribe (ni renderiza) los .gv
+             cuyo Dot es igual al ya grabado.
+        '''
+
+        if bloque_origen != "":
+            bloque_origen = bloque_origen + '(...)'
+
+        # El índice se arma antes para que su tiempo no se sume al del grafo
+        self.indice_grafo()
+        with self.stats.fase('armar_grafo'):
+            G, file_name_sufijo = self.armar_grafo(ver_bloq_locales, marcar)
 
         logging.info('✓ Graficando.')
 
+        # Gráficos a renderizar (png, svg, ...) una vez grabados todos los .gv
+        trabajos = []
+
         # *** Gráfico General ***
 
         # Genera archivo lenguaje dot
         g_dot_file = self.file_name + file_name_sufijo + ".gv"
-        G.write(g_dot_file)
+        general_grabado = self._grabar_gv(G, g_dot_file, solo_si_cambia)
+        if general_grabado:
+            logging.info('✓ Gráfico general generado.')
+            logging.info(f'    * Archivo: {g_dot_file}')
 
-        # Genera archivo png
-        g_png_file = self.file_name + file_name_sufijo +".png"
-        G.layout(prog='dot')
-        G.draw(g_png_file)
-        logging.info('✓ Gráfico general generado.')
-        logging.info(f'    * Archivo: {g_dot_file}')
-        logging.info(f'    * Archivo: {g_png_file}')
+        # Un gráfico general grande se renderiza por partes en lugar de completo
+        trabajos_partes = self._graficar_partes(file_name_sufijo, ver_bloq_locales, marcar, solo_si_cambia)
+        if trabajos_partes is not None:
+            trabajos.extend(trabajos_partes)
+        elif general_grabado:
+            trabajos.append(TrabajoRender(g_dot_file, ['png'], G.number_of_nodes()))
 
 
         if bloque_origen != "":
@@ -381,24 +1023,105 @@ class InventarioTerrierFile():
             assert G.get_node(bloque_origen) != None, "Bloque inexistente"
 
             # Genera gráfico dot de camino inverso desde un nodo = bloque
-            G_inv=self._camino_inverso(G, bloque_origen)
+            with self.stats.fase('camino_inverso'):
+                G_inv=self._camino_inverso(G, bloque_origen)
 
             # Genera archivo lenguaje dot
             g_inv_dot_file = self.file_name + "_camino_inv_" + bloque_origen[:-5] + ".gv"
-            G_inv.write(g_inv_dot_file)
-
-            # Genera archivo png
-            g_inv_png_file = self.file_name + "_camino_inv_" + bloque_origen[:-5] + ".png"
-            G_inv.layout(prog='dot')
-            G_inv.draw(g_inv_png_file)
-            g_inv_svg_file = self.file_name + "_camino_inv_" + bloque_origen[:-5] + ".svg"
-            G_inv.draw(g_inv_svg_file)
-            logging.info(f'✓ Gráfico camino inverso generado desde: {bloque_origen}')
-            logging.info(f'    * Archivo: {g_inv_dot_file}')
-            logging.info(f'    * Archivo: {g_inv_png_file}')
-            logging.info(f'    * Archivo: {g_inv_svg_file}')
+            if self._grabar_gv(G_inv, g_inv_dot_file, solo_si_cambia):
+                trabajos.append(TrabajoRender(g_inv_dot_file, ['png', 'svg'], G_inv.number_of_nodes()))
+                logging.info(f'✓ Gráfico camino inverso generado desde: {bloque_origen}')
+                logging.info(f'    * Archivo: {g_inv_dot_file}')
+
+        # *** Render de imágenes (layout una vez por gráfico, gráficos en paralelo) ***
+        with self.stats.fase('render'):
+            resultados = renderizar_trabajos(trabajos, self.render)
+        for gv_file, archivos in resultados.items():
+            if isinstance(archivos, list):
+                logging.info(f'✓ Render de {gv_file}:')
+                for archivo in archivos:
+                    logging.info(f'    * Archivo: {archivo}')
+
+    def _graficar_partes(self, file_name_sufijo, ver_bloq_locales=False, marcar="", solo_si_cambia=False):
+        '''
+        Divide el gráfico general según self.render.particion (ver
+        particion_grafo.py) y graba un .gv por parte y el .gv del resumen,
+        que enlaza las imágenes de las partes. Retorna los TrabajoRender de
+        los .gv grabados, o None si el gráfico no se parte.
+        '''
+        if self.render.particion == 'none':
+            return None
+        from particion_grafo import particionar, archivos_de_nodos, particion_a_dot, resumen_a_dot
+
+        indice = self.indice_grafo()
+        with self.stats.fase('particionar'):
+            modo, particiones = particionar(indice, self.render.particion, self.render.max_nodos_particion,
+                                            ver_bloq_locales, archivos_de_nodos(self.inventario, indice.normalizar))
+        if len(particiones) == 0:
+            if self.render.particion != 'auto':
+                logging.info(f'    * El gráfico general queda en una sola parte ({modo}).')
+            return None
+        self.stats.contar('partes', len(particiones))
+
+        base = self.file_name + file_name_sufijo
+        # Los enlaces apuntan al svg (donde se puede hacer click) si se genera
+        formatos = self.render.formatos or ['png', 'svg']
+        extension = 'svg' if 'svg' in formatos else formatos[0]
+        imagenes = [f'{base}_parte_{particion.nro + 1:03d}.{extension}' for particion in particiones]
+        logging.info(f'✓ Gráfico general dividido en {len(particiones)} partes ({modo}), '
+                     f'la más grande de {max(len(particion.nodos) for particion in particiones)} bloques.')
+
+        trabajos = []
+        for particion, imagen in zip(particiones, imagenes):
+            gv_file = os.path.splitext(imagen)[0] + '.gv'
+            if self._grabar_dot(particion_a_dot(particion, particiones, imagenes, marcar.split(',')), gv_file, solo_si_cambia):
+                trabajos.append(TrabajoRender(gv_file, ['png', 'svg'], len(particion.nodos)))
+                logging.debug(f'    * Archivo: {gv_file}')
+
+        gv_resumen = base + '_partes.gv'
+        if self._grabar_dot(resumen_a_dot(particiones, imagenes, base + '_partes'), gv_resumen, solo_si_cambia):
+            trabajos.append(TrabajoRender(gv_resumen, ['png', 'svg'], len(particiones)))
+            logging.info(f'    * Resumen: {gv_resumen}')
+        return trabajos
+
+    def _grabar_dot(self, texto, gv_file, solo_si_cambia=False):
+        ''' Graba el texto Dot 'texto'. Con solo_si_cambia no lo reescribe si no cambió. Retorna True si se grabó '''
+        with self.stats.fase('escribir_gv'):
+            if solo_si_cambia and _contenido_igual(gv_file, texto):
+                logging.info(f'    * Gráfico sin cambios: {gv_file}')
+                return False
+            with open(gv_file, 'w') as fp:
+                fp.write(texto)
+        return True
+
+    def _grabar_gv(self, G, gv_file, solo_si_cambia=False):
+        ''' Graba el Dot de G. Con solo_si_cambia no lo reescribe si no cambió. Retorna True si se grabó '''
+        with self.stats.fase('escribir_gv'):
+            if solo_si_cambia and _contenido_igual(gv_file, G.to_string()):
+                logging.info(f'    * Gráfico sin cambios: {gv_file}')
+                return False
+            G.write(gv_file)
+        return True
+
+    def actualizar_archivo(self, archi, bloques):
+        '''
+        Reemplaza en el inventario los bloques de 'archi' por 'bloques' (p.ej.
+        después de editarlo) y aplica al índice del grafo solo las aristas
+        agregadas y quitadas. Retorna lo mismo que IndiceGrafo.aplicar_cambios().
+        '''
+        inventario = self.inventario
+        inicio = next((pos for pos, bloque in enumerate(inventario) if bloque.block_at_file == archi), len(inventario))
+        fin = inicio
+        while fin < len(inventario) and inventario[fin].block_at_file == archi:
+            fin = fin + 1
+        anteriores = inventario[inicio:fin]
+        inventario[inicio:fin] = bloques
+        self.jsonl_grabado = False
+        self._alcance = None
+        return self.indice_grafo().aplicar_cambios(anteriores, bloques)
 
     def _camino_inverso(self, G_total, bloque_orig):
+        import networkx as nx
 
         # Constructor de Networkx que lee un Graphviz-dot
         G= nx.DiGraph(G_total)
@@ -441,6 +1164,207 @@ class InventarioTerrierFile():
         return NG_gv  # Retorno el Graphviz-dot del camino inverso
 
 
+def _contenido_igual(nombre, texto, encoding=None):
+    ''' True si el archivo 'nombre' existe y su contenido es 'texto' (str o bytes) '''
+    try:
+        if not isinstance(texto, str):
+            with open(nombre, 'rb') as fp:
+                return fp.read() == texto
+        with open(nombre, 'r', encoding=encoding, newline='') as fp:
+            return fp.read() == texto
+    except (OSError, UnicodeDecodeError):
+        return False
+
+
+def expandir_entrada(entrada):
+    '''
+    Retorna la lista ordenada de archivos lua.ter a procesar.
+    'entrada' puede ser un archivo, un directorio (se recorre recursivamente
+    buscando '*.lua.ter') o un patrón glob.
+    '''
+    if os.path.isdir(entrada):
+        archivos = []
+        for raiz, _, nombres in os.walk(entrada):
+            archivos.extend(os.path.join(raiz, nom) for nom in nombres if nom.endswith('.lua.ter'))
+        return sorted(archivos)
+    if os.path.isfile(entrada):
+        return [entrada]
+    return sorted(arch for arch in glob.glob(entrada, recursive=True) if os.path.isfile(arch))
+
+
+def nombre_combinado(entrada, archivos):
+    '''
+    Nombre base (sin sufijo) del inventario combinado de varios archivos.
+    Queda dentro del directorio de entrada o del directorio común a todos
+    los archivos (p.ej. 'dom/dom'), nunca en el directorio padre.
+    '''
+    if os.path.isdir(entrada):
+        directorio = os.path.abspath(entrada)
+    else:
+        directorio = os.path.commonpath([os.path.abspath(arch) for arch in archivos])
+        if not os.path.isdir(directorio):
+            return directorio
+    return os.path.join(directorio, os.path.basename(directorio) or 'inventario')
+
+
+def _inventariar_archivo(archi, dir_cache=None, max_bytes_cache=None):
+    ''' Inventaría un único archivo. Se ejecuta en los procesos del pool '''
+    cache = None
+    if dir_cache is not None:
+        cache = CacheInventario(dir_cache, max_bytes_cache)
+    tf = InventarioTerrierFile(archi, False, False, "", "", cache=cache)
+    return tf.inventario
+
+
+def _inventariar_tramo(archi, largo, tramo):
+    ''' Inventaría el tramo (desde, hasta, línea inicial) de un archivo. Se ejecuta en el pool '''
+    desde, hasta, lin_desde = tramo
+    with open(archi, 'rb') as fp:
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as datos:
+            lineas = io.TextIOWrapper(io.BytesIO(datos[desde:hasta])).readlines()
+    tf = InventarioTerrierFile(archi, False, False, "", "", inventario=[])
+    return tf.inventariar_segmento(lineas, lin_desde, ultimo=(hasta == largo))
+
+
+def inventariar_por_archivo(archivos, workers=None, dir_cache=None, max_bytes_cache=None):
+    '''
+    Inventaría varios archivos en paralelo (un proceso por core por defecto).
+    Retorna la lista con el inventario de cada archivo, en el orden de 'archivos'.
+    '''
+    inventariar_uno = partial(_inventariar_archivo, dir_cache=dir_cache, max_bytes_cache=max_bytes_cache)
+    if workers == 1 or len(archivos) <= 1:
+        return [inventariar_uno(archi) for archi in archivos]
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(inventariar_uno, archivos))
+
+
+def contar_lineas_archivo(archi):
+    ''' Cantidad de líneas de 'archi', como las lee el inventario '''
+    with open(archi, 'r') as archivo:
+        return sum(1 for _ in archivo)
+
+
+def contar_inventario(stats, inventario, lineas, regex=None):
+    '''
+    Suma a 'stats' los mismos contadores que el inventario secuencial,
+    contados sobre un inventario ya armado (cache, tramos o varios
+    archivos). regex None: las llamadas se hicieron en otros procesos y
+    quedan sin dato.
+    '''
+    stats.contar('lineas', lineas)
+    stats.contar('bloques', len(inventario))
+    stats.contar('interprets', sum(len(bloque.interprets) for bloque in inventario))
+    stats.contar('tests', sum(len(bloque.tests) for bloque in inventario))
+    stats.contar('regex', regex)
+
+
+def directorio_entrada(entrada, archivos):
+    ''' Directorio que contiene todos los archivos de 'entrada' (archivo, directorio o glob) '''
+    if os.path.isdir(entrada):
+        return os.path.abspath(entrada)
+    directorio = os.path.commonpath([os.path.abspath(arch) for arch in archivos])
+    return directorio if os.path.isdir(directorio) else os.path.dirname(directorio)
+
+
+def inventariar_con_almacen(almacen, archivos, inventariar, directorio=None):
+    '''
+    Inventario de 'archivos' usando la base SQLite 'almacen': los archivos
+    sin cambios se leen de la base y el resto se procesa con 'inventariar'
+    (lista de archivos -> inventario de cada uno) y se guarda en la base.
+
+    directorio (str) -> directorio de la entrada. Los archivos guardados
+                        dentro de él que ya no existen se borran de la base.
+    '''
+    borrados = almacen.purgar(directorio) if directorio is not None else []
+    pendientes = [archi for archi in archivos if not almacen.vigente(archi)]
+    nuevos = dict(zip(pendientes, inventariar(pendientes)))
+    for archi in pendientes:
+        almacen.guardar_archivo(archi, nuevos[archi])
+    logging.info(f'    * Base {almacen.path}: {len(archivos) - len(pendientes)} archivos sin cambios, {len(pendientes)} actualizados, '
+                 f'{len(borrados)} borrados.')
+
+    inventario = []
+    for archi in archivos:
+        if archi in nuevos:
+            inventario.extend(nuevos[archi])
+            continue
+        bloques = almacen.inventario(archi)
+        # La base guarda el path absoluto: se conserva el path como se pidió
+        for bloque in bloques:
+            bloque.block_at_file = archi
+        inventario.extend(bloques)
+    return inventario
+
+
+def inventariar_archivos(archivos, workers=None, dir_cache=None, max_bytes_cache=None):
+    '''
+    Retorna un único inventario con los bloques de todos los archivos, en el
+    orden de 'archivos'.
+    '''
+    inventario = []
+    for inv_archi in inventariar_por_archivo(archivos, workers, dir_cache, max_bytes_cache):
+        inventario.extend(inv_archi)
+    return inventario
+
+
+def cargar_inventario(entrada, workers=None, dir_cache=None, max_bytes_cache=None):
+    '''
+    Lista de Bloque de 'entrada': un inventario ya grabado (.json, .jsonl,
+    snapshot o base SQLite) o uno o varios lua.ter (archivo, directorio o
+    glob, como -i), que se inventarían (con el cache si se define 'dir_cache').
+    '''
+    if es_snapshot(entrada):
+        from snapshot_inventario import SnapshotInventario
+        with SnapshotInventario(entrada) as snapshot:
+            return list(snapshot)
+    if es_base_sqlite(entrada) or entrada.endswith(('.json', '.jsonl')):
+        return [Bloque.desde_dict(bloque) for bloque in leer_inventario(entrada)]
+    archivos = expandir_entrada(entrada)
+    if len(archivos) == 0:
+        raise FileNotFoundError(f'No se encontraron archivos lua.ter en {entrada}.')
+    return inventariar_archivos(archivos, workers, dir_cache, max_bytes_cache)
+
+
+def vigilar(tf, archivos, dir_cache, max_bytes_cache=None, espera=0.3):
+    '''
+    Modo --watch: ante cada cambio (ráfagas agrupadas) vuelve a inventariar
+    los archivos modificados con el cache (solo se procesan los bloques
+    editados), aplica al grafo las aristas agregadas y quitadas y reescribe
+    el inventario y los .gv solo si su contenido cambió.
+    '''
+    from vigilancia import Vigilante
+
+    vigilante = Vigilante(archivos, espera)
+    logging.info(f'✓ Vigilando {len(archivos)} archivos. Ctrl+C para terminar.')
+    try:
+        while True:
+            cambio_grafo = False
+            for archi in vigilante.esperar_cambios():
+                try:
+                    bloques = _inventariar_archivo(archi, dir_cache, max_bytes_cache)
+                except (OSError, UnicodeDecodeError) as error:
+                    # Borrado o reemplazado tras el aviso, o grabado a medias: se sigue
+                    # con el resto y el próximo cambio lo vuelve a procesar
+                    logging.warning(f'No se pudo inventariar {archi}: {error}')
+                    continue
+                agregadas, quitadas, cambio_locales = tf.actualizar_archivo(archi, bloques)
+                logging.info(f'✓ {archi}: {len(bloques)} bloques, {len(agregadas)} aristas nuevas y {len(quitadas)} quitadas.')
+                cambio_grafo = cambio_grafo or bool(agregadas or quitadas or cambio_locales)
+
+            tf.to_file(solo_si_cambia=True)
+            if tf.graficar and cambio_grafo:
+                try:
+                    tf.graficar_relaciones(tf.ver_bloq_locales, tf.marcar, tf.bloq_reverse_path, solo_si_cambia=True)
+                except (AssertionError, KeyError):
+                    logging.warning(f'Bloque inexistente para el camino inverso: {tf.bloq_reverse_path}')
+    except KeyboardInterrupt:
+        logging.info('✓ Vigilancia terminada.')
+    finally:
+        vigilante.cerrar()
+
+
 if __name__ == '__main__':
 
     # argparse
@@ -452,14 +1376,91 @@ if __name__ == '__main__':
     #                help='Operación a realizar con a y b')
 
     parser = argparse.ArgumentParser(description="Inventario de bloques lua.ter y grafos de relaciones.")
-    parser.add_argument("-i", "--input-file", required=True, help="Archivo lua.ter a leer.")
+    parser.add_argument("-i", "--input-file", required=True,
+        help="Archivo lua.ter a leer. Acepta un directorio o un glob para inventariar varios archivos juntos.")
     parser.add_argument("-g", "--graph", action="store_true", default=False, required=False, help="Graficar relación Bloque_A->llama a-> Bloque_B")
     parser.add_argument("-l", "--local-blocks", action="store_true", default=False, required=False,
         help="Graficar solo bloques locales del Dominio. Sino se define grafica Locales y Externos")
     parser.add_argument("-m", "--mark-blocks", nargs="?", type=str, default="", required=False,
          help="Bloque/s a marcar en grafo (BLOQUE o BLOQUE1,BLOQUE2,etc...). Para múltples bloques separar con comas.")
     parser.add_argument("-r", "--reverse-path-block", type=str, default='', required=False, help="Bloque origen del camino inverso.")
-    parser.add_argument("-d", "--debug", action="store_true", required=False, help="Imprimir Log DEBUG")
+    parser.add_argument("-d", "--debug", action="store_true", required=False,
+        help="Imprimir Log DEBUG y grabar la traza de eventos del inventario (ver --trace-file).")
+    parser.add_argument("--trace-file", type=str, default=None, required=False,
+        help="Archivo JSON Lines de la traza con -d. Por defecto <archivo>_traza.jsonl. Los tramos y archivos procesados en otros procesos no se trazan.")
+    parser.add_argument("-w", "--workers", type=int, default=None, required=False,
+        help="Procesos para inventariar varios archivos. Por defecto uno por core.")
+    parser.add_argument("-s", "--split", action="store_true", default=False, required=False,
+        help="Divide el archivo en tramos (límites de bloque) y los procesa en paralelo con --workers procesos. Solo con un único lua.ter, sin cache.")
+    parser.add_argument("-f", "--format", type=str, choices=['json', 'jsonl', 'snap'], default='json', required=False,
+        help="Formato del inventario. 'jsonl' graba un bloque por línea a medida que se procesa el archivo; 'snap' graba un snapshot binario de carga rápida (el JSON se exporta con snapshot_inventario.py).")
+    parser.add_argument("--offsets", action="store_true", default=False, required=False,
+        help="Los interprets guardan offsets en el archivo en lugar de copias de sus textos (menos memoria). Solo con un único lua.ter, sin cache ni tramos.")
+    parser.add_argument("-q", "--query", type=str, choices=['callers', 'callees'], default=None, required=False,
+        help="Consulta sin Graphviz: 'callers' (camino inverso) o 'callees' (bloques llamados) desde --query-blocks.")
+    parser.add_argument("--query-blocks", type=str, default='', required=False,
+        help="Bloque/s origen de la consulta (BLOQUE o BLOQUE1,BLOQUE2,etc...).")
+    parser.add_argument("--depth", type=int, default=None, required=False,
+        help="Profundidad máxima (saltos) de la consulta. Sin límite por defecto.")
+    parser.add_argument("--query-format", type=str, choices=['json', 'dot'], default='json', required=False,
+        help="Formato del resultado de la consulta.")
+    parser.add_argument("--query-output", type=str, default=None, required=False,
+        help="Archivo dónde grabar el resultado de la consulta. Por defecto se imprime.")
+    parser.add_argument("--impact", type=str, default='', required=False,
+        help="Análisis de impacto: bloques que llaman directa o indirectamente a cada bloque (BLOQUE o BLOQUE1,BLOQUE2,etc...), raíces afectadas y bloques llamados.")
+    parser.add_argument("--graph-report", action="store_true", default=False, required=False,
+        help="Informa componentes, ciclos, bloques raíz y bloques locales muertos del grafo de llamadas.")
+    parser.add_argument("--entry-blocks", type=str, default='', required=False,
+        help="Bloques de entrada para --graph-report (B1,B2,...). Por defecto, los bloques sin llamadores.")
+    parser.add_argument("--impact-output", type=str, default=None, required=False,
+        help="Archivo JSON dónde grabar --impact y --graph-report. Por defecto se imprime.")
+    parser.add_argument("--diff", type=str, default=None, required=False,
+        help="Compara -i (versión nueva) con esta versión anterior. Ambas pueden ser lua.ter (archivo, directorio o glob) o inventarios (.json, .jsonl, .snap o .db).")
+    parser.add_argument("--diff-output", type=str, default=None, required=False,
+        help="Archivo JSON dónde grabar las diferencias. Por defecto se imprimen.")
+    parser.add_argument("--diff-graph", action="store_true", default=False, required=False,
+        help="Grafica solo el vecindario de los bloques y aristas que cambiaron.")
+    parser.add_argument("--diff-depth", type=int, default=1, required=False,
+        help="Saltos de vecinos alrededor de los cambios en --diff-graph.")
+    parser.add_argument("--gv-only", action="store_true", default=False, required=False,
+        help="Solo graba los gráficos .gv, sin layout ni imágenes.")
+    parser.add_argument("--render-formats", type=str, default=None, required=False,
+        help="Formatos de imagen para todos los gráficos (p.ej. png,svg). Por defecto png (y svg en camino inverso).")
+    parser.add_argument("--render-workers", type=int, default=None, required=False,
+        help="Gráficos renderizados a la vez. Por defecto uno por core.")
+    parser.add_argument("--render-timeout", type=float, default=None, required=False,
+        help="Segundos máximos de layout por gráfico antes de pasar a --render-fallback.")
+    parser.add_argument("--render-fallback", type=str, default='sfdp', required=False,
+        help="Motor de Graphviz para grafos grandes o que superan el timeout.")
+    parser.add_argument("--render-max-nodes", type=int, default=None, required=False,
+        help="Desde esta cantidad de nodos se usa directamente --render-fallback.")
+    parser.add_argument("--partition", type=str, choices=['auto', 'none', 'components', 'files', 'local'], default=None, required=False,
+        help="Renderiza el gráfico general por partes (en paralelo) con un gráfico resumen que las enlaza: 'components' (componentes débilmente conexas), "
+             "'files' (archivo de cada bloque), 'local' (locales y externos), 'none' o 'auto' (por defecto: parte por componentes los gráficos de más de --partition-max-nodes nodos).")
+    parser.add_argument("--partition-max-nodes", type=int, default=2000, required=False,
+        help="Nodos desde los que --partition auto parte el gráfico general. También es el tamaño de las partes que juntan componentes chicas.")
+    parser.add_argument("--render-cache", type=str, default=None, required=False,
+        help="Directorio del cache de imágenes. Si el gráfico no cambió se reutilizan sin hacer layout.")
+    parser.add_argument("--render-cache-max-mb", type=int, default=512, required=False,
+        help="Tamaño máximo del cache de imágenes en MB.")
+    parser.add_argument("--cache-dir", type=str, default=None, required=False,
+        help="Directorio del cache de inventarios. Solo se vuelven a procesar los archivos (y bloques) modificados.")
+    parser.add_argument("--cache-max-mb", type=int, default=256, required=False,
+        help="Tamaño máximo del cache de inventarios en MB.")
+    parser.add_argument("--db", type=str, default=None, required=False,
+        help="Base SQLite de inventarios. Los archivos sin cambios se leen de la base y el resto se procesa y se guarda en ella.")
+    parser.add_argument("--serve", nargs="?", type=str, default=None, const='127.0.0.1:8765', required=False,
+        help="Modo servidor: mantiene el inventario en memoria y responde consultas por HTTP en HOST:PUERTO (por defecto 127.0.0.1:8765) o en unix:PATH.")
+    parser.add_argument("--serve-interval", type=float, default=1.0, required=False,
+        help="Segundos mínimos entre revisiones de archivos modificados en modo servidor.")
+    parser.add_argument("--watch", action="store_true", default=False, required=False,
+        help="Después de la primera corrida vigila los archivos y actualiza inventario y grafos ante cada cambio (usa --cache-dir, por defecto .cache_inventario).")
+    parser.add_argument("--watch-delay", type=float, default=0.3, required=False,
+        help="Segundos sin cambios que cierran una ráfaga de grabaciones en --watch.")
+    parser.add_argument("--stats", nargs="?", type=str, default=None, const='', required=False,
+        help="Tiempos y contadores por fase. Sin valor se muestran en el log, con un archivo se graban en JSON.")
+    parser.add_argument("--profile", type=str, default='', required=False,
+        help=f"Fase/s a correr bajo cProfile y tracemalloc (FASE o FASE1,FASE2): {', '.join(FASES)}.")
 
     # Se convierte los parser_args en un Dict()
     args = vars(parser.parse_args())
@@ -472,19 +1473,255 @@ if __name__ == '__main__':
     if (args['graph'] == False) and (args['reverse_path_block'] != ''):
         parser.error('El argumento --reverser-path-block requiere del argumento --graph para generar el Grafo antes.')
 
+    if (args['graph'] == False) and (args['partition'] is not None):
+        parser.error('El argumento --partition requiere del argumento --graph para generar el Grafo antes.')
+    if args['partition_max_nodes'] < 1:
+        parser.error('El argumento --partition-max-nodes debe ser mayor a 0.')
+
+    if (args['debug'] == False) and (args['trace_file'] is not None):
+        parser.error('El argumento --trace-file requiere del argumento --debug.')
+    if (args['query'] is not None) and (args['query_blocks'] == ''):
+        parser.error('El argumento --query requiere del argumento --query-blocks con los bloques origen.')
+    if (args['depth'] is not None) and (args['depth'] < 0):
+        parser.error('El argumento --depth no puede ser negativo.')
+
+    if (args['entry_blocks'] != '') and (not args['graph_report']):
+        parser.error('El argumento --entry-blocks requiere del argumento --graph-report.')
+    if (args['impact_output'] is not None) and (args['impact'] == '') and (not args['graph_report']):
+        parser.error('El argumento --impact-output requiere del argumento --impact o --graph-report.')
+
+    if (args['diff'] is None) and ((args['diff_output'] is not None) or args['diff_graph']):
+        parser.error('Los argumentos --diff-output y --diff-graph requieren del argumento --diff.')
+    if (args['diff'] is not None) and (args['graph'] or args['watch'] or (args['serve'] is not None) or (args['db'] is not None)):
+        parser.error('El argumento --diff no se puede combinar con --graph, --watch, --serve ni --db.')
+    if args['diff_depth'] < 0:
+        parser.error('El argumento --diff-depth no puede ser negativo.')
+
+    if args['watch'] and ((args['serve'] is not None) or (args['db'] is not None)):
+        parser.error('El argumento --watch no se puede combinar con --serve ni con --db.')
+    if args['graph']:
+        try:
+            import pygraphviz
+            import networkx
+        except ImportError as error:
+            parser.error(f'El argumento --graph requiere pygraphviz y networkx ({error}).')
+    if args['offsets'] and ((args['cache_dir'] is not None) or args['split'] or args['watch'] or
+                            (args['db'] is not None) or (args['serve'] is not None) or (args['diff'] is not None)):
+        parser.error('El argumento --offsets no se puede combinar con --cache-dir, --split, --watch, --db, --serve ni --diff.')
+    if args['split'] and ((args['cache_dir'] is not None) or args['watch'] or (args['serve'] is not None) or (args['diff'] is not None)):
+        parser.error('El argumento --split no se puede combinar con --cache-dir, --watch, --serve ni --diff.')
+    if args['watch'] and (args['cache_dir'] is None):
+        # Los cambios se procesan por bloque a partir del cache
+        args['cache_dir'] = '.cache_inventario'
+    if (args['db'] is not None) and args['split']:
+        parser.error('El argumento --db no se puede combinar con --split.')
+    if (args['serve'] is not None) and (not args['serve'].startswith('unix:')) and (not args['serve'].rpartition(':')[2].isdigit()):
+        parser.error('El argumento --serve debe ser HOST:PUERTO o unix:PATH.')
+    if (args['serve'] is not None) and args['serve'].startswith('unix:'):
+        from servidor_consultas import path_socket_libre
+        if not path_socket_libre(args['serve'][len('unix:'):]):
+            parser.error(f'El argumento --serve apunta a {args["serve"][len("unix:"):]}, que existe y no es un socket Unix.')
+
+    perfilar = [fase for fase in args['profile'].split(',') if fase]
+    for fase in perfilar:
+        if fase not in FASES:
+            parser.error(f'Fase desconocida en --profile: {fase}. Opciones: {", ".join(FASES)}.')
+
     #print(args)
 
+    archivos = expandir_entrada(args['input_file'])
+    if len(archivos) == 0:
+        parser.error(f'No se encontraron archivos lua.ter en {args["input_file"]}.')
+    if args['offsets'] and (archivos != [args['input_file']]):
+        parser.error('El argumento --offsets requiere un único archivo lua.ter en --input-file (no un directorio ni un glob).')
+    if args['split'] and (archivos != [args['input_file']]):
+        parser.error('El argumento --split requiere un único archivo lua.ter en --input-file (no un directorio ni un glob).')
+    if (args['workers'] is not None) and (args['workers'] < 1):
+        parser.error('El argumento --workers debe ser mayor a 0.')
+
+    cache = None
+    max_bytes_cache = args['cache_max_mb'] * 1024 * 1024
+    if args['cache_dir'] is not None:
+        cache = CacheInventario(args['cache_dir'], max_bytes_cache)
+
+    if args['serve'] is not None:
+        # Modo servidor: se inventaría una vez y se atienden consultas hasta Ctrl+C o SIGTERM
+        from servidor_consultas import ServidorInventario, servir
+        logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=logging.DEBUG if args['debug'] else logging.INFO)
+        logging.info(f'✓ Inventariando {len(archivos)} archivos de {args["input_file"]}.')
+        inventario_servidor = ServidorInventario(
+            args['input_file'],
+            expandir_entrada,
+            partial(inventariar_por_archivo, workers=args['workers'], dir_cache=args['cache_dir'], max_bytes_cache=max_bytes_cache),
+            args['serve_interval'])
+        servir(inventario_servidor, args['serve'])
+        sys.exit(0)
+
+    stats = None
+    if (args['stats'] is not None) or perfilar:
+        # Los perfiles se nombran como el inventario: <archivo>_<fase>.prof
+        stats = Estadisticas(perfilar, os.path.basename(archivos[0]) if len(archivos) == 1 else 'perfil')
+
+    opciones_render = OpcionesRender(
+        solo_gv=args['gv_only'],
+        formatos=args['render_formats'].split(',') if args['render_formats'] else None,
+        workers=args['render_workers'],
+        timeout=args['render_timeout'],
+        prog_alternativo=args['render_fallback'],
+        umbral_nodos=args['render_max_nodes'],
+        cache=CacheRender(args['render_cache'], args['render_cache_max_mb'] * 1024 * 1024) if args['render_cache'] else None,
+        particion=args['partition'] or 'auto',
+        max_nodos_particion=args['partition_max_nodes'])
+
+    if args['diff'] is not None:
+        # Modo diff: se comparan las dos versiones y se termina
+        from diff_inventario import DiffInventario
+        logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=logging.DEBUG if args['debug'] else logging.INFO)
+        medir = stats or SIN_ESTADISTICAS
+        cargar = partial(cargar_inventario, workers=args['workers'], dir_cache=args['cache_dir'], max_bytes_cache=max_bytes_cache)
+        try:
+            with medir.fase('inventariar'):
+                antes = cargar(args['diff'])
+                despues = cargar(args['input_file'])
+        except (FileNotFoundError, ValueError) as error:
+            parser.error(str(error))
+        with medir.fase('diff'):
+            diferencias = DiffInventario(antes, despues)
+        logging.info(f'✓ Diferencias de {args["diff"]} a {args["input_file"]}: {diferencias.resumen()}')
+
+        texto = json.dumps(diferencias.a_dict(), ensure_ascii=False, indent=4) + '\n'
+        if args['diff_output'] is None:
+            sys.stdout.write(texto)
+        else:
+            with open(args['diff_output'], 'w') as fp:
+                fp.write(texto)
+            logging.info(f'✓ Diferencias grabadas en: {args["diff_output"]}')
+
+        if args['diff_graph']:
+            base = os.path.splitext(os.path.basename(os.path.normpath(args['input_file'])))[0]
+            gv_file = f'{base}_diff.gv'
+            with medir.fase('escribir_gv'):
+                dot = diferencias.a_dot(args['diff_depth'])
+                with open(gv_file, 'w') as fp:
+                    fp.write(dot)
+            logging.info('✓ Gráfico de diferencias generado.')
+            logging.info(f'    * Archivo: {gv_file}')
+            with medir.fase('render'):
+                resultados = renderizar_trabajos([TrabajoRender(gv_file, ['png', 'svg'], len(diferencias.vecindario(args['diff_depth'])))],
+                                                 opciones_render)
+            for archivos_render in resultados.values():
+                if isinstance(archivos_render, list):
+                    for archivo in archivos_render:
+                        logging.info(f'    * Archivo: {archivo}')
+
+        if stats is not None:
+            stats.informar(args['stats'] or None)
+        sys.exit(0)
+
+    if (archivos == [args['input_file']]) and (args['db'] is None):
+        # Un único archivo: se inventaría directamente
+        inventario = None
+        archi = args['input_file']
+    else:
+        logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=logging.DEBUG if args['debug'] else logging.INFO)
+        logging.info(f'✓ Inventariando {len(archivos)} archivos de {args["input_file"]}.')
+        with (stats or SIN_ESTADISTICAS).fase('inventariar'):
+            if args['db'] is not None:
+                from almacen_sqlite import AlmacenInventario
+                almacen = AlmacenInventario(args['db'])
+                inventario = inventariar_con_almacen(almacen, archivos,
+                    partial(inventariar_por_archivo, workers=args['workers'], dir_cache=args['cache_dir'], max_bytes_cache=max_bytes_cache),
+                    directorio_entrada(args['input_file'], archivos))
+                almacen.cerrar()
+            else:
+                inventario = inventariar_archivos(archivos, args['workers'], args['cache_dir'], max_bytes_cache)
+        if stats is not None:
+            # Los archivos se inventarían en otros procesos (o desde la base)
+            contar_inventario(stats, inventario, sum(contar_lineas_archivo(arch) for arch in archivos))
+        archi = args['input_file'] if archivos == [args['input_file']] else nombre_combinado(args['input_file'], archivos)
+
+    traza = None
+    if args['debug']:
+        traza = Traza(args['trace_file'] or archi + '_traza.jsonl')
+
     tf = InventarioTerrierFile(
-        archi=args['input_file'],
+        archi=archi,
         graficar=args['graph'],
         ver_bloq_locales=args['local_blocks'],
         marcar=args['mark_blocks'],
         bloq_reverse_path=args['reverse_path_block'],
-        debug=False)
+        debug=args['debug'],
+        inventario=inventario,
+        cache=cache,
+        tramos=(args['workers'] or 0) if args['split'] else None,
+        offsets=args['offsets'],
+        formato=args['format'],
+        retener=(args['query'] is not None) or (args['impact'] != '') or args['graph_report'] or args['watch'],
+        render=opciones_render,
+        stats=stats,
+        traza=traza)
+
+    if traza is not None:
+        traza.cerrar()
+
+    if cache is not None:
+        cache.depurar()
 
     # Bajada del inventario a JSON
     tf.to_file()
 
+    # Consulta de caminos sobre el índice del grafo (sin layout)
+    if args['query'] is not None:
+        indice = tf.indice_grafo()
+        with tf.stats.fase('consulta'):
+            resultados = indice.consultar(args['query_blocks'].split(','), args['query'], args['depth'])
+        for resultado in resultados:
+            if 'error' in resultado:
+                logging.warning(f'{resultado["error"]}: {resultado["bloque"]}')
+        if args['query_format'] == 'json':
+            texto = json.dumps(resultados, ensure_ascii=False, indent=4) + '\n'
+        else:
+            texto = ''.join(resultado_a_dot(resultado) for resultado in resultados if 'error' not in resultado)
+        if args['query_output'] is None:
+            sys.stdout.write(texto)
+        else:
+            with open(args['query_output'], 'w') as fp:
+                fp.write(texto)
+            logging.info(f'✓ Consulta grabada en: {args["query_output"]}')
+
+    # Análisis de impacto, ciclos y bloques muertos sobre el DAG condensado
+    if (args['impact'] != '') or args['graph_report']:
+        alcance = tf.alcance_grafo()
+        analisis = {}
+        with tf.stats.fase('consulta'):
+            if args['impact'] != '':
+                analisis['impacto'] = alcance.impacto(args['impact'].split(','))
+            if args['graph_report']:
+                entradas = [bloque + '(...)' for bloque in args['entry_blocks'].split(',') if bloque] or None
+                analisis['informe'] = alcance.informe(entradas)
+        for resultado in analisis.get('impacto', []):
+            if 'error' in resultado:
+                logging.warning(f'{resultado["error"]}: {resultado["bloque"]}')
+        if 'informe' in analisis:
+            informe = analisis['informe']
+            logging.info(f'✓ Grafo: {informe["componentes"]} componentes, {len(informe["ciclos"])} ciclos, '
+                         f'{len(informe["raices"])} raíces y {len(informe["bloques_muertos"])} bloques muertos.')
+        texto = json.dumps(analisis, ensure_ascii=False, indent=4) + '\n'
+        if args['impact_output'] is None:
+            sys.stdout.write(texto)
+        else:
+            with open(args['impact_output'], 'w') as fp:
+                fp.write(texto)
+            logging.info(f'✓ Análisis de impacto grabado en: {args["impact_output"]}')
+
+    if stats is not None:
+        stats.informar(args['stats'] or None)
+
+    if args['watch']:
+        vigilar(tf, archivos, args['cache_dir'], max_bytes_cache, args['watch_delay'])
+
+    tf.cerrar()
+
     # Listado de bloques locales por pantalla
     #tf.listar_blocks()
 
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+######################################################################
+# Programa   : bench_analizar_lua.py                                 #
+# Descripción: Benchmark de analizar_lua.py con archivos lua.ter     #
+#              sintéticos (generar_lua_ter.py) de tamaño creciente.  #
+#                                                                    #
+#              Mide por separado las fases inventariar, to_file,     #
+#              armado del grafo (armar_grafo) y camino inverso       #
+#              (_camino_inverso y su versión sin Graphviz sobre el   #
+#              índice), además del alcance (componentes y bitsets)   #
+#              con una consulta de impacto sobre todos los bloques,  #
+#              la recarga del inventario desde el JSON y desde el    #
+#              snapshot binario (completo y solo el índice) y la     #
+#              partición del gráfico general por componentes.        #
+#              Informa tiempo, líneas/s, bloques/s y pico de         #
+#              memoria. Cada tamaño corre en un proceso aparte       #
+#              para que el pico de memoria sea el de ese tamaño.     #
+#                                                                    #
+#              Los resultados pueden grabarse como línea base JSON   #
+#              (--save) y compararse con una anterior (--compare).   #
+#                                                                    #
+#Ejemplo:                                                            #
+#  python3 bench_analizar_lua.py --save base.json                    #
+#  python3 bench_analizar_lua.py --compare base.json                 #
+######################################################################
+import os
+import sys
+import json
+import time
+import logging
+import platform
+import argparse
+import resource
+import tempfile
+import subprocess
+import tracemalloc
+
+DIR_SCRIPT = os.path.dirname(os.path.abspath(__file__))
+
+
+def _rss_max_mb():
+    ''' Pico de memoria residente del proceso en MB (ru_maxrss está en KB en Linux) '''
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss = rss / 1024
+    return round(rss / 1024, 1)
+
+
+class Medidor():
+    ''' Mide tiempo y memoria de cada fase '''
+
+    def __init__(self, con_tracemalloc=False):
+        self.fases = {}
+        self.con_tracemalloc = con_tracemalloc
+
+    def medir(self, nombre, funcion, lineas=None, bloques=None):
+        if self.con_tracemalloc:
+            tracemalloc.start()
+        inicio = time.perf_counter()
+        resultado = funcion()
+        segundos = time.perf_counter() - inicio
+
+        fase = {'segundos': round(segundos, 4), 'rss_max_mb': _rss_max_mb()}
+        if self.con_tracemalloc:
+            fase['asignado_max_mb'] = round(tracemalloc.get_traced_memory()[1] / 1e6, 1)
+            tracemalloc.stop()
+        if lineas is not None:
+            fase['lineas_s'] = round(lineas / segundos) if segundos > 0 else None
+        if bloques is not None:
+            fase['bloques_s'] = round(bloques / segundos) if segundos > 0 else None
+        self.fases[nombre] = fase
+        return resultado
+
+
+def medir_archivo(archi, con_tracemalloc=False):
+    ''' Corre todas las fases sobre 'archi'. Se ejecuta en un proceso aparte '''
+    sys.path.insert(0, DIR_SCRIPT)
+    import analizar_lua
+    from registros_terrier import Bloque
+    from inventario_io import leer_inventario
+
+    # Configura el log antes que InventarioTerrierFile para que sus basicConfig no tengan efecto
+    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(message)s', level=logging.WARNING)
+    with open(archi, 'rb') as fp:
+        lineas = sum(1 for _ in fp)
+
+    medidor = Medidor(con_tracemalloc)
+    tf = medidor.medir('inventariar', lambda: analizar_lua.InventarioTerrierFile(archi, False, False, "", ""), lineas=lineas)
+    bloques = len(tf.inventario)
+    medidor.fases['inventariar']['bloques_s'] = round(bloques / medidor.fases['inventariar']['segundos'])
+
+    medidor.medir('to_file', tf.to_file, bloques=bloques)
+    indice = medidor.medir('indice_grafo', tf.indice_grafo, bloques=bloques)
+
+    # Recarga del inventario: JSON contra snapshot binario (completo y solo nombres y aristas)
+    from snapshot_inventario import SnapshotInventario, grabar_snapshot
+    nombre_snapshot = archi + '_inventario.snap'
+    medidor.medir('grabar_snapshot', lambda: grabar_snapshot(nombre_snapshot, tf.inventario, indice), bloques=bloques)
+    medidor.medir('leer_json', lambda: [Bloque.desde_dict(bloque) for bloque in leer_inventario(tf.nombre_inventario())], bloques=bloques)
+
+    def leer_snapshot(solo_indice=False):
+        with SnapshotInventario(nombre_snapshot) as snapshot:
+            return snapshot.indice_grafo() if solo_indice else list(snapshot)
+    medidor.medir('leer_snapshot', leer_snapshot, bloques=bloques)
+    medidor.medir('indice_snapshot', lambda: leer_snapshot(solo_indice=True), bloques=bloques)
+
+    # Bloque más llamado como origen del camino inverso
+    origen = max(range(len(indice.nombres)), key=lambda id_nodo: len(indice.predecesores[id_nodo]), default=None)
+    if origen is not None:
+        nombre_origen = indice.nombres[origen]
+        medidor.medir('camino_inverso_indice', lambda: indice.recorrer(nombre_origen, 'callers'))
+
+    alcance = medidor.medir('alcance', tf.alcance_grafo, bloques=bloques)
+    medidor.medir('impacto_todos', lambda: alcance.impacto([nombre[:-len('(...)')] for nombre in alcance.definidos()]),
+                  bloques=bloques)
+
+    from particion_grafo import particionar, archivos_de_nodos
+    medidor.medir('particionar', lambda: particionar(indice, 'components', 2000, archivos=archivos_de_nodos(tf.inventario, indice.normalizar)),
+                  bloques=bloques)
+
+    try:
+        G, _ = medidor.medir('armar_grafo', tf.armar_grafo, bloques=bloques)
+        if origen is not None:
+            medidor.medir('camino_inverso', lambda: tf._camino_inverso(G, nombre_origen))
+    except ImportError as error:
+        # Sin pygraphviz / networkx solo se miden las fases que no los usan
+        logging.warning(f'Fases de Graphviz omitidas: {error}')
+
+    return {'lineas': lineas, 'bloques': bloques, 'aristas': len(indice.aristas), 'fases': medidor.fases}
+
+
+def correr(tamanios, opciones_generador, con_tracemalloc=False, dir_trabajo=None):
+    ''' Genera y mide un archivo por tamaño. Retorna dict tamaño -> resultados '''
+    sys.path.insert(0, DIR_SCRIPT)
+    import generar_lua_ter
+
+    resultados = {}
+    with tempfile.TemporaryDirectory(dir=dir_trabajo) as directorio:
+        for tamanio in tamanios:
+            archi = os.path.join(directorio, f'sintetico_{tamanio}.lua.ter')
+            with open(archi, 'w') as fp:
+                generar_lua_ter.generar(fp, tamanio, **opciones_generador)
+
+            comando = [sys.executable, os.path.abspath(__file__), '--measure', archi]
+            if con_tracemalloc:
+                comando.append('--tracemalloc')
+            salida = subprocess.run(comando, check=True, cwd=directorio, stdout=subprocess.PIPE, text=True).stdout
+            resultados[str(tamanio)] = json.loads(salida)
+            imprimir(tamanio, resultados[str(tamanio)])
+    return resultados
+
+
+def imprimir(tamanio, resultado):
+    print(f'\n== {tamanio} bloques ({resultado["lineas"]} líneas, {resultado["aristas"]} aristas) ==')
+    print(f'{"fase":<24}{"segundos":>10}{"líneas/s":>12}{"bloques/s":>12}{"rss máx MB":>12}')
+    for nombre, fase in resultado['fases'].items():
+        print(f'{nombre:<24}{fase["segundos"]:>10.4f}{fase.get("lineas_s") or "":>12}'
+              f'{fase.get("bloques_s") or "":>12}{fase["rss_max_mb"]:>12}')
+
+
+def _commit_actual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=DIR_SCRIPT, check=True,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(base, actual, tolerancia):
+    '''
+    Compara los tiempos contra una línea base. Retorna la lista de
+    regresiones (fases que tardan más de base * (1 + tolerancia)).
+    '''
+    regresiones = []
+    for tamanio, resultado in actual['resultados'].items():
+        base_tamanio = base['resultados'].get(tamanio)
+        if base_tamanio is None:
+            continue
+        for nombre, fase in resultado['fases'].items():
+            base_fase = base_tamanio['fases'].get(nombre)
+            if base_fase is None:
+                continue
+            relacion = fase['segundos'] / base_fase['segundos'] if base_fase['segundos'] > 0 else 1.0
+            marca = 'REGRESIÓN' if relacion > 1 + tolerancia else ''
+            print(f'{tamanio:>8} {nombre:<24} {base_fase["segundos"]:>9.4f}s -> {fase["segundos"]:>9.4f}s  x{relacion:.2f} {marca}')
+            if marca:
+                regresiones.append((tamanio, nombre, relacion))
+    return regresiones
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Benchmark de analizar_lua.py con archivos lua.ter sintéticos.")
+    parser.add_argument("--sizes", type=str, default="1000,10000,100000", required=False,
+        help="Cantidades de bloques a medir separadas por comas.")
+    parser.add_argument("--interpret-lines", type=int, default=3, required=False, help="Líneas de cada interpret.")
+    parser.add_argument("--fan-out", type=int, default=3, required=False, help="Bloques llamados por interpret.")
+    parser.add_argument("--queries", type=int, default=1, required=False, help="Queries '--&' por bloque.")
+    parser.add_argument("--tests", type=int, default=0, required=False, help="Casos de prueba ('tests') por bloque.")
+    parser.add_argument("--comments", type=float, default=0.2, required=False, help="Densidad de comentarios (0 a 1).")
+    parser.add_argument("--tracemalloc", action="store_true", default=False, required=False,
+        help="Mide también el pico de memoria asignada por fase (más lento).")
+    parser.add_argument("--save", type=str, default=None, required=False, help="Graba los resultados como línea base JSON.")
+    parser.add_argument("--compare", type=str, default=None, required=False, help="Línea base JSON contra la que comparar.")
+    parser.add_argument("--tolerance", type=float, default=0.2, required=False,
+        help="Aumento de tiempo tolerado antes de informar una regresión (0.2 = 20%%).")
+    parser.add_argument("--measure", type=str, default=None, required=False, help=argparse.SUPPRESS)
+
+    args = vars(parser.parse_args())
+
+    # Proceso hijo: mide un archivo e imprime el resultado en JSON
+    if args['measure'] is not None:
+        print(json.dumps(medir_archivo(args['measure'], args['tracemalloc'])))
+        sys.exit(0)
+
+    opciones_generador = dict(
+        largo_interpret=args['interpret_lines'],
+        fan_out=args['fan_out'],
+        queries=args['queries'],
+        comentarios=args['comments'],
+        tests=args['tests'],
+    )
+    tamanios = [int(tamanio) for tamanio in args['sizes'].split(',')]
+    actual = {
+        'commit': _commit_actual(),
+        'python': platform.python_version(),
+        'opciones': opciones_generador,
+        'resultados': correr(tamanios, opciones_generador, args['tracemalloc']),
+    }
+
+    if args['save'] is not None:
+        with open(args['save'], 'w') as fp:
+            json.dump(actual, fp, indent=4)
+        print(f'\n✓ Línea base grabada en {args["save"]}')
+
+    if args['compare'] is not None:
+        with open(args['compare']) as fp:
+            base = json.load(fp)
+        print(f'\nComparación contra {args["compare"]} (commit {base.get("commit")}):')
+        regresiones = comparar(base, actual, args['tolerance'])
+        if regresiones:
+            print(f'\n✗ {len(regresiones)} regresiones.')
+            sys.exit(1)
+        print('\n✓ Sin regresiones.')
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+######################################################################
+# Programa   : bench_importtime.py                                   #
+# Descripción: Control del tiempo de arranque de analizar_lua.py.    #
+#                                                                    #
+#              Importa analizar_lua con 'python -X importtime' varias#
+#              veces (cada una en un proceso nuevo) y toma el mejor  #
+#              tiempo acumulado. Falla (sale con 1) si supera el     #
+#              presupuesto o si un inventario sin -g carga módulos   #
+#              que solo usan los gráficos, la depuración, --serve,   #
+#              --db, --watch, --diff, -f snap o --profile.           #
+#                                                                    #
+#              Con --run también mide una corrida completa de solo   #
+#              inventario sobre un lua.ter sintético chico.          #
+#                                                                    #
+#Ejemplo:                                                            #
+#  python3 bench_importtime.py --budget-ms 120 --top 10 --run        #
+######################################################################
+import os
+import re
+import sys
+import time
+import argparse
+import tempfile
+import subprocess
+
+DIR_SCRIPT = os.path.dirname(os.path.abspath(__file__))
+
+# Módulos que no deben cargarse al importar analizar_lua (solo inventario)
+PROHIBIDOS = (
+    'pygraphviz', 'networkx', 'pdb', 'pprint',
+    'sqlite3', 'http.server', 'ctypes', 'cProfile', 'tracemalloc',
+    'concurrent.futures', 'servidor_consultas', 'almacen_sqlite', 'vigilancia', 'diff_inventario',
+    'snapshot_inventario', 'particion_grafo',
+)
+
+RE_LINEA = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def importar(modulo='analizar_lua'):
+    '''
+    Importa 'modulo' en un proceso nuevo con -X importtime.
+    Retorna la lista de (módulo, propio_us, acumulado_us, nivel).
+    '''
+    entorno = dict(os.environ)
+    entorno['PYTHONPATH'] = os.pathsep.join(filter(None, [DIR_SCRIPT, entorno.get('PYTHONPATH')]))
+    salida = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {modulo}'],
+                            cwd=DIR_SCRIPT, env=entorno, check=True, stderr=subprocess.PIPE, text=True).stderr
+    modulos = []
+    for linea in salida.splitlines():
+        encontrado = RE_LINEA.match(linea)
+        if encontrado is not None:
+            propio, acumulado, sangria, nombre = encontrado.groups()
+            modulos.append((nombre, int(propio), int(acumulado), len(sangria) // 2))
+    return modulos
+
+
+def correr_inventario(repeticiones):
+    ''' Mejor tiempo (s) de una corrida de solo inventario sobre un archivo de 20 bloques '''
+    sys.path.insert(0, DIR_SCRIPT)
+    import generar_lua_ter
+
+    tiempos = []
+    with tempfile.TemporaryDirectory() as directorio:
+        archi = os.path.join(directorio, 'chico.lua.ter')
+        with open(archi, 'w') as fp:
+            generar_lua_ter.generar(fp, 20)
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            subprocess.run([sys.executable, os.path.join(DIR_SCRIPT, 'analizar_lua.py'), '-i', archi],
+                           cwd=directorio, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Tiempo de importación (arranque en frío) de analizar_lua.py.")
+    parser.add_argument("--budget-ms", type=float, default=150.0, required=False,
+        help="Tiempo máximo de importación de analizar_lua en ms.")
+    parser.add_argument("--repeat", type=int, default=5, required=False, help="Importaciones a medir (se toma la mejor).")
+    parser.add_argument("--top", type=int, default=0, required=False, help="Muestra los N módulos más costosos.")
+    parser.add_argument("--run", action="store_true", default=False, required=False,
+        help="Mide también una corrida completa de solo inventario.")
+
+    args = vars(parser.parse_args())
+    if args['repeat'] < 1:
+        parser.error('El argumento --repeat debe ser mayor a 0.')
+
+    mediciones = [importar() for _ in range(args['repeat'])]
+    totales = [next(acumulado for nombre, _, acumulado, _ in modulos if nombre == 'analizar_lua') for modulos in mediciones]
+    mejor = min(range(len(totales)), key=totales.__getitem__)
+    modulos = mediciones[mejor]
+    total_ms = totales[mejor] / 1000
+
+    print(f'Importación de analizar_lua: {total_ms:.1f} ms (mejor de {args["repeat"]}, presupuesto {args["budget_ms"]:.0f} ms)')
+
+    if args['top'] > 0:
+        print(f'\n{"módulo":<40}{"propio ms":>12}{"acumulado ms":>14}')
+        for nombre, propio, acumulado, nivel in sorted(modulos, key=lambda modulo: -modulo[2])[:args['top']]:
+            print(f'{"  " * nivel + nombre:<40}{propio / 1000:>12.1f}{acumulado / 1000:>14.1f}')
+
+    if args['run']:
+        print(f'\nCorrida de solo inventario: {correr_inventario(args["repeat"]) * 1000:.0f} ms')
+
+    cargados = set(nombre for nombre, _, _, _ in modulos)
+    prohibidos = [modulo for modulo in PROHIBIDOS if modulo in cargados]
+    errores = []
+    if prohibidos:
+        errores.append(f'Módulos cargados sin necesidad: {", ".join(prohibidos)}')
+    if total_ms > args['budget_ms']:
+        errores.append(f'La importación supera el presupuesto por {total_ms - args["budget_ms"]:.1f} ms')
+    for error in errores:
+        print(f'✗ {error}')
+    if errores:
+        sys.exit(1)
+    print('✓ Arranque dentro del presupuesto.')
@@ -0,0 +1,191 @@
+######################################################################
+# Programa   : cache_inventario.py                                   #
+# Descripción: Cache en disco de los inventarios de archivos         #
+#              .lua.ter para no volver a procesar los que no         #
+#              cambiaron desde la última corrida.                    #
+#                                                                    #
+#              Cada archivo se identifica por path, tamaño, mtime y  #
+#              hash del contenido. Si el archivo cambió solo se      #
+#              vuelven a procesar los bloques editados: el resto se  #
+#              reutiliza corriendo sus 'block_lin_nro'.              #
+######################################################################
+import os
+import io
+import json
+import hashlib
+import logging
+
+from registros_terrier import Bloque
+
+
+class CacheInventario():
+
+    # 2: bloques con sus casos de prueba ('tests'). 3: tramos con 'ultimo'
+    VERSION = 3
+
+    def __init__(self, directorio='.cache_inventario', max_bytes=256 * 1024 * 1024):
+        '''
+        directorio (str) -> directorio dónde se guardan las entradas.
+        max_bytes (int) -> tamaño máximo del cache. Al depurar se eliminan
+                           las entradas usadas hace más tiempo hasta no superarlo.
+        '''
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        os.makedirs(self.directorio, exist_ok=True)
+
+    def _path_entrada(self, archi):
+        ''' Archivo del cache correspondiente a un lua.ter '''
+        clave = hashlib.sha1(os.path.abspath(archi).encode('utf-8')).hexdigest()
+        return os.path.join(self.directorio, clave + '.json')
+
+    def _leer_entrada(self, path_entrada, con_datos=True):
+        '''
+        Una entrada son dos líneas JSON: metadatos y datos. Así al depurar
+        solo se decodifican los metadatos.
+        '''
+        try:
+            with open(path_entrada, 'r', encoding='utf-8') as fp:
+                meta = json.loads(fp.readline())
+                if meta.get('version') != self.VERSION:
+                    return None, None
+                datos = json.loads(fp.readline()) if con_datos else None
+        except (OSError, ValueError):
+            return None, None
+        return meta, datos
+
+    def _grabar_entrada(self, path_entrada, meta, datos):
+        ''' Graba la entrada de forma atómica (varios procesos pueden usar el cache) '''
+        path_tmp = f'{path_entrada}.{os.getpid()}.tmp'
+        with open(path_tmp, 'w', encoding='utf-8') as fp:
+            fp.write(json.dumps(meta, ensure_ascii=False) + '\n')
+            fp.write(json.dumps(datos, ensure_ascii=False) + '\n')
+        os.replace(path_tmp, path_entrada)
+
+    def inventario(self, tf):
+        '''
+        Retorna el inventario de bloques de tf.n_archi, desde el cache si el
+        archivo no cambió o procesando con 'tf' solo los tramos editados.
+        '''
+        archi = tf.n_archi
+        stat = os.stat(archi)
+        path_entrada = self._path_entrada(archi)
+        meta, datos = self._leer_entrada(path_entrada)
+
+        if (meta is not None) and (meta['size'] == stat.st_size) and (meta['mtime_ns'] == stat.st_mtime_ns):
+            logging.info(f'    * Inventario desde cache: {archi}')
+            os.utime(path_entrada)
+            return self._bloques(datos, archi)
+
+        with open(archi, 'rb') as fp:
+            contenido = fp.read()
+        hash_archi = hashlib.blake2b(contenido, digest_size=16).hexdigest()
+        meta_nueva = {
+            'version': self.VERSION,
+            'archivo': os.path.abspath(archi),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'hash': hash_archi,
+        }
+
+        if (meta is not None) and (meta['hash'] == hash_archi):
+            # Solo cambió el mtime
+            logging.info(f'    * Inventario desde cache: {archi}')
+            self._grabar_entrada(path_entrada, meta_nueva, datos)
+            return self._bloques(datos, archi)
+
+        # Misma lectura que open(archi, 'r')
+        lineas = io.TextIOWrapper(io.BytesIO(contenido)).readlines()
+        anteriores = {}
+        if (datos is not None) and ('segmentos' in datos):
+            anteriores = {(seg['hash'], seg['ultimo']): seg for seg in datos['segmentos']}
+
+        datos_nuevos = self._inventariar_segmentos(tf, lineas, anteriores)
+        self._grabar_entrada(path_entrada, meta_nueva, datos_nuevos)
+        return self._bloques(datos_nuevos, archi)
+
+    def _inventariar_segmentos(self, tf, lineas, anteriores):
+        '''
+        Divide el archivo en tramos (uno por bloque) y procesa solo los que
+        no están en 'anteriores' (tramos con el mismo texto en la versión
+        cacheada). Si algún interpret cruza de un tramo a otro se procesa
+        el archivo entero de forma secuencial.
+
+        Un tramo se reutiliza solo en la misma posición (último o no): en el
+        último un interpret sin cerrar al final del archivo se descarta,
+        mientras que en el medio sigue en el tramo siguiente.
+        '''
+        inicios = [nro for nro, linea in enumerate(lineas) if tf.es_linea_bloque(linea)]
+        if (len(inicios) == 0) or (inicios[0] != 0):
+            inicios.insert(0, 0)
+        limites = inicios[1:] + [len(lineas)]
+
+        segmentos = []
+        reusados = 0
+        for desde, hasta in zip(inicios, limites):
+            tramo = lineas[desde:hasta]
+            hash_tramo = hashlib.blake2b(''.join(tramo).encode('utf-8'), digest_size=16).hexdigest()
+            ultimo = hasta == len(lineas)
+            anterior = anteriores.get((hash_tramo, ultimo))
+            if anterior is not None:
+                bloques = self._correr_lineas(anterior['bloques'], desde + 1 - anterior['inicio'])
+                reusados = reusados + 1
+            else:
+                bloques = tf.inventariar_segmento(tramo, desde + 1, ultimo=ultimo)
+                if bloques is None:
+                    logging.debug('Interpret entre tramos, se procesa el archivo completo')
+                    bloques = tf.inventariar_segmento(lineas, 1, ultimo=True)
+                    return {'bloques': [bloque.a_dict() for bloque in bloques]}
+                bloques = [bloque.a_dict() for bloque in bloques]
+            segmentos.append({'hash': hash_tramo, 'ultimo': ultimo, 'inicio': desde + 1, 'bloques': bloques})
+
+        logging.debug(f'Tramos reutilizados del cache: {reusados}/{len(segmentos)}')
+        return {'segmentos': segmentos}
+
+    def _correr_lineas(self, bloques, delta):
+        ''' Copia los bloques de un tramo reutilizado con sus líneas corridas 'delta' '''
+        corridos = []
+        for bloque in bloques:
+            bloque = dict(bloque)
+            bloque['block_lin_nro'] = {
+                'start': bloque['block_lin_nro']['start'] + delta,
+                'end': bloque['block_lin_nro']['end'] + delta,
+            }
+            bloque['tests'] = [dict(caso, test_lin_nro={'start': caso['test_lin_nro']['start'] + delta,
+                                                        'end': caso['test_lin_nro']['end'] + delta})
+                               for caso in bloque['tests']]
+            corridos.append(bloque)
+        return corridos
+
+    def _bloques(self, datos, archi):
+        ''' Lista de Bloque de una entrada, con 'block_at_file' tal cual se pidió '''
+        if 'segmentos' in datos:
+            bloques = [bloque for seg in datos['segmentos'] for bloque in seg['bloques']]
+        else:
+            bloques = datos['bloques']
+        for bloque in bloques:
+            bloque['block_at_file'] = archi
+        return [Bloque.desde_dict(bloque) for bloque in bloques]
+
+    def depurar(self):
+        '''
+        Elimina las entradas de archivos que ya no existen y, si el cache
+        supera max_bytes, las usadas hace más tiempo.
+        '''
+        entradas = []
+        for nombre in os.listdir(self.directorio):
+            path_entrada = os.path.join(self.directorio, nombre)
+            if not nombre.endswith('.json'):
+                continue
+            meta, _ = self._leer_entrada(path_entrada, con_datos=False)
+            if (meta is None) or (not os.path.exists(meta['archivo'])):
+                os.remove(path_entrada)
+                continue
+            stat = os.stat(path_entrada)
+            entradas.append((stat.st_mtime, stat.st_size, path_entrada))
+
+        total = sum(tam for _, tam, _ in entradas)
+        for _, tam, path_entrada in sorted(entradas):
+            if total <= self.max_bytes:
+                break
+            os.remove(path_entrada)
+            total = total - tam
@@ -0,0 +1,218 @@
+######################################################################
+# Programa   : diff_inventario.py                                    #
+# Descripción: Diferencias entre dos versiones de un inventario      #
+#              (--diff en analizar_lua.py).                          #
+#                                                                    #
+#              Empareja los bloques por nombre (sin parámetros) y    #
+#              compara su hash de contenido, que no depende de los   #
+#              números de línea: un bloque que solo se corrió no     #
+#              cuenta como modificado. De los modificados informa    #
+#              los interprets, queries y tests agregados y quitados. #
+#              Las aristas "bloque" -> "bloque llamado" se comparan  #
+#              como conjuntos (ordenados) por nombre de nodo. Todo   #
+#              en tiempo lineal en la cantidad de bloques y aristas. #
+#                                                                    #
+#              También genera el Dot del vecindario de los cambios:  #
+#              los bloques y aristas agregados, quitados o           #
+#              modificados y sus vecinos hasta cierta profundidad,   #
+#              en lugar del grafo completo.                          #
+######################################################################
+from collections import Counter, deque
+
+from indice_grafo import normalizar_nombre, _id_dot
+
+
+# Colores del gráfico de diferencias
+COLOR_AGREGADO = 'palegreen'
+COLOR_QUITADO = 'lightcoral'
+COLOR_MODIFICADO = 'gold'
+
+
+def _diferencia(antes, despues):
+    ''' (agregados, quitados) entre dos listas, contando los repetidos '''
+    cuenta_antes, cuenta_despues = Counter(antes), Counter(despues)
+    return list((cuenta_despues - cuenta_antes).elements()), list((cuenta_antes - cuenta_despues).elements())
+
+
+class _Normalizador(dict):
+    ''' Memo de normalizar_nombre(): cada nombre se normaliza una vez '''
+
+    def __missing__(self, nombre):
+        normalizado = normalizar_nombre(nombre)
+        self[nombre] = normalizado
+        return normalizado
+
+
+def _por_nombre(inventario, normalizados):
+    ''' nombre normalizado -> lista de Bloque (un nombre puede estar en varios archivos) '''
+    bloques = {}
+    for bloque in inventario:
+        bloques.setdefault(normalizados[bloque.block_name], []).append(bloque)
+    return bloques
+
+
+def _aristas(inventario, normalizados):
+    ''' Aristas (nombre_origen, nombre_destino) sin repetidos, en orden de aparición (dict como set ordenado) '''
+    aristas = {}
+    for bloque in inventario:
+        origen = normalizados[bloque.block_name]
+        for interpret in bloque.interprets:
+            for llamado in interpret.blocks_usados:
+                aristas[(origen, normalizados[llamado])] = None
+    return aristas
+
+
+class DiffInventario():
+
+    def __init__(self, antes, despues):
+        '''
+        antes, despues (list) -> listas de Bloque de cada versión (de uno o
+                                 más archivos, lua.ter o inventarios leídos).
+        '''
+        self.agregados = []
+        self.quitados = []
+        self.modificados = []
+        self.sin_cambios = 0
+        self.corridos = 0
+
+        normalizados = _Normalizador()
+        bloques_antes = _por_nombre(antes, normalizados)
+        bloques_despues = _por_nombre(despues, normalizados)
+        for nombre, lista_despues in bloques_despues.items():
+            lista_antes = bloques_antes.get(nombre, [])
+            # Los repetidos se emparejan en orden de aparición
+            for nro, bloque in enumerate(lista_despues):
+                if nro >= len(lista_antes):
+                    self.agregados.append(nombre)
+                elif lista_antes[nro].block_hash != bloque.block_hash:
+                    self.modificados.append(self._cambios(nombre, lista_antes[nro], bloque))
+                else:
+                    self.sin_cambios = self.sin_cambios + 1
+                    if lista_antes[nro].block_lin_nro.start != bloque.block_lin_nro.start:
+                        self.corridos = self.corridos + 1
+            self.quitados.extend([nombre] * max(0, len(lista_antes) - len(lista_despues)))
+        for nombre, lista_antes in bloques_antes.items():
+            if nombre not in bloques_despues:
+                self.quitados.extend([nombre] * len(lista_antes))
+
+        # Aristas de ambas versiones por nombre de nodo (como en el índice del grafo)
+        self.aristas_antes = _aristas(antes, normalizados)
+        self.aristas_despues = _aristas(despues, normalizados)
+        self.aristas_agregadas = [arista for arista in self.aristas_despues if arista not in self.aristas_antes]
+        self.aristas_quitadas = [arista for arista in self.aristas_antes if arista not in self.aristas_despues]
+
+    def _cambios(self, nombre, antes, despues):
+        ''' Detalle de un bloque modificado '''
+        cambios = {
+            'bloque': nombre,
+            'lineas': {'antes': antes.block_lin_nro.a_dict(), 'despues': despues.block_lin_nro.a_dict()},
+            'hash': {'antes': antes.block_hash, 'despues': despues.block_hash},
+        }
+        comparaciones = (
+            ('interprets_agregados', 'interprets_quitados',
+             [interpret.raw_string for interpret in antes.interprets], [interpret.raw_string for interpret in despues.interprets]),
+            ('queries_agregadas', 'queries_quitadas', antes.queries, despues.queries),
+            ('tests_agregados', 'tests_quitados', [caso.test_input for caso in antes.tests], [caso.test_input for caso in despues.tests]),
+        )
+        for clave_agregados, clave_quitados, lista_antes, lista_despues in comparaciones:
+            if lista_antes == lista_despues:
+                continue
+            agregados, quitados = _diferencia(lista_antes, lista_despues)
+            if agregados:
+                cambios[clave_agregados] = agregados
+            if quitados:
+                cambios[clave_quitados] = quitados
+        if antes.block_name != despues.block_name:
+            cambios['parametros'] = {'antes': antes.block_name, 'despues': despues.block_name}
+        return cambios
+
+    def hay_cambios(self):
+        return bool(self.agregados or self.quitados or self.modificados or self.aristas_agregadas or self.aristas_quitadas)
+
+    def a_dict(self):
+        return {
+            'bloques': {
+                'agregados': sorted(self.agregados),
+                'quitados': sorted(self.quitados),
+                'modificados': sorted(self.modificados, key=lambda cambios: cambios['bloque']),
+                'sin_cambios': self.sin_cambios,
+                'corridos': self.corridos,
+            },
+            'aristas': {
+                'agregadas': [list(arista) for arista in sorted(self.aristas_agregadas)],
+                'quitadas': [list(arista) for arista in sorted(self.aristas_quitadas)],
+            },
+        }
+
+    def resumen(self):
+        return (f'{len(self.agregados)} bloques agregados, {len(self.quitados)} quitados, '
+                f'{len(self.modificados)} modificados ({self.sin_cambios} sin cambios, {self.corridos} solo corridos); '
+                f'{len(self.aristas_agregadas)} aristas agregadas y {len(self.aristas_quitadas)} quitadas.')
+
+    def vecindario(self, profundidad=1):
+        '''
+        Nodos a graficar: los bloques cambiados, los extremos de las aristas
+        cambiadas y sus vecinos (llamadores y llamados, en cualquiera de las
+        dos versiones) hasta 'profundidad' saltos.
+        '''
+        vecinos = {}
+        for origen, destino in list(self.aristas_antes) + list(self.aristas_despues):
+            vecinos.setdefault(origen, set()).add(destino)
+            vecinos.setdefault(destino, set()).add(origen)
+
+        cambiados = set(self.agregados) | set(self.quitados) | set(cambios['bloque'] for cambios in self.modificados)
+        for arista in self.aristas_agregadas + self.aristas_quitadas:
+            cambiados.update(arista)
+
+        nivel = {nombre: 0 for nombre in cambiados}
+        pendientes = deque(cambiados)
+        while pendientes:
+            actual = pendientes.popleft()
+            if nivel[actual] >= profundidad:
+                continue
+            for vecino in vecinos.get(actual, ()):
+                if vecino not in nivel:
+                    nivel[vecino] = nivel[actual] + 1
+                    pendientes.append(vecino)
+        return nivel
+
+    def a_dot(self, profundidad=1):
+        '''
+        Texto Dot del vecindario de los cambios: bloques agregados en verde,
+        quitados en rojo y modificados en amarillo; aristas agregadas en
+        verde y quitadas en rojo punteado.
+        '''
+        nodos = self.vecindario(profundidad)
+        lineas = [
+            'strict digraph diferencias {',
+            '\tgraph [esep=5, id=diferencias, rankdir=LR, ranksep=8.0, sep=7];',
+            '\tnode [color=goldenrod, shape=box, style="rounded, filled"];',
+        ]
+        colores = {}
+        for nombre in self.agregados:
+            colores[nombre] = COLOR_AGREGADO
+        for nombre in self.quitados:
+            colores[nombre] = COLOR_QUITADO
+        for cambios in self.modificados:
+            colores[cambios['bloque']] = COLOR_MODIFICADO
+        for nombre in sorted(nodos):
+            if nombre in colores:
+                lineas.append(f'\t{_id_dot(nombre)} [fillcolor={colores[nombre]}];')
+            else:
+                lineas.append(f'\t{_id_dot(nombre)};')
+
+        agregadas, quitadas = set(self.aristas_agregadas), set(self.aristas_quitadas)
+        graficadas = set()
+        for aristas in (self.aristas_despues, self.aristas_antes):
+            for arista in aristas:
+                if (arista in graficadas) or (arista[0] not in nodos) or (arista[1] not in nodos):
+                    continue
+                graficadas.add(arista)
+                atributos = ''
+                if arista in agregadas:
+                    atributos = ' [color=green]'
+                elif arista in quitadas:
+                    atributos = ' [color=red, style=dashed]'
+                lineas.append(f'\t{_id_dot(arista[0])} -> {_id_dot(arista[1])}{atributos};')
+        lineas.append('}')
+        return '\n'.join(lineas) + '\n'
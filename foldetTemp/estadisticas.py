@@ -0,0 +1,140 @@
+######################################################################
+# Programa   : estadisticas.py                                       #
+# Descripción: Tiempos y contadores por fase de analizar_lua.py      #
+#              (inventariar, to_file, índice, grafo, render, ...).   #
+#                                                                    #
+#              Con --stats se imprime un resumen o se graba en JSON. #
+#              Con --profile una o más fases se corren bajo cProfile #
+#              y tracemalloc y se graban sus resultados.             #
+#                                                                    #
+#              Sin --stats ni --profile se usa SIN_ESTADISTICAS,     #
+#              cuyas fases y contadores no hacen nada.               #
+######################################################################
+import io
+import json
+import time
+import logging
+from contextlib import contextmanager, nullcontext
+from collections import OrderedDict
+
+
+class Estadisticas():
+
+    def __init__(self, perfilar=(), prefijo='perfil'):
+        '''
+        perfilar (iterable) -> nombres de las fases a correr bajo cProfile y tracemalloc.
+        prefijo (str) -> prefijo de los archivos de perfil
+                         (<prefijo>_<fase>.prof y <prefijo>_<fase>_memoria.txt).
+        '''
+        self.fases = OrderedDict()
+        self.contadores = OrderedDict()
+        self.perfilar = set(perfilar)
+        self.prefijo = prefijo
+        self.perfiles = []
+
+    @contextmanager
+    def fase(self, nombre):
+        ''' Mide el tiempo de pared del bloque 'with'. Las llamadas repetidas se acumulan '''
+        perfil = None
+        if nombre in self.perfilar:
+            import cProfile
+            import tracemalloc
+            perfil = cProfile.Profile()
+            tracemalloc.start()
+            perfil.enable()
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            segundos = time.perf_counter() - inicio
+            if perfil is not None:
+                perfil.disable()
+                self._grabar_perfil(nombre, perfil)
+            acumulado = self.fases.setdefault(nombre, {'segundos': 0.0, 'llamadas': 0})
+            acumulado['segundos'] = acumulado['segundos'] + segundos
+            acumulado['llamadas'] = acumulado['llamadas'] + 1
+
+    def contar(self, nombre, cantidad=1):
+        '''
+        Suma 'cantidad' al contador. Con cantidad None el dato no está
+        disponible (p.ej. se contó en otros procesos) y el total queda sin
+        dato: 'n/d' en el resumen y null en el JSON.
+        '''
+        actual = self.contadores.get(nombre, 0)
+        self.contadores[nombre] = None if (actual is None) or (cantidad is None) else actual + cantidad
+
+    def _grabar_perfil(self, nombre, perfil):
+        ''' Graba el cProfile (.prof, para pstats/snakeviz) y el top de memoria de tracemalloc '''
+        import pstats
+        import tracemalloc
+
+        pico = tracemalloc.get_traced_memory()[1]
+        top = tracemalloc.take_snapshot().statistics('lineno')[:25]
+        tracemalloc.stop()
+
+        archivo_prof = f'{self.prefijo}_{nombre}.prof'
+        perfil.dump_stats(archivo_prof)
+        archivo_mem = f'{self.prefijo}_{nombre}_memoria.txt'
+        with open(archivo_mem, 'w') as fp:
+            fp.write(f'Pico de memoria asignada: {pico / 1e6:.1f} MB\n\n')
+            for estadistica in top:
+                fp.write(f'{estadistica}\n')
+        self.perfiles.extend([archivo_prof, archivo_mem])
+
+        # Las funciones más costosas también van al log
+        texto = io.StringIO()
+        pstats.Stats(perfil, stream=texto).sort_stats('cumulative').print_stats(10)
+        logging.debug(texto.getvalue())
+
+    def a_dict(self):
+        return {
+            'fases': {nombre: {'segundos': round(fase['segundos'], 4), 'llamadas': fase['llamadas']}
+                      for nombre, fase in self.fases.items()},
+            'contadores': dict(self.contadores),
+            'perfiles': self.perfiles,
+        }
+
+    def resumen(self):
+        ''' Líneas de texto con los tiempos, contadores y tasas '''
+        lineas = [f'{"fase":<20}{"segundos":>10}{"llamadas":>10}']
+        for nombre, fase in self.fases.items():
+            lineas.append(f'{nombre:<20}{fase["segundos"]:>10.4f}{fase["llamadas"]:>10}')
+        for nombre, cantidad in self.contadores.items():
+            lineas.append(f'{nombre:<20}{"n/d" if cantidad is None else cantidad:>10}')
+        segundos = self.fases.get('inventariar', {}).get('segundos', 0)
+        if segundos > 0:
+            for nombre in ('lineas', 'bloques'):
+                if self.contadores.get(nombre) is not None:
+                    lineas.append(f'{nombre + "/s":<20}{round(self.contadores[nombre] / segundos):>10}')
+        return lineas
+
+    def informar(self, salida=None):
+        ''' Graba las estadísticas en JSON en 'salida' o las muestra en el log '''
+        if salida is not None:
+            with open(salida, 'w') as fp:
+                json.dump(self.a_dict(), fp, indent=4)
+            logging.info(f'✓ Estadísticas grabadas en: {salida}')
+            return
+        logging.info('✓ Estadísticas:')
+        for linea in self.resumen():
+            logging.info(f'    * {linea}')
+        for archivo in self.perfiles:
+            logging.info(f'    * Archivo: {archivo}')
+
+
+class _SinEstadisticas():
+    ''' Estadísticas desactivadas: mismos métodos, sin costo de medición '''
+
+    _NULO = nullcontext()
+
+    def fase(self, nombre):
+        return self._NULO
+
+    def contar(self, nombre, cantidad=1):
+        pass
+
+
+SIN_ESTADISTICAS = _SinEstadisticas()
+
+# Fases que se pueden pasar a --profile
+FASES = ('inventariar', 'to_file', 'indice_grafo', 'alcance', 'armar_grafo', 'camino_inverso', 'particionar', 'escribir_gv', 'render', 'consulta', 'diff')
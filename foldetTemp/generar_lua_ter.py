@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+######################################################################
+# Programa   : generar_lua_ter.py                                    #
+# Descripción: Genera archivos .lua.ter sintéticos para medir        #
+#              analizar_lua.py con entradas de distinto tamaño.      #
+#                                                                    #
+#              Se puede configurar la cantidad de bloques, el largo  #
+#              de los interprets (en líneas), la cantidad de bloques #
+#              llamados por interpret (fan-out), las queries '--&'   #
+#              por bloque, los casos de prueba ('tests') por bloque  #
+#              y la densidad de comentarios.                         #
+#                                                                    #
+#Ejemplo:                                                            #
+#  python3 generar_lua_ter.py -b 10000 -o dominio_10k.lua.ter        #
+######################################################################
+import sys
+import random
+import argparse
+
+
+def generar_bloque(nro, cant_bloques, rnd, largo_interpret=3, fan_out=3,
+                   interprets=2, queries=1, comentarios=0.2, tests=0):
+    ''' Retorna las líneas de un bloque sintético '''
+    lineas = [f'block (<resultado_{nro}:Resultado>) "Español" BLOQUE_{nro:06d}(<x:int>, "param") =\n', '{\n']
+
+    for nro_query in range(queries):
+        lineas.append(f'--& consulta de ejemplo {nro} {nro_query}\n')
+
+    for nro_int in range(interprets):
+        if rnd.random() < comentarios:
+            lineas.append('  -- comentario del interpret: interpret { NO_ES_BLOQUE() }\n')
+
+        llamados = [f'BLOQUE_{rnd.randrange(cant_bloques):06d}(x)' for _ in range(fan_out)]
+        lineas.append('  interpret {\n')
+        for nro_lin in range(max(1, largo_interpret - 3)):
+            llamado = llamados[nro_lin % len(llamados)] if llamados else '"texto"'
+            lineas.append(f'    ("palabra_{nro_lin}" | {llamado})\n')
+        # El resto de los llamados en una sola línea
+        resto = ' . '.join(llamados[max(1, largo_interpret - 3):])
+        lineas.append(f'    {resto}\n' if resto else '    ["opcional"]\n')
+        lineas.append(f'  }} as {{ resultado_{nro} = {{ valor = {nro_int} }}; }};\n')
+
+        if rnd.random() < comentarios:
+            lineas.append('\n-- fin del interpret\n')
+
+    if tests > 0:
+        lineas.append('  tests = {\n')
+        for nro_test in range(tests):
+            # Uno de cada tres casos con delta_request_info
+            delta = ' delta_request_info = { paso = 1 },' if (nro + nro_test) % 3 == 0 else ''
+            lineas.append(f'    {{ "consulta de prueba {nro} {nro_test}",{delta} [[\n')
+            lineas.append(f'      resultado_{nro} = {{ valor = {nro_test} }}\n')
+            lineas.append('    ]] },\n')
+        lineas.append('  };\n')
+
+    lineas.append('}\n')
+    if rnd.random() < comentarios:
+        lineas.append('----------------------------------------\n')
+    return lineas
+
+
+def generar(salida, cant_bloques, semilla=0, **opciones):
+    ''' Graba en 'salida' (archivo abierto) un lua.ter con 'cant_bloques' bloques '''
+    rnd = random.Random(semilla)
+    salida.write('-- Archivo lua.ter sintético generado por generar_lua_ter.py\n\n')
+    for nro in range(cant_bloques):
+        salida.writelines(generar_bloque(nro, cant_bloques, rnd, **opciones))
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Genera archivos lua.ter sintéticos.")
+    parser.add_argument("-b", "--blocks", type=int, default=1000, required=False, help="Cantidad de bloques.")
+    parser.add_argument("--interpret-lines", type=int, default=3, required=False, help="Líneas de cada interpret.")
+    parser.add_argument("--interprets", type=int, default=2, required=False, help="Interprets por bloque.")
+    parser.add_argument("--fan-out", type=int, default=3, required=False, help="Bloques llamados por interpret.")
+    parser.add_argument("--queries", type=int, default=1, required=False, help="Queries '--&' por bloque.")
+    parser.add_argument("--tests", type=int, default=0, required=False, help="Casos de prueba ('tests') por bloque.")
+    parser.add_argument("--comments", type=float, default=0.2, required=False, help="Densidad de comentarios (0 a 1).")
+    parser.add_argument("--seed", type=int, default=0, required=False, help="Semilla del generador.")
+    parser.add_argument("-o", "--output", type=str, default=None, required=False, help="Archivo de salida. Por defecto stdout.")
+
+    args = vars(parser.parse_args())
+
+    opciones = dict(
+        largo_interpret=args['interpret_lines'],
+        fan_out=args['fan_out'],
+        interprets=args['interprets'],
+        queries=args['queries'],
+        comentarios=args['comments'],
+        tests=args['tests'],
+    )
+    if args['output'] is None:
+        generar(sys.stdout, args['blocks'], args['seed'], **opciones)
+    else:
+        with open(args['output'], 'w') as fp:
+            generar(fp, args['blocks'], args['seed'], **opciones)
@@ -0,0 +1,299 @@
+######################################################################
+# Programa   : indice_grafo.py                                       #
+# Descripción: Índice en memoria del grafo de llamadas              #
+#              "bloque" -> "bloque llamado" de un inventario.        #
+#                                                                    #
+#              Se arma una sola vez recorriendo el inventario:       #
+#              normaliza cada nombre una única vez (memo), asigna un #
+#              id entero a cada nodo y guarda listas de adyacencia   #
+#              hacia adelante (llamados) y hacia atrás (llamadores), #
+#              además de un set con los bloques locales.             #
+######################################################################
+import re
+from collections import deque, Counter
+
+
+# PHONE_NUMBER() es un extended block de SH: se considera local
+BLOQUES_EXTENDIDOS = ('PHONE_NUMBER(...)',)
+
+
+RE_ESPACIOS = re.compile(r'\s+')
+RE_PARAMETROS = re.compile(r'\(.*\)')
+
+
+def normalizar_nombre(nombre):
+    ''' Nombre de bloque para Dot: sin saltos de línea, comillas dobles ni parámetros '''
+    normalizado = nombre.replace("\n", "")
+    normalizado = RE_ESPACIOS.sub(' ', normalizado)
+    normalizado = normalizado.replace('"', "'")
+    return RE_PARAMETROS.sub('(...)', normalizado)
+
+
+class IndiceGrafo():
+
+    def __init__(self, inventario):
+        '''
+        inventario (list) -> lista de Bloque del archivo (o archivos) procesado.
+        '''
+        # Memo de nombres normalizados
+        self._normalizados = {}
+
+        # Nodos: id entero <-> nombre normalizado (p.ej. 'BLOQUE(...)')
+        self.nombres = []
+        self.ids = {}
+
+        # Adyacencia por id (sin repetidos, en orden de aparición)
+        self.sucesores = []
+        self.predecesores = []
+
+        # Aristas (id_origen, id_destino) en orden de aparición
+        self.aristas = []
+        self._set_aristas = set()
+        # Veces que aparece cada arista en los interprets (para quitarlas con aplicar_cambios)
+        self._referencias = Counter()
+
+        # Bloques locales (definidos en el inventario)
+        self.locales = set(BLOQUES_EXTENDIDOS)
+        self._cuenta_locales = Counter(self._nombres_locales(inventario))
+        self.locales.update(self._cuenta_locales)
+
+        for arista in self._aristas_de(inventario):
+            self.agregar_arista(*arista)
+
+    @classmethod
+    def desde_aristas(cls, nombres_bloques, nodos, aristas):
+        '''
+        Arma el índice sin los bloques completos (p.ej. desde un snapshot).
+
+        nombres_bloques (list) -> block_name de cada bloque del inventario.
+        nodos (list) -> nombres normalizados, en el orden de sus ids.
+        aristas (iterable) -> (id_origen, id_destino, apariciones) en orden
+                              de aparición.
+        '''
+        indice = cls([])
+        indice._cuenta_locales = Counter(RE_PARAMETROS.sub('(...)', nombre) for nombre in nombres_bloques)
+        indice.locales.update(indice._cuenta_locales)
+        # Las aristas ya vienen sin repetidos: se cargan sin pasar por agregar_arista()
+        indice.nombres = list(nodos)
+        indice.ids = {nombre: id_nodo for id_nodo, nombre in enumerate(indice.nombres)}
+        indice.sucesores = [[] for _ in indice.nombres]
+        indice.predecesores = [[] for _ in indice.nombres]
+        for origen, destino, apariciones in aristas:
+            indice.aristas.append((origen, destino))
+            indice.sucesores[origen].append(destino)
+            indice.predecesores[destino].append(origen)
+            indice._referencias[(origen, destino)] = apariciones
+        indice._set_aristas = set(indice.aristas)
+        return indice
+
+    def _nombres_locales(self, bloques):
+        return [RE_PARAMETROS.sub('(...)', elem.block_name) for elem in bloques]
+
+    def _aristas_de(self, bloques):
+        ''' Aristas (ids) de los interprets de 'bloques', una por cada aparición '''
+        for elem in bloques:
+            for interpret in elem.interprets:
+                if len(interpret.blocks_usados) == 0:
+                    continue
+                origen = self.id_nodo(self.normalizar(elem.block_name))
+                for bloque in interpret.blocks_usados:
+                    yield origen, self.id_nodo(self.normalizar(bloque))
+
+    def normalizar(self, nombre):
+        '''
+        Normaliza un nombre de bloque para representarlo en Dot (sin saltos
+        de línea, comillas dobles ni parámetros). Cada nombre se calcula una vez.
+        '''
+        normalizado = self._normalizados.get(nombre)
+        if normalizado is None:
+            normalizado = normalizar_nombre(nombre)
+            self._normalizados[nombre] = normalizado
+        return normalizado
+
+    def id_nodo(self, nombre):
+        ''' Id del nodo 'nombre' (normalizado). Lo crea si no existe '''
+        id_nodo = self.ids.get(nombre)
+        if id_nodo is None:
+            id_nodo = len(self.nombres)
+            self.ids[nombre] = id_nodo
+            self.nombres.append(nombre)
+            self.sucesores.append([])
+            self.predecesores.append([])
+        return id_nodo
+
+    def agregar_arista(self, origen, destino):
+        ''' Registra la arista origen -> destino (ids) si no existía '''
+        self._referencias[(origen, destino)] += 1
+        if (origen, destino) in self._set_aristas:
+            return False
+        self._set_aristas.add((origen, destino))
+        self.aristas.append((origen, destino))
+        self.sucesores[origen].append(destino)
+        self.predecesores[destino].append(origen)
+        return True
+
+    def quitar_arista(self, origen, destino):
+        ''' Descuenta una aparición de la arista. Retorna True si ya no queda ninguna '''
+        self._referencias[(origen, destino)] -= 1
+        if self._referencias[(origen, destino)] > 0:
+            return False
+        del self._referencias[(origen, destino)]
+        self._set_aristas.discard((origen, destino))
+        self.aristas.remove((origen, destino))
+        self.sucesores[origen].remove(destino)
+        self.predecesores[destino].remove(origen)
+        return True
+
+    def aplicar_cambios(self, anteriores, nuevos):
+        '''
+        Actualiza el índice cuando los bloques 'anteriores' (p.ej. los de un
+        archivo) pasan a ser 'nuevos', sin rearmarlo: solo se quitan y
+        agregan las aristas y bloques locales que cambiaron. Las aristas
+        nuevas quedan al final del orden de aparición.
+
+        Retorna (aristas agregadas, aristas quitadas, cambiaron los locales),
+        con las aristas como (nombre_origen, nombre_destino).
+        '''
+        antes = Counter(self._aristas_de(anteriores))
+        despues = Counter(self._aristas_de(nuevos))
+        quitadas = [arista for arista, cant in (antes - despues).items()
+                    for _ in range(cant) if self.quitar_arista(*arista)]
+        agregadas = [arista for arista, cant in (despues - antes).items()
+                     for _ in range(cant) if self.agregar_arista(*arista)]
+
+        locales_antes = set(self.locales)
+        self._cuenta_locales.subtract(self._nombres_locales(anteriores))
+        self._cuenta_locales.update(self._nombres_locales(nuevos))
+        self._cuenta_locales = +self._cuenta_locales
+        self.locales = set(BLOQUES_EXTENDIDOS) | set(self._cuenta_locales)
+
+        nombres = self.nombres
+        return ([(nombres[o], nombres[d]) for o, d in agregadas],
+                [(nombres[o], nombres[d]) for o, d in quitadas],
+                self.locales != locales_antes)
+
+    def referencias(self, origen, destino):
+        ''' Veces que aparece la arista origen -> destino (ids) en los interprets '''
+        return self._referencias[(origen, destino)]
+
+    def es_local(self, id_nodo):
+        return self.nombres[id_nodo] in self.locales
+
+    def definidos(self):
+        ''' Nombres normalizados de los bloques definidos en el inventario (sin los extendidos) '''
+        return set(self.normalizar(nombre) for nombre in self._cuenta_locales)
+
+    def aristas_a_graficar(self, solo_locales=False):
+        '''
+        Aristas (nombre_origen, nombre_destino) en orden de aparición.
+        Con solo_locales se omiten las que llaman a bloques externos.
+        '''
+        for origen, destino in self.aristas:
+            if solo_locales and not self.es_local(destino):
+                continue
+            yield self.nombres[origen], self.nombres[destino]
+
+    def recorrer(self, nombre, sentido='callers', profundidad=None):
+        '''
+        Recorre el grafo desde el bloque 'nombre' (normalizado) sin Graphviz.
+
+        sentido (str) -> 'callers': bloques que llegan a 'nombre' (camino inverso).
+                         'callees': bloques a los que llega 'nombre'.
+        profundidad (int) -> cantidad máxima de saltos. None = sin límite.
+
+        Retorna (nodos, aristas) alcanzados, con las aristas en el sentido
+        original (llamador -> llamado). None si el bloque no está en el grafo.
+        '''
+        origen = self.ids.get(nombre)
+        if origen is None:
+            return None
+        vecinos = self.predecesores if sentido == 'callers' else self.sucesores
+
+        visitados = {origen: 0}
+        nodos = [origen]
+        # Aristas recorridas como (nodo, vecino)
+        aristas = []
+        pendientes = deque([origen])
+        while pendientes:
+            actual = pendientes.popleft()
+            nivel = visitados[actual]
+            if (profundidad is not None) and (nivel >= profundidad):
+                continue
+            for vecino in vecinos[actual]:
+                aristas.append((actual, vecino))
+                if vecino not in visitados:
+                    visitados[vecino] = nivel + 1
+                    nodos.append(vecino)
+                    pendientes.append(vecino)
+
+        nombres = self.nombres
+        if sentido == 'callers':
+            aristas = [(nombres[vecino], nombres[actual]) for actual, vecino in aristas]
+        else:
+            aristas = [(nombres[actual], nombres[vecino]) for actual, vecino in aristas]
+        return [nombres[id_nodo] for id_nodo in nodos], aristas
+
+    def consultar(self, bloques, sentido='callers', profundidad=None):
+        '''
+        Consulta en lote: un resultado (dict) por cada bloque de 'bloques'
+        (nombres sin parámetros, como en -m y -r).
+        '''
+        resultados = []
+        for bloque in bloques:
+            resultado = {'bloque': bloque, 'sentido': sentido, 'profundidad': profundidad}
+            recorrido = self.recorrer(bloque + '(...)', sentido, profundidad)
+            if recorrido is None:
+                resultado['error'] = 'Bloque inexistente'
+            else:
+                resultado['nodos'] = recorrido[0]
+                resultado['aristas'] = [list(arista) for arista in recorrido[1]]
+            resultados.append(resultado)
+        return resultados
+
+
+def _id_dot(texto):
+    ''' Identificador Dot entre comillas '''
+    return '"' + texto.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def resultado_a_dot(resultado):
+    '''
+    Texto Dot de un resultado de IndiceGrafo.consultar(), con los mismos
+    atributos que el gráfico de camino inverso.
+    '''
+    nombre = f'{resultado["sentido"]}_{resultado["bloque"]}'
+    id_grafo = 'camino_reverso' if resultado['sentido'] == 'callers' else 'camino_directo'
+    lineas = [
+        f'strict digraph {_id_dot(nombre)} {{',
+        f'\tgraph [esep=5, id={id_grafo}, rankdir=LR, ranksep=8.0, sep=7];',
+        '\tnode [color=goldenrod, shape=box, style="rounded, filled"];',
+        f'\t{_id_dot(resultado["bloque"] + "(...)")} [fillcolor=green];',
+    ]
+    for origen, destino in resultado.get('aristas', []):
+        lineas.append(f'\t{_id_dot(origen)} -> {_id_dot(destino)};')
+    lineas.append('}')
+    return '\n'.join(lineas) + '\n'
+
+
+def grafo_a_dot(indice, solo_locales=False, marcar=()):
+    '''
+    Texto Dot del gráfico general (el mismo que arma analizar_lua.py con -g)
+    sin pasar por Graphviz. 'marcar' son nombres sin parámetros, como en -m.
+    '''
+    lineas = [
+        'strict digraph mi_lua_ter {',
+        '\tgraph [esep=5, id=mi_luar_ter, rankdir=LR, ranksep=8.0, sep=7];',
+        '\tnode [color=goldenrod, shape=box, style="rounded, filled"];',
+    ]
+    graficados = set()
+    aristas = []
+    for origen, destino in indice.aristas_a_graficar(solo_locales):
+        graficados.add(origen)
+        graficados.add(destino)
+        aristas.append(f'\t{_id_dot(origen)} -> {_id_dot(destino)};')
+    for bloque in marcar:
+        if bloque + '(...)' in graficados:
+            lineas.append(f'\t{_id_dot(bloque + "(...)")} [fillcolor=green];')
+    lineas.extend(aristas)
+    lineas.append('}')
+    return '\n'.join(lineas) + '\n'
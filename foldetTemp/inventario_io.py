@@ -0,0 +1,64 @@
+######################################################################
+# Programa   : inventario_io.py                                      #
+# Descripción: Escritura y lectura de inventarios de bloques.        #
+#                                                                    #
+#              Además del JSON completo que genera analizar_lua.py   #
+#              soporta JSON Lines ('.jsonl'): un bloque por línea,   #
+#              grabado apenas se cierra el bloque. El lector es un   #
+#              generador, así que recorrer un inventario '.jsonl'    #
+#              usa memoria constante sin importar su tamaño.         #
+#                                                                    #
+#              También lee las bases SQLite (almacen_sqlite.py) y    #
+#              los snapshots binarios '.snap' (snapshot_inventario). #
+######################################################################
+import json
+
+
+def linea_jsonl(bloque):
+    ''' Línea JSON Lines de un bloque (dict) '''
+    return json.dumps(bloque, ensure_ascii=False, sort_keys=True) + '\n'
+
+
+def es_base_sqlite(nombre):
+    ''' True si 'nombre' es una base SQLite de almacen_sqlite.py (por extensión) '''
+    return nombre.endswith(('.db', '.sqlite', '.sqlite3'))
+
+
+def es_snapshot(nombre):
+    ''' True si 'nombre' es un snapshot binario de snapshot_inventario.py (por extensión) '''
+    return nombre.endswith('.snap')
+
+
+def leer_inventario(nombre_inventario):
+    '''
+    Generador que retorna de a uno los bloques (dict) de un inventario.
+    Los '.jsonl' se leen línea a línea; los '.json' se cargan completos y
+    las bases SQLite ('.db') y los snapshots ('.snap') se leen bloque a bloque.
+    '''
+    if es_base_sqlite(nombre_inventario):
+        # sqlite3 solo se importa si se lee una base
+        from almacen_sqlite import AlmacenInventario
+        almacen = AlmacenInventario(nombre_inventario)
+        try:
+            yield from almacen.bloques()
+        finally:
+            almacen.cerrar()
+        return
+
+    if es_snapshot(nombre_inventario):
+        from snapshot_inventario import SnapshotInventario
+        with SnapshotInventario(nombre_inventario) as snapshot:
+            for bloque in snapshot:
+                yield bloque.a_dict()
+        return
+
+    if nombre_inventario.endswith('.jsonl'):
+        with open(nombre_inventario, 'r', encoding='utf-8') as fp:
+            for linea in fp:
+                if linea.strip():
+                    yield json.loads(linea)
+        return
+
+    with open(nombre_inventario, 'r') as fp:
+        inventario = json.load(fp)
+    yield from inventario
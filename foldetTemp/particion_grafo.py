@@ -0,0 +1,212 @@
+######################################################################
+# Programa   : particion_grafo.py                                    #
+# Descripción: Gráfico general por partes para grafos grandes        #
+#              (--partition en analizar_lua.py).                     #
+#                                                                    #
+#              Divide las aristas del gráfico general en partes:     #
+#              componentes débilmente conexas (las chicas se juntan  #
+#              hasta un máximo de nodos), archivo dónde se define    #
+#              cada bloque, o bloques locales y externos. Cada parte #
+#              es un Dot propio que se renderiza por separado (en    #
+#              paralelo), así el layout crece con la parte más       #
+#              grande y no con todo el grafo. Las aristas hacia      #
+#              otra parte se dibujan punteadas con el bloque de la   #
+#              otra parte como enlace a su imagen.                   #
+#                                                                    #
+#              Un gráfico resumen tiene un nodo por parte (con       #
+#              enlace a su imagen) y las llamadas entre partes.      #
+######################################################################
+import os
+from collections import Counter
+
+from indice_grafo import _id_dot
+
+
+# Modos de --partition. 'auto' parte solo los gráficos de más de max_nodos nodos
+MODOS = ('auto', 'none', 'components', 'files', 'local')
+
+# Parte de los bloques que no se definen en ningún archivo del inventario
+EXTERNOS = 'externos'
+
+
+class Particion():
+    ''' Una parte del gráfico general '''
+
+    def __init__(self, nro, nombre, nodos):
+        self.nro = nro
+        self.nombre = nombre
+        self.nodos = nodos
+        # Aristas con ambos extremos en la parte
+        self.aristas = []
+        # Aristas hacia y desde otras partes: (origen, destino, nro de la otra parte)
+        self.salientes = []
+        self.entrantes = []
+
+
+def componentes_debiles(nodos, aristas):
+    '''
+    Componentes débilmente conexas (union-find sobre las aristas sin
+    sentido). Retorna listas de nodos, de la componente más grande a la
+    más chica (las de igual tamaño en orden de aparición).
+    '''
+    padre = {nodo: nodo for nodo in nodos}
+
+    def raiz(nodo):
+        while padre[nodo] != nodo:
+            padre[nodo] = padre[padre[nodo]]
+            nodo = padre[nodo]
+        return nodo
+
+    for origen, destino in aristas:
+        raiz_origen, raiz_destino = raiz(origen), raiz(destino)
+        if raiz_origen != raiz_destino:
+            padre[raiz_destino] = raiz_origen
+
+    componentes = {}
+    for nodo in nodos:
+        componentes.setdefault(raiz(nodo), []).append(nodo)
+    return sorted(componentes.values(), key=len, reverse=True)
+
+
+def agrupar(componentes, max_nodos):
+    '''
+    Junta las componentes (de la más grande a la más chica) en grupos de
+    hasta max_nodos nodos: cada una va al primer grupo en que entra. Así
+    miles de pares de bloques aislados no generan miles de gráficos. Una
+    componente más grande que max_nodos queda sola.
+    '''
+    grupos = []
+    libres = []
+    for componente in componentes:
+        for nro, libre in enumerate(libres):
+            if len(componente) <= libre:
+                grupos[nro].extend(componente)
+                libres[nro] = libre - len(componente)
+                break
+        else:
+            grupos.append(list(componente))
+            libres.append(max_nodos - len(componente))
+    return grupos
+
+
+def archivos_de_nodos(inventario, normalizar):
+    ''' Nombre de nodo (normalizado con 'normalizar') -> archivo dónde se define el bloque (el primero) '''
+    archivos = {}
+    for bloque in inventario:
+        archivos.setdefault(normalizar(bloque.block_name), bloque.block_at_file)
+    return archivos
+
+
+def particionar(indice, modo, max_nodos, solo_locales=False, archivos=None):
+    '''
+    Divide el gráfico general (indice.aristas_a_graficar()) en partes.
+    Retorna (modo usado, lista de Particion). La lista queda vacía si no
+    corresponde partir o si todo queda en una sola parte.
+
+    modo (str) -> 'components': componentes débilmente conexas (las chicas
+                  se juntan hasta max_nodos nodos). 'files': por archivo
+                  dónde se define cada bloque; los externos van aparte.
+                  'local': bloques locales y externos. 'auto': si el
+                  gráfico tiene más de max_nodos nodos, 'components' (o
+                  'files' si la componente más grande igual los supera y
+                  hay varios archivos). 'none': sin partir.
+    archivos (dict) -> nodo -> archivo dónde se define (archivos_de_nodos()).
+    '''
+    archivos = archivos or {}
+    aristas = list(indice.aristas_a_graficar(solo_locales))
+    nodos = list(dict.fromkeys(nodo for arista in aristas for nodo in arista))
+    if (modo == 'none') or ((modo == 'auto') and (len(nodos) <= max_nodos)):
+        return modo, []
+
+    grupos = []
+    if modo in ('auto', 'components'):
+        componentes = componentes_debiles(nodos, aristas)
+        if (modo == 'auto') and (len(componentes[0]) > max_nodos) and (len(set(archivos.values())) > 1):
+            modo = 'files'
+        else:
+            modo = 'components'
+            grupos = [(f'parte {nro}', grupo) for nro, grupo in enumerate(agrupar(componentes, max_nodos), 1)]
+    if modo == 'files':
+        por_archivo = {}
+        for nodo in nodos:
+            por_archivo.setdefault(archivos.get(nodo, EXTERNOS), []).append(nodo)
+        # Los externos al final
+        externos = por_archivo.pop(EXTERNOS, [])
+        grupos = [(os.path.basename(archivo), grupo) for archivo, grupo in por_archivo.items()]
+        grupos.append((EXTERNOS, externos))
+    elif modo == 'local':
+        grupos = [('locales', [nodo for nodo in nodos if nodo in indice.locales]),
+                  (EXTERNOS, [nodo for nodo in nodos if nodo not in indice.locales])]
+
+    particiones = [Particion(nro, nombre, grupo) for nro, (nombre, grupo) in enumerate(
+        [(nombre, grupo) for nombre, grupo in grupos if grupo])]
+    if len(particiones) < 2:
+        return modo, []
+
+    parte_de = {nodo: particion.nro for particion in particiones for nodo in particion.nodos}
+    for origen, destino in aristas:
+        parte_origen, parte_destino = parte_de[origen], parte_de[destino]
+        if parte_origen == parte_destino:
+            particiones[parte_origen].aristas.append((origen, destino))
+        else:
+            particiones[parte_origen].salientes.append((origen, destino, parte_destino))
+            particiones[parte_destino].entrantes.append((origen, destino, parte_origen))
+    return modo, particiones
+
+
+def _encabezado(nombre, id_grafo):
+    return [
+        f'strict digraph {_id_dot(nombre)} {{',
+        f'\tgraph [esep=5, id={id_grafo}, rankdir=LR, ranksep=8.0, sep=7];',
+        '\tnode [color=goldenrod, shape=box, style="rounded, filled"];',
+    ]
+
+
+def particion_a_dot(particion, particiones, imagenes, marcar=()):
+    '''
+    Texto Dot de una parte, con los mismos atributos que el gráfico
+    general. Los bloques de otras partes (aristas de frontera) se dibujan
+    punteados y enlazan con la imagen de su parte.
+
+    imagenes (list) -> imagen (nombre de archivo) de cada parte, por nro.
+    marcar (iterable) -> nombres sin parámetros a pintar de verde, como en -m.
+    '''
+    lineas = _encabezado(particion.nombre, 'particion')
+    marcados = set(bloque + '(...)' for bloque in marcar)
+    for nodo in particion.nodos:
+        if nodo in marcados:
+            lineas.append(f'\t{_id_dot(nodo)} [fillcolor=green];')
+
+    ajenos = {}
+    for _, destino, otra in particion.salientes:
+        ajenos.setdefault(destino, otra)
+    for origen, _, otra in particion.entrantes:
+        ajenos.setdefault(origen, otra)
+    for nodo, otra in ajenos.items():
+        lineas.append(f'\t{_id_dot(nodo)} [fillcolor=white, style="rounded, dashed", '
+                      f'URL={_id_dot(imagenes[otra])}, tooltip={_id_dot(particiones[otra].nombre)}];')
+
+    for origen, destino in particion.aristas:
+        lineas.append(f'\t{_id_dot(origen)} -> {_id_dot(destino)};')
+    for origen, destino, _ in particion.salientes + particion.entrantes:
+        lineas.append(f'\t{_id_dot(origen)} -> {_id_dot(destino)} [style=dashed];')
+    lineas.append('}')
+    return '\n'.join(lineas) + '\n'
+
+
+def resumen_a_dot(particiones, imagenes, nombre='partes'):
+    '''
+    Texto Dot del gráfico resumen: un nodo por parte (con su cantidad de
+    bloques y aristas y enlace a su imagen) y una arista por cada par de
+    partes que se llaman, con la cantidad de llamadas.
+    '''
+    lineas = _encabezado(nombre, 'partes')
+    for particion in particiones:
+        etiqueta = f'{particion.nombre} ({len(particion.nodos)} bloques, {len(particion.aristas)} aristas)'
+        lineas.append(f'\t{_id_dot(f"parte_{particion.nro + 1}")} [label={_id_dot(etiqueta)}, URL={_id_dot(imagenes[particion.nro])}];')
+
+    llamadas = Counter((particion.nro, otra) for particion in particiones for _, _, otra in particion.salientes)
+    for (origen, destino), cantidad in llamadas.items():
+        lineas.append(f'\t{_id_dot(f"parte_{origen + 1}")} -> {_id_dot(f"parte_{destino + 1}")} [label={cantidad}];')
+    lineas.append('}')
+    return '\n'.join(lineas) + '\n'
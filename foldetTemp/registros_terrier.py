@@ -0,0 +1,211 @@
+######################################################################
+# Programa   : registros_terrier.py                                  #
+# Descripción: Registros compactos (con __slots__) para los bloques, #
+#              interprets, casos de prueba y rangos de líneas del    #
+#              inventario de un archivo .lua.ter.                    #
+#                                                                    #
+#              Los nombres de bloque se internan (sys.intern) para   #
+#              no repetir el mismo string en cada llamada. Los       #
+#              interprets pueden guardar solo offsets de bytes en el #
+#              archivo fuente y leer el texto cuando se lo pide.     #
+#              a_dict() arma el mismo dict que se graba en el JSON.  #
+#                                                                    #
+#              Cada bloque tiene un hash de su contenido (nombre,    #
+#              interprets, queries y tests) que no depende de los    #
+#              números de línea ni del archivo, para comparar        #
+#              versiones (--diff).                                   #
+######################################################################
+import sys
+import mmap
+import json
+import hashlib
+
+
+class RangoLineas():
+    ''' Líneas de inicio y fin (inclusive) de un bloque '''
+
+    __slots__ = ('start', 'end')
+
+    def __init__(self, start, end=None):
+        self.start = start
+        self.end = end
+
+    def a_dict(self):
+        return {'start': self.start, 'end': self.end}
+
+
+class FuenteTerrier():
+    '''
+    Archivo lua.ter del que se leen los textos de los interprets guardados
+    como offsets. El archivo se abre (mmap) recién la primera vez que se usa
+    y queda abierto hasta cerrar().
+    '''
+
+    __slots__ = ('path', 'encoding', '_archivo', '_datos')
+
+    def __init__(self, path, encoding):
+        self.path = path
+        self.encoding = encoding
+        self._archivo = None
+        self._datos = None
+
+    def texto(self, desde, hasta):
+        if self._datos is None:
+            self._archivo = open(self.path, 'rb')
+            self._datos = mmap.mmap(self._archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._datos[desde:hasta].decode(self.encoding)
+
+    def cerrar(self):
+        ''' Cierra el mmap y el archivo. Un texto() posterior los vuelve a abrir '''
+        if self._datos is not None:
+            self._datos.close()
+            self._archivo.close()
+            self._datos = None
+            self._archivo = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.cerrar()
+
+    def __reduce__(self):
+        # El mmap no se puede serializar: se vuelve a abrir en destino
+        return (FuenteTerrier, (self.path, self.encoding))
+
+
+class Interpret():
+    '''
+    Interpret de un bloque. Con 'fuente' definida, raw_string y terrier_expr
+    se leen del archivo a partir de los offsets de bytes (desde, hasta).
+    '''
+
+    __slots__ = ('_raw_string', '_terrier_expr', 'blocks_usados', 'fuente', 'offsets')
+
+    def __init__(self, raw_string, terrier_expr, blocks_usados, fuente=None, offsets=None):
+        self._raw_string = raw_string
+        self._terrier_expr = terrier_expr
+        self.blocks_usados = [sys.intern(nom) for nom in blocks_usados]
+        self.fuente = fuente
+        self.offsets = offsets
+
+    @classmethod
+    def con_offsets(cls, fuente, raw, expr, blocks_usados):
+        '''
+        raw (tuple) -> offsets de bytes (desde, hasta) del interpret completo.
+        expr (tuple) -> offsets de bytes de la expresión terrier antes del 'as'.
+        '''
+        return cls(None, None, blocks_usados, fuente, raw + expr)
+
+    @property
+    def raw_string(self):
+        if self.fuente is not None:
+            return self.fuente.texto(self.offsets[0], self.offsets[1])
+        return self._raw_string
+
+    @property
+    def terrier_expr(self):
+        if self.fuente is not None:
+            return self.fuente.texto(self.offsets[2], self.offsets[3])
+        return self._terrier_expr
+
+    def a_dict(self):
+        return {
+            'raw_string': self.raw_string,
+            'terrier_expr': self.terrier_expr,
+            'blocks_usados': list(self.blocks_usados),
+        }
+
+    @classmethod
+    def desde_dict(cls, datos):
+        return cls(datos['raw_string'], datos['terrier_expr'], datos['blocks_usados'])
+
+
+class CasoPrueba():
+    '''
+    Caso de la sección 'tests = { {...}, ... };' de un bloque: el texto
+    previo al string largo (la consulta y sus opciones), el contenido del
+    último '[[...]]' (resultado esperado) y si usa delta_request_info.
+    '''
+
+    __slots__ = ('test_input', 'test_expected', 'test_lin_nro', 'delta_request_info')
+
+    def __init__(self, test_input, test_expected, test_lin_nro, delta_request_info=False):
+        self.test_input = test_input
+        self.test_expected = test_expected
+        self.test_lin_nro = test_lin_nro
+        self.delta_request_info = delta_request_info
+
+    def a_dict(self):
+        return {
+            'test_input': self.test_input,
+            'test_expected': self.test_expected,
+            'test_lin_nro': self.test_lin_nro.a_dict(),
+            'delta_request_info': self.delta_request_info,
+        }
+
+    @classmethod
+    def desde_dict(cls, datos):
+        return cls(
+            datos['test_input'],
+            datos['test_expected'],
+            RangoLineas(datos['test_lin_nro']['start'], datos['test_lin_nro']['end']),
+            datos['delta_request_info'],
+        )
+
+
+class Bloque():
+    ''' Bloque del lua.ter con sus interprets, queries de ejemplo y casos de prueba '''
+
+    __slots__ = ('block_name', 'block_at_file', 'block_lin_nro', 'interprets', 'queries', 'tests', '_hash')
+
+    def __init__(self, block_name, block_at_file, block_lin_nro, interprets=None, queries=None, tests=None, block_hash=None):
+        self.block_name = sys.intern(block_name)
+        self.block_at_file = block_at_file
+        self.block_lin_nro = block_lin_nro
+        self.interprets = [] if interprets is None else interprets
+        self.queries = [] if queries is None else queries
+        self.tests = [] if tests is None else tests
+        self._hash = block_hash
+
+    @property
+    def block_hash(self):
+        '''
+        Hash del contenido del bloque. Se calcula la primera vez que se pide
+        (el bloque ya está completo) y no cambia si el bloque solo se corre
+        de línea o de archivo.
+        '''
+        if self._hash is None:
+            contenido = [
+                self.block_name,
+                [[interpret.raw_string, interpret.blocks_usados] for interpret in self.interprets],
+                self.queries,
+                [[caso.test_input, caso.test_expected, caso.delta_request_info] for caso in self.tests],
+            ]
+            texto = json.dumps(contenido, ensure_ascii=False, separators=(',', ':'))
+            self._hash = hashlib.blake2b(texto.encode('utf-8'), digest_size=12).hexdigest()
+        return self._hash
+
+    def a_dict(self):
+        return {
+            'block_name': self.block_name,
+            'block_at_file': self.block_at_file,
+            'block_lin_nro': self.block_lin_nro.a_dict(),
+            'interprets': [interpret.a_dict() for interpret in self.interprets],
+            'queries': list(self.queries),
+            'tests': [caso.a_dict() for caso in self.tests],
+            'block_hash': self.block_hash,
+        }
+
+    @classmethod
+    def desde_dict(cls, datos):
+        return cls(
+            datos['block_name'],
+            datos['block_at_file'],
+            RangoLineas(datos['block_lin_nro']['start'], datos['block_lin_nro']['end']),
+            [Interpret.desde_dict(interpret) for interpret in datos['interprets']],
+            datos['queries'],
+            # Los inventarios anteriores a los casos de prueba no tienen 'tests'
+            [CasoPrueba.desde_dict(caso) for caso in datos.get('tests', [])],
+            datos.get('block_hash'),
+        )
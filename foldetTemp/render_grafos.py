@@ -0,0 +1,208 @@
+######################################################################
+# Programa   : render_grafos.py                                      #
+# Descripción: Etapa de render de los gráficos .gv generados por     #
+#              analizar_lua.py (png, svg, etc...).                   #
+#                                                                    #
+#              Cada gráfico se renderiza con una sola invocación de  #
+#              Graphviz (un layout reutilizado para todos los        #
+#              formatos pedidos), con timeout por gráfico y un motor #
+#              alternativo más barato (sfdp) para grafos muy grandes #
+#              o que superan el timeout. Varios gráficos se          #
+#              renderizan a la vez.                                  #
+#                                                                    #
+#              Opcionalmente usa un cache de imágenes indexado por   #
+#              el hash del Dot generado: si el gráfico no cambió se  #
+#              copian las imágenes ya renderizadas sin hacer layout. #
+######################################################################
+import os
+import re
+import hashlib
+import logging
+import subprocess
+
+
+class OpcionesRender():
+
+    def __init__(self, solo_gv=False, formatos=None, workers=None, timeout=None,
+                 prog='dot', prog_alternativo='sfdp', umbral_nodos=None, cache=None,
+                 particion='auto', max_nodos_particion=2000):
+        '''
+        solo_gv (boolean) -> solo se graban los .gv, sin layout ni imágenes.
+        formatos (list) -> formatos de salida para todos los gráficos
+                           (p.ej. ['png', 'svg']). None = los de cada gráfico.
+        workers (int) -> gráficos renderizados a la vez. None = uno por core.
+        timeout (float) -> segundos máximos por gráfico antes de pasar al
+                           motor alternativo. None = sin límite.
+        prog (str) -> motor de layout de Graphviz.
+        prog_alternativo (str) -> motor para grafos grandes o que superan el timeout.
+        umbral_nodos (int) -> desde esta cantidad de nodos se usa directamente
+                              el motor alternativo. None = nunca.
+        cache (CacheRender) -> cache de imágenes ya renderizadas.
+        particion (str) -> cómo dividir el gráfico general en partes que se
+                           renderizan por separado (ver particion_grafo.py).
+        max_nodos_particion (int) -> con 'auto', nodos desde los que se parte
+                                     el gráfico general; también es el tamaño
+                                     de las partes que juntan componentes chicas.
+        '''
+        self.solo_gv = solo_gv
+        self.formatos = formatos
+        self.workers = workers
+        self.timeout = timeout
+        self.prog = prog
+        self.prog_alternativo = prog_alternativo
+        self.umbral_nodos = umbral_nodos
+        self.cache = cache
+        self.particion = particion
+        self.max_nodos_particion = max_nodos_particion
+
+
+class CacheRender():
+    '''
+    Cache de imágenes renderizadas. La clave es el hash del Dot canónico
+    (incluye atributos como los nodos marcados con -m), del formato y de
+    los motores de layout. Se descartan las entradas usadas hace más tiempo.
+    '''
+
+    RE_ESPACIOS = re.compile(r'[ \t]+')
+
+    def __init__(self, directorio='.cache_render', max_bytes=512 * 1024 * 1024):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        os.makedirs(self.directorio, exist_ok=True)
+
+    def clave(self, gv_file, opciones):
+        ''' Hash del Dot (sin diferencias de espacios ni líneas vacías) y de los motores '''
+        with open(gv_file, 'r') as fp:
+            lineas = [self.RE_ESPACIOS.sub(' ', linea.strip()) for linea in fp]
+        dot_canonico = '\n'.join(linea for linea in lineas if linea)
+        motores = f'{opciones.prog}|{opciones.prog_alternativo}|{opciones.umbral_nodos}'
+        return hashlib.sha256((motores + '\n' + dot_canonico).encode('utf-8')).hexdigest()
+
+    def _path(self, clave, formato):
+        return os.path.join(self.directorio, f'{clave}.{formato}')
+
+    def recuperar(self, clave, formato, salida):
+        ''' Copia la imagen cacheada a 'salida'. Retorna False si no está '''
+        import shutil
+
+        path_cache = self._path(clave, formato)
+        try:
+            shutil.copyfile(path_cache, salida)
+        except FileNotFoundError:
+            return False
+        os.utime(path_cache)
+        return True
+
+    def guardar(self, clave, formato, salida):
+        import shutil
+
+        path_cache = self._path(clave, formato)
+        path_tmp = f'{path_cache}.{os.getpid()}.{id(salida)}.tmp'
+        shutil.copyfile(salida, path_tmp)
+        os.replace(path_tmp, path_cache)
+
+    def depurar(self):
+        ''' Elimina las entradas menos usadas hasta no superar max_bytes '''
+        entradas = []
+        for nombre in os.listdir(self.directorio):
+            if nombre.endswith('.tmp'):
+                # Imagen que otro hilo está grabando
+                continue
+            path_cache = os.path.join(self.directorio, nombre)
+            try:
+                info = os.stat(path_cache)
+            except FileNotFoundError:
+                continue
+            entradas.append((info.st_mtime, info.st_size, path_cache))
+        total = sum(tam for _, tam, _ in entradas)
+        for _, tam, path_cache in sorted(entradas):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path_cache)
+            except FileNotFoundError:
+                pass
+            total = total - tam
+
+
+class TrabajoRender():
+    ''' Un gráfico .gv a renderizar en uno o más formatos '''
+
+    def __init__(self, gv_file, formatos, cant_nodos=0):
+        self.gv_file = gv_file
+        self.formatos = formatos
+        self.cant_nodos = cant_nodos
+
+    def salidas(self, formatos=None):
+        ''' Archivos de salida: mismo nombre que el .gv con la extensión de cada formato '''
+        base = os.path.splitext(self.gv_file)[0]
+        return [(formato, base + '.' + formato) for formato in (formatos or self.formatos)]
+
+
+def _ejecutar_graphviz(prog, trabajo, salidas, timeout):
+    ''' Un único proceso de Graphviz: hace el layout una vez y emite todos los formatos '''
+    comando = [prog]
+    for formato, salida in salidas:
+        comando.extend(['-T' + formato, '-o', salida])
+    comando.append(trabajo.gv_file)
+    subprocess.run(comando, check=True, timeout=timeout, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+
+def renderizar(trabajo, opciones):
+    '''
+    Renderiza un gráfico. Retorna la lista de archivos generados.
+    '''
+    salidas = trabajo.salidas(opciones.formatos)
+    archivos = [salida for _, salida in salidas]
+
+    cache = opciones.cache
+    if cache is not None:
+        clave = cache.clave(trabajo.gv_file, opciones)
+        salidas = [(formato, salida) for formato, salida in salidas if not cache.recuperar(clave, formato, salida)]
+        if len(salidas) == 0:
+            logging.info(f'    * {trabajo.gv_file}: sin cambios, imágenes desde el cache.')
+            return archivos
+
+    prog = opciones.prog
+    if (opciones.umbral_nodos is not None) and (trabajo.cant_nodos >= opciones.umbral_nodos):
+        logging.info(f'    * {trabajo.gv_file}: {trabajo.cant_nodos} nodos, se usa {opciones.prog_alternativo}.')
+        prog = opciones.prog_alternativo
+
+    try:
+        _ejecutar_graphviz(prog, trabajo, salidas, opciones.timeout)
+    except subprocess.TimeoutExpired:
+        if prog == opciones.prog_alternativo:
+            raise
+        logging.warning(f'    * {trabajo.gv_file}: {prog} superó {opciones.timeout}s, se usa {opciones.prog_alternativo}.')
+        _ejecutar_graphviz(opciones.prog_alternativo, trabajo, salidas, opciones.timeout)
+
+    if cache is not None:
+        for formato, salida in salidas:
+            cache.guardar(clave, formato, salida)
+    return archivos
+
+
+def renderizar_trabajos(trabajos, opciones):
+    '''
+    Renderiza varios gráficos a la vez. Cada render corre en su propio
+    proceso de Graphviz, así que alcanza con un pool de threads que los lance.
+    Retorna dict gv_file -> lista de archivos generados (o la excepción).
+    '''
+    if opciones.solo_gv or len(trabajos) == 0:
+        return {}
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    resultados = {}
+    with ThreadPoolExecutor(max_workers=opciones.workers or os.cpu_count() or 1) as pool:
+        futuros = {trabajo.gv_file: pool.submit(renderizar, trabajo, opciones) for trabajo in trabajos}
+        for gv_file, futuro in futuros.items():
+            try:
+                resultados[gv_file] = futuro.result()
+            except (subprocess.SubprocessError, OSError) as error:
+                logging.error(f'✗ No se pudo renderizar {gv_file}: {error}')
+                resultados[gv_file] = error
+
+    if opciones.cache is not None:
+        opciones.cache.depurar()
+    return resultados
@@ -0,0 +1,292 @@
+######################################################################
+# Programa   : servidor_consultas.py                                 #
+# Descripción: Modo servidor de analizar_lua.py (--serve).           #
+#                                                                    #
+#              Inventaría una vez uno o varios archivos lua.ter y    #
+#              mantiene en memoria el índice del grafo de llamadas   #
+#              para responder consultas por HTTP en localhost o en   #
+#              un socket Unix, sin volver a procesar los archivos    #
+#              en cada consulta.                                     #
+#                                                                    #
+#              Antes de responder revisa (como mucho una vez por     #
+#              intervalo) el tamaño y mtime de los archivos y solo   #
+#              vuelve a inventariar los que cambiaron.               #
+#                                                                    #
+#Consultas (GET, respuesta JSON salvo format=dot):                   #
+#  /callers?blocks=B1,B2&depth=N&format=json|dot                     #
+#  /callees?blocks=B1,B2&depth=N&format=json|dot                     #
+#  /reverse?block=B&format=dot|json  camino inverso (como -r)        #
+#  /mark?blocks=B1,B2&local=1&format=dot|json  gráfico general       #
+#                                    con bloques marcados (como -m)  #
+#  /impact?blocks=B1,B2              llamadores, raíces afectadas y  #
+#                                    llamados (como --impact)        #
+#  /graph-report?entries=B1,B2       ciclos, raíces, bloques muertos #
+#  /status                           archivos, bloques y aristas     #
+#  /reload                           fuerza la revisión de archivos  #
+#                                                                    #
+#Ejemplo:                                                            #
+#  python3 analizar_lua.py -i dom/ --cache-dir .cache --serve        #
+#  curl 'http://127.0.0.1:8765/callers?blocks=BLOQUE_A&depth=2'      #
+#  python3 analizar_lua.py -i dom/ --serve unix:/tmp/lua.sock        #
+#  curl --unix-socket /tmp/lua.sock 'http://x/callees?blocks=B'      #
+######################################################################
+import os
+import stat
+import json
+import signal
+import time
+import logging
+import threading
+import socketserver
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from indice_grafo import IndiceGrafo, resultado_a_dot, grafo_a_dot
+from alcance_grafo import AlcanceGrafo
+
+
+class ConsultaDesconocida(Exception):
+    ''' Ruta de consulta inexistente (respuesta 404) '''
+
+
+class ServidorInventario():
+    '''
+    Inventario de varios archivos e índice del grafo, actualizados solo
+    para los archivos modificados.
+    '''
+
+    def __init__(self, entrada, expandir, inventariar, intervalo=1.0):
+        '''
+        entrada (str) -> archivo, directorio o glob (como -i).
+        expandir (callable) -> entrada -> lista de archivos lua.ter.
+        inventariar (callable) -> lista de archivos -> lista con el inventario
+                                  de cada uno (en el mismo orden).
+        intervalo (float) -> segundos mínimos entre revisiones de los archivos.
+        '''
+        self.entrada = entrada
+        self.expandir = expandir
+        self.inventariar = inventariar
+        self.intervalo = intervalo
+
+        # archi -> ((size, mtime_ns), bloques)
+        self.archivos = {}
+        self.indice = IndiceGrafo([])
+        # (índice, AlcanceGrafo): se rearma solo cuando cambia el índice
+        self._alcance = (None, None)
+        self.cant_bloques = 0
+        self.recargas = 0
+        self._revisado = 0.0
+        self._lock = threading.Lock()
+        self.actualizar(forzar=True)
+
+    def actualizar(self, forzar=False):
+        '''
+        Vuelve a inventariar los archivos nuevos o cuyo tamaño o mtime
+        cambió y quita los borrados. Retorna la lista de archivos cambiados.
+        '''
+        with self._lock:
+            ahora = time.monotonic()
+            if (not forzar) and (ahora - self._revisado < self.intervalo):
+                return []
+            self._revisado = ahora
+
+            firmas = {}
+            for archi in self.expandir(self.entrada):
+                try:
+                    info = os.stat(archi)
+                except FileNotFoundError:
+                    continue
+                firmas[archi] = (info.st_size, info.st_mtime_ns)
+
+            cambiados = [archi for archi, firma in firmas.items()
+                         if (archi not in self.archivos) or (self.archivos[archi][0] != firma)]
+            borrados = [archi for archi in self.archivos if archi not in firmas]
+            if len(cambiados) == 0 and len(borrados) == 0:
+                return []
+
+            for archi, bloques in zip(cambiados, self.inventariar(cambiados)):
+                self.archivos[archi] = (firmas[archi], bloques)
+            for archi in borrados:
+                del self.archivos[archi]
+
+            # El índice nuevo reemplaza al anterior de una vez: las consultas
+            # en curso terminan sobre el que ya tenían
+            inventario = [bloque for archi in sorted(self.archivos) for bloque in self.archivos[archi][1]]
+            self.indice = IndiceGrafo(inventario)
+            self.cant_bloques = len(inventario)
+            self.recargas = self.recargas + 1
+            logging.info(f'✓ Inventario actualizado: {len(cambiados)} archivos modificados, {len(borrados)} borrados.')
+            return cambiados + borrados
+
+    def alcance(self, indice):
+        ''' AlcanceGrafo de 'indice', calculado en la primera consulta que lo necesita '''
+        with self._lock:
+            if self._alcance[0] is not indice:
+                self._alcance = (indice, AlcanceGrafo(indice))
+            return self._alcance[1]
+
+    def estado(self):
+        return {
+            'entrada': self.entrada,
+            'archivos': len(self.archivos),
+            'bloques': self.cant_bloques,
+            'nodos': len(self.indice.nombres),
+            'aristas': len(self.indice.aristas),
+            'recargas': self.recargas,
+        }
+
+    def consultar(self, ruta, parametros):
+        '''
+        Resuelve una consulta. Retorna (tipo de contenido, texto).
+        Lanza ValueError si la consulta no es válida y ConsultaDesconocida
+        si la ruta no existe.
+        '''
+        if ruta == '/reload':
+            cambiados = self.actualizar(forzar=True)
+            return self._json({'cambiados': cambiados, **self.estado()})
+
+        self.actualizar()
+        indice = self.indice
+
+        if ruta == '/status':
+            return self._json(self.estado())
+
+        if ruta in ('/callers', '/callees', '/reverse'):
+            if ruta == '/reverse':
+                sentido, bloques, formato = 'callers', _lista(parametros, 'block'), parametros.get('format', 'dot')
+            else:
+                sentido, bloques, formato = ruta[1:], _lista(parametros, 'blocks'), parametros.get('format', 'json')
+            if len(bloques) == 0:
+                raise ValueError('Faltan los bloques origen de la consulta.')
+            profundidad = _entero(parametros, 'depth')
+            resultados = indice.consultar(bloques, sentido, profundidad)
+            if formato == 'dot':
+                return 'text/vnd.graphviz', ''.join(resultado_a_dot(resultado) for resultado in resultados if 'error' not in resultado)
+            return self._json(resultados)
+
+        if ruta == '/mark':
+            marcar = _lista(parametros, 'blocks')
+            solo_locales = parametros.get('local', '0') not in ('0', '', 'false')
+            if parametros.get('format', 'dot') == 'json':
+                return self._json({
+                    'marcados': [bloque for bloque in marcar if bloque + '(...)' in indice.ids],
+                    'inexistentes': [bloque for bloque in marcar if bloque + '(...)' not in indice.ids],
+                })
+            return 'text/vnd.graphviz', grafo_a_dot(indice, solo_locales, marcar)
+
+        if ruta == '/impact':
+            bloques = _lista(parametros, 'blocks')
+            if len(bloques) == 0:
+                raise ValueError('Faltan los bloques de la consulta de impacto.')
+            return self._json(self.alcance(indice).impacto(bloques))
+
+        if ruta == '/graph-report':
+            entradas = [bloque + '(...)' for bloque in _lista(parametros, 'entries')] or None
+            return self._json(self.alcance(indice).informe(entradas))
+
+        raise ConsultaDesconocida(f'Consulta desconocida: {ruta}')
+
+    def _json(self, datos):
+        return 'application/json', json.dumps(datos, ensure_ascii=False) + '\n'
+
+
+def _lista(parametros, nombre):
+    return [bloque for bloque in parametros.get(nombre, '').split(',') if bloque]
+
+
+def _entero(parametros, nombre):
+    if parametros.get(nombre) in (None, ''):
+        return None
+    try:
+        valor = int(parametros[nombre])
+    except ValueError:
+        raise ValueError(f'{nombre} debe ser un entero.')
+    if valor < 0:
+        raise ValueError(f'{nombre} no puede ser negativo.')
+    return valor
+
+
+class _ManejadorConsultas(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        partes = urlsplit(self.path)
+        parametros = {nombre: valores[-1] for nombre, valores in parse_qs(partes.query).items()}
+        try:
+            tipo, texto = self.server.inventario.consultar(partes.path, parametros)
+            codigo = 200
+        except ValueError as error:
+            tipo, texto, codigo = 'application/json', json.dumps({'error': str(error)}, ensure_ascii=False) + '\n', 400
+        except ConsultaDesconocida as error:
+            tipo, texto, codigo = 'application/json', json.dumps({'error': str(error)}, ensure_ascii=False) + '\n', 404
+        except Exception as error:
+            # Un error del servidor, no de la consulta: se informa con su traza
+            logging.exception(f'Error al resolver {self.path}.')
+            tipo, texto, codigo = 'application/json', json.dumps({'error': f'Error interno: {error!r}'}, ensure_ascii=False) + '\n', 500
+
+        cuerpo = texto.encode('utf-8')
+        self.send_response(codigo)
+        self.send_header('Content-Type', f'{tipo}; charset=utf-8')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def address_string(self):
+        # En un socket Unix client_address no es (host, puerto)
+        return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+    def log_message(self, formato, *args):
+        logging.debug('%s - ' + formato, self.address_string(), *args)
+
+
+def es_socket(path):
+    ''' True si 'path' es un socket Unix (sin seguir enlaces simbólicos) '''
+    return stat.S_ISSOCK(os.lstat(path).st_mode)
+
+
+def path_socket_libre(path):
+    ''' True si en 'path' se puede crear el socket: no existe o es un socket anterior '''
+    return (not os.path.lexists(path)) or es_socket(path)
+
+
+class _ServidorHTTPUnix(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def _detener(nro_senal, frame):
+    ''' SIGTERM se atiende como Ctrl+C: así se cierra el servidor y se borra el socket '''
+    raise KeyboardInterrupt
+
+
+def servir(inventario, direccion='127.0.0.1:8765'):
+    '''
+    Atiende consultas hasta Ctrl+C o SIGTERM. 'direccion' es HOST:PUERTO
+    (HTTP en localhost) o unix:PATH (HTTP sobre un socket Unix).
+    '''
+    path_socket = None
+    if direccion.startswith('unix:'):
+        path_socket = direccion[len('unix:'):]
+        if not path_socket_libre(path_socket):
+            raise FileExistsError(f'{path_socket} existe y no es un socket Unix.')
+        if os.path.lexists(path_socket):
+            # Socket de una ejecución anterior
+            os.remove(path_socket)
+        servidor = _ServidorHTTPUnix(path_socket, _ManejadorConsultas)
+    else:
+        host, _, puerto = direccion.rpartition(':')
+        servidor = ThreadingHTTPServer((host or '127.0.0.1', int(puerto)), _ManejadorConsultas)
+    servidor.inventario = inventario
+
+    logging.info(f'✓ Atendiendo consultas en {direccion} ({inventario.cant_bloques} bloques, {len(inventario.archivos)} archivos).')
+    anterior = None
+    if threading.current_thread() is threading.main_thread():
+        anterior = signal.signal(signal.SIGTERM, _detener)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        logging.info('✓ Servidor detenido.')
+    finally:
+        if anterior is not None:
+            signal.signal(signal.SIGTERM, anterior)
+        servidor.server_close()
+        if path_socket is not None and os.path.lexists(path_socket) and es_socket(path_socket):
+            os.remove(path_socket)
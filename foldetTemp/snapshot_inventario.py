@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+######################################################################
+# Programa   : snapshot_inventario.py                                #
+# Descripción: Snapshot binario de un inventario ('.snap') para      #
+#              volver a cargarlo rápido (-f snap en analizar_lua).   #
+#                                                                    #
+#              Todos los textos (nombres de bloque internados una    #
+#              sola vez, interprets, queries, tests) van en un único #
+#              blob UTF-8 con una tabla de offsets; bloques,         #
+#              interprets, casos de prueba, nodos y aristas son      #
+#              arrays de enteros que se leen directo del archivo     #
+#              con mmap. Al abrirlo solo se lee la cabecera: cada    #
+#              texto se decodifica recién cuando se lo pide, así     #
+#              que los nombres y las aristas del grafo se obtienen   #
+#              sin decodificar ningún interpret.                     #
+#                                                                    #
+#              El JSON sigue disponible como exportación:            #
+#                                                                    #
+#Ejemplo:                                                            #
+#  python3 snapshot_inventario.py dominio_inventario.json dom.snap   #
+#  python3 snapshot_inventario.py dom.snap dominio_inventario.json   #
+######################################################################
+import os
+import sys
+import mmap
+import json
+import struct
+import argparse
+from array import array
+
+from registros_terrier import Bloque, Interpret, RangoLineas, CasoPrueba
+from inventario_io import linea_jsonl, leer_inventario, es_snapshot
+from indice_grafo import IndiceGrafo
+
+
+MAGICO = b'TERSNAP\x00'
+VERSION = 1
+
+# Secciones en el orden en que se graban; la cabecera tiene (offset, cantidad de enteros o bytes) de cada una
+SECCIONES = ('offsets_cadenas', 'cadenas', 'bloques', 'interprets', 'usados', 'queries', 'tests', 'nodos', 'aristas')
+CABECERA = struct.Struct('<8sI' + 'QQ' * len(SECCIONES))
+
+# Enteros por registro de cada sección
+CAMPOS_BLOQUE = 11    # nombre, archivo, inicio, fin, hash, primer interpret, cant., primera query, cant., primer test, cant.
+CAMPOS_INTERPRET = 4  # raw_string, terrier_expr, primer bloque usado, cant.
+CAMPOS_TEST = 5       # test_input, test_expected, inicio, fin, delta_request_info
+CAMPOS_ARISTA = 3     # id origen, id destino, apariciones
+
+# Línea ausente (None). El texto None es la cadena 0
+NULO = 0xFFFFFFFF
+
+
+def _a_little_endian(enteros):
+    ''' Los enteros se graban siempre en little-endian '''
+    if sys.byteorder == 'big':
+        enteros = array(enteros.typecode, enteros)
+        enteros.byteswap()
+    return enteros
+
+
+class _TablaCadenas():
+    ''' Textos sin repetidos: cada uno se guarda una vez y se referencia por id '''
+
+    def __init__(self):
+        # La cadena 0 (vacía) representa None
+        self.ids = {None: 0}
+        self.offsets = array('Q', [0, 0])
+        self.blob = bytearray()
+
+    def id(self, texto):
+        id_cadena = self.ids.get(texto)
+        if id_cadena is None:
+            id_cadena = len(self.ids)
+            self.ids[texto] = id_cadena
+            self.blob += texto.encode('utf-8')
+            self.offsets.append(len(self.blob))
+        return id_cadena
+
+
+def snapshot_bytes(inventario, indice=None):
+    '''
+    Contenido del snapshot de 'inventario' (lista de Bloque).
+
+    indice (IndiceGrafo) -> índice del grafo ya armado del mismo inventario.
+                            None = se arma acá (para los nodos y aristas).
+    '''
+    if indice is None:
+        indice = IndiceGrafo(inventario)
+
+    cadenas = _TablaCadenas()
+    bloques, interprets, usados, queries, tests = array('I'), array('I'), array('I'), array('I'), array('I')
+    for bloque in inventario:
+        bloques.extend((
+            cadenas.id(bloque.block_name),
+            cadenas.id(bloque.block_at_file),
+            bloque.block_lin_nro.start,
+            NULO if bloque.block_lin_nro.end is None else bloque.block_lin_nro.end,
+            cadenas.id(bloque.block_hash),
+            len(interprets) // CAMPOS_INTERPRET, len(bloque.interprets),
+            len(queries), len(bloque.queries),
+            len(tests) // CAMPOS_TEST, len(bloque.tests),
+        ))
+        for interpret in bloque.interprets:
+            interprets.extend((cadenas.id(interpret.raw_string), cadenas.id(interpret.terrier_expr),
+                               len(usados), len(interpret.blocks_usados)))
+            usados.extend(cadenas.id(llamado) for llamado in interpret.blocks_usados)
+        queries.extend(cadenas.id(query) for query in bloque.queries)
+        for caso in bloque.tests:
+            tests.extend((cadenas.id(caso.test_input), cadenas.id(caso.test_expected),
+                          caso.test_lin_nro.start, NULO if caso.test_lin_nro.end is None else caso.test_lin_nro.end,
+                          int(caso.delta_request_info)))
+
+    nodos = array('I', (cadenas.id(nombre_nodo) for nombre_nodo in indice.nombres))
+    aristas = array('I')
+    for origen, destino in indice.aristas:
+        aristas.extend((origen, destino, indice.referencias(origen, destino)))
+
+    datos = bytearray(CABECERA.size)
+    ubicaciones = []
+    for contenido in (cadenas.offsets, cadenas.blob, bloques, interprets, usados, queries, tests, nodos, aristas):
+        # Cada sección empieza alineada a 8 bytes
+        datos.extend(bytes(-len(datos) % 8))
+        ubicaciones.extend((len(datos), len(contenido)))
+        datos.extend(contenido if isinstance(contenido, bytearray) else _a_little_endian(contenido).tobytes())
+    CABECERA.pack_into(datos, 0, MAGICO, VERSION, *ubicaciones)
+    return datos
+
+
+def grabar_snapshot(nombre, inventario, indice=None):
+    '''
+    Graba el snapshot de 'inventario' en 'nombre' (ver snapshot_bytes()).
+    Se graba en un temporal que reemplaza al archivo al final: quien tenga
+    abierto (mmap) el snapshot anterior lo sigue leyendo entero.
+    '''
+    path_tmp = f'{nombre}.{os.getpid()}.tmp'
+    with open(path_tmp, 'wb') as fp:
+        fp.write(snapshot_bytes(inventario, indice))
+    os.replace(path_tmp, nombre)
+
+
+class SnapshotInventario():
+
+    def __init__(self, nombre):
+        '''
+        nombre (str) -> archivo '.snap'. Se abre con mmap y solo se lee la
+                        cabecera; usar cerrar() (o 'with') al terminar.
+        '''
+        self.nombre = nombre
+        self._archivo = open(nombre, 'rb')
+        try:
+            self._datos = mmap.mmap(self._archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Archivo vacío
+            self._archivo.close()
+            raise ValueError(f'{nombre} no es un snapshot de inventario.')
+        if (len(self._datos) < CABECERA.size) or (self._datos[:len(MAGICO)] != MAGICO):
+            self.cerrar()
+            raise ValueError(f'{nombre} no es un snapshot de inventario.')
+        magico, version, *ubicaciones = CABECERA.unpack_from(self._datos)
+        if version != VERSION:
+            self.cerrar()
+            raise ValueError(f'{nombre} es un snapshot versión {version} (se esperaba {VERSION}).')
+        self._secciones = {seccion: (ubicaciones[2 * nro], ubicaciones[2 * nro + 1]) for nro, seccion in enumerate(SECCIONES)}
+
+        self._offsets = self._enteros('offsets_cadenas', 'Q')
+        self._inicio_cadenas = self._secciones['cadenas'][0]
+        self._bloques = self._enteros('bloques')
+        self._interprets = self._enteros('interprets')
+        self._usados = self._enteros('usados')
+        self._queries = self._enteros('queries')
+        self._tests = self._enteros('tests')
+        self._aristas = self._enteros('aristas')
+        # Textos ya decodificados por id
+        self._cadenas = {0: None}
+        self._lista_offsets = None
+        self._nodos = None
+
+    def _enteros(self, seccion, tipo='I'):
+        ''' Enteros de una sección: una vista sobre el mmap, sin copiarlos '''
+        offset, cantidad = self._secciones[seccion]
+        vista = memoryview(self._datos)[offset:offset + cantidad * array(tipo).itemsize].cast(tipo)
+        if sys.byteorder == 'big':
+            enteros = array(tipo, vista)
+            vista.release()
+            enteros.byteswap()
+            return enteros
+        return vista
+
+    def cerrar(self):
+        # Las vistas se liberan antes de cerrar el mmap
+        for atributo in ('_offsets', '_bloques', '_interprets', '_usados', '_queries', '_tests', '_aristas'):
+            vista = getattr(self, atributo, None)
+            if isinstance(vista, memoryview):
+                vista.release()
+        self._datos.close()
+        self._archivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.cerrar()
+
+    def __len__(self):
+        ''' Cantidad de bloques '''
+        return len(self._bloques) // CAMPOS_BLOQUE
+
+    def cadena(self, id_cadena):
+        ''' Texto 'id_cadena' (se decodifica una sola vez) '''
+        texto = self._cadenas.get(id_cadena, False)
+        if texto is False:
+            if self._lista_offsets is None:
+                # Con muchos textos es más rápido indexar una lista que la vista
+                self._lista_offsets = self._offsets.tolist()
+            offsets, inicio = self._lista_offsets, self._inicio_cadenas
+            texto = self._datos[inicio + offsets[id_cadena]:inicio + offsets[id_cadena + 1]].decode('utf-8')
+            self._cadenas[id_cadena] = texto
+        return texto
+
+    def _todas_las_cadenas(self):
+        ''' Lista con todos los textos decodificados, para recorrer el inventario completo '''
+        offsets = self._offsets.tolist()
+        inicio = self._inicio_cadenas
+        blob = self._datos[inicio:inicio + self._secciones['cadenas'][1]]
+        if blob.isascii():
+            # Los offsets de bytes sirven también para cortar el texto decodificado
+            blob = blob.decode('ascii')
+            textos = [blob[offsets[id_cadena]:offsets[id_cadena + 1]] for id_cadena in range(1, len(offsets) - 1)]
+        else:
+            textos = [blob[offsets[id_cadena]:offsets[id_cadena + 1]].decode('utf-8') for id_cadena in range(1, len(offsets) - 1)]
+        return [None] + textos
+
+    def nombre_bloque(self, nro):
+        return self.cadena(self._bloques[nro * CAMPOS_BLOQUE])
+
+    def nombres_bloques(self):
+        ''' block_name de cada bloque, en orden '''
+        return [self.cadena(id_nombre) for id_nombre in self._bloques[::CAMPOS_BLOQUE]]
+
+    def nodos(self):
+        ''' Nombres normalizados de los nodos del grafo, en el orden de sus ids '''
+        if self._nodos is None:
+            self._nodos = [self.cadena(id_nombre) for id_nombre in self._enteros('nodos')]
+        return self._nodos
+
+    def aristas(self):
+        ''' Generador de las aristas (id_origen, id_destino, apariciones) en orden de aparición '''
+        aristas = self._aristas
+        for posicion in range(0, len(aristas), CAMPOS_ARISTA):
+            yield aristas[posicion], aristas[posicion + 1], aristas[posicion + 2]
+
+    def indice_grafo(self):
+        ''' IndiceGrafo armado solo con los nombres y las aristas (sin decodificar los interprets) '''
+        return IndiceGrafo.desde_aristas(self.nombres_bloques(), self.nodos(), self.aristas())
+
+    def _linea(self, valor):
+        return None if valor == NULO else valor
+
+    def _armar_bloque(self, cadena, campos, interprets, usados, queries, tests):
+        '''
+        Bloque a partir de sus campos. 'cadena' da el texto de cada id;
+        'interprets', 'usados', 'queries' y 'tests' son las secciones
+        completas (vistas o listas).
+        '''
+        (id_nombre, id_archivo, inicio, fin, id_hash,
+         primer_interpret, cant_interprets, primera_query, cant_queries,
+         primer_test, cant_tests) = campos
+
+        lista_interprets = []
+        for posicion in range(primer_interpret * CAMPOS_INTERPRET, (primer_interpret + cant_interprets) * CAMPOS_INTERPRET, CAMPOS_INTERPRET):
+            id_raw, id_expr, primer_usado, cant_usados = interprets[posicion:posicion + CAMPOS_INTERPRET]
+            lista_interprets.append(Interpret(cadena(id_raw), cadena(id_expr),
+                                              list(map(cadena, usados[primer_usado:primer_usado + cant_usados]))))
+
+        lista_tests = []
+        for posicion in range(primer_test * CAMPOS_TEST, (primer_test + cant_tests) * CAMPOS_TEST, CAMPOS_TEST):
+            id_input, id_expected, inicio_test, fin_test, delta = tests[posicion:posicion + CAMPOS_TEST]
+            lista_tests.append(CasoPrueba(cadena(id_input), cadena(id_expected),
+                                          RangoLineas(inicio_test, self._linea(fin_test)), bool(delta)))
+
+        return Bloque(
+            cadena(id_nombre),
+            cadena(id_archivo),
+            RangoLineas(inicio, self._linea(fin)),
+            lista_interprets,
+            list(map(cadena, queries[primera_query:primera_query + cant_queries])),
+            lista_tests,
+            cadena(id_hash),
+        )
+
+    def bloque(self, nro):
+        ''' Bloque 'nro' completo (con sus interprets, queries y tests) '''
+        return self._armar_bloque(self.cadena, self._bloques[nro * CAMPOS_BLOQUE:(nro + 1) * CAMPOS_BLOQUE],
+                                  self._interprets, self._usados, self._queries, self._tests)
+
+    def __iter__(self):
+        ''' Generador de los Bloque del inventario, de a uno '''
+        # Para recorrer todo se decodifican todos los textos juntos y se copian
+        # las secciones a listas (más rápidas de indexar que las vistas)
+        cadena = self._todas_las_cadenas().__getitem__
+        bloques = self._bloques.tolist()
+        secciones = (self._interprets.tolist(), self._usados.tolist(), self._queries.tolist(), self._tests.tolist())
+        for posicion in range(0, len(bloques), CAMPOS_BLOQUE):
+            yield self._armar_bloque(cadena, bloques[posicion:posicion + CAMPOS_BLOQUE], *secciones)
+
+    def llamados_primer_interpret(self):
+        ''' Generador de (nombre de bloque, bloques llamados en su primer interpret, queries) '''
+        for nro in range(len(self)):
+            campos = self._bloques[nro * CAMPOS_BLOQUE:(nro + 1) * CAMPOS_BLOQUE]
+            llamados = []
+            if campos[6] > 0:
+                _, _, primer_usado, cant_usados = self._interprets[campos[5] * CAMPOS_INTERPRET:(campos[5] + 1) * CAMPOS_INTERPRET]
+                llamados = [self.cadena(id_usado) for id_usado in self._usados[primer_usado:primer_usado + cant_usados]]
+            yield self.cadena(campos[0]), llamados, [self.cadena(id_query) for id_query in self._queries[campos[7]:campos[7] + campos[8]]]
+
+
+def exportar(inventario, nombre):
+    ''' Graba 'inventario' (lista de Bloque) como '.snap', '.jsonl' o JSON según la extensión de 'nombre' '''
+    if es_snapshot(nombre):
+        grabar_snapshot(nombre, inventario)
+    elif nombre.endswith('.jsonl'):
+        with open(nombre, 'w', encoding='utf-8') as fp:
+            for bloque in inventario:
+                fp.write(linea_jsonl(bloque.a_dict()))
+    else:
+        # Igual que el JSON de analizar_lua.py (to_file)
+        with open(nombre, 'w') as fp:
+            json.dump([bloque.a_dict() for bloque in inventario], fp, indent=4, ensure_ascii=False, separators=(',', ': '), sort_keys=True)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Convierte inventarios entre snapshot binario ('.snap'), JSON y JSON Lines.")
+    parser.add_argument("entrada", type=str, help="Inventario a leer (.snap, .json, .jsonl o base SQLite).")
+    parser.add_argument("salida", type=str, help="Inventario a grabar (.snap, .json o .jsonl).")
+
+    args = vars(parser.parse_args())
+    if not os.path.isfile(args['entrada']):
+        parser.error(f'No existe el inventario {args["entrada"]}.')
+
+    if es_snapshot(args['entrada']):
+        with SnapshotInventario(args['entrada']) as snapshot:
+            bloques = list(snapshot)
+    else:
+        bloques = [Bloque.desde_dict(bloque) for bloque in leer_inventario(args['entrada'])]
+    exportar(bloques, args['salida'])
+    print(f'✓ {len(bloques)} bloques grabados en {args["salida"]}.')
@@ -0,0 +1,9 @@
+######################################################################
+# Programa   : conftest.py                                           #
+# Descripción: Configuración de pytest para los scripts de           #
+#              foldetTemp (módulos sueltos, sin paquete).            #
+######################################################################
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,68 @@
+######################################################################
+# Programa   : test_cache_inventario.py                              #
+# Descripción: El inventario desde el cache (tramos reutilizados)    #
+#              es igual al de procesar el archivo completo.          #
+######################################################################
+from analizar_lua import InventarioTerrierFile
+from cache_inventario import CacheInventario
+
+
+BLOQUE = 'block ( {0}(x), "Español" ) "Español" ( x )\n'
+
+# El último bloque deja un interpret sin cerrar al final del archivo
+ORIGINAL = (
+    BLOQUE.format('PRIMERO') +
+    '\tinterpret { "a" . A_B() } as { x };\n' +
+    '\n' +
+    BLOQUE.format('ULT') +
+    '\tinterpret { "b" . A_B()\n'
+)
+
+AGREGADO = (
+    BLOQUE.format('NEXT') +
+    '\t} as { x };\n' +
+    BLOQUE.format('OTRO') +
+    '\tinterpret { "c" . C_D() } as { x };\n' +
+    '\n'
+)
+
+
+def _inventario_con_cache(archi, directorio):
+    tf = InventarioTerrierFile(archi, False, False, '', '', inventario=[])
+    return tf, [bloque.a_dict() for bloque in CacheInventario(directorio).inventario(tf)]
+
+
+def _inventario_completo(tf, archi):
+    with open(archi, 'r') as fp:
+        lineas = fp.readlines()
+    return [bloque.a_dict() for bloque in tf.inventariar_segmento(lineas, 1, ultimo=True)]
+
+
+def test_tramo_cortado_al_final_no_se_reutiliza_en_el_medio(tmp_path):
+    archi = str(tmp_path / 'cortado.lua.ter')
+    directorio = str(tmp_path / 'cache')
+    with open(archi, 'w') as fp:
+        fp.write(ORIGINAL)
+    tf, inventario = _inventario_con_cache(archi, directorio)
+    assert inventario == _inventario_completo(tf, archi)
+
+    with open(archi, 'a') as fp:
+        fp.write(AGREGADO)
+    tf, inventario = _inventario_con_cache(archi, directorio)
+    assert inventario == _inventario_completo(tf, archi)
+    assert [bloque['block_name'] for bloque in inventario] == ['PRIMERO(x)', 'ULT(x)', 'OTRO(x)']
+
+
+def test_tramos_sin_cambios_se_reutilizan(tmp_path):
+    archi = str(tmp_path / 'editado.lua.ter')
+    directorio = str(tmp_path / 'cache')
+    texto = ''.join(BLOQUE.format(f'B{nro}') + f'\tinterpret {{ "x" . B{nro + 1}() }} as {{ x }};\n' for nro in range(5))
+    with open(archi, 'w') as fp:
+        fp.write(texto)
+    _inventario_con_cache(archi, directorio)
+
+    # Se edita un bloque del medio y se agregan líneas antes de los siguientes
+    with open(archi, 'w') as fp:
+        fp.write(texto.replace('B3() }', 'B3() . B4() }\n\t--& nueva consulta\n'))
+    tf, inventario = _inventario_con_cache(archi, directorio)
+    assert inventario == _inventario_completo(tf, archi)
@@ -0,0 +1,70 @@
+######################################################################
+# Programa   : test_casos_prueba.py                                  #
+# Descripción: Extracción de los casos de prueba ('tests = {...}')   #
+#              sin cambiar los interprets y queries del inventario.  #
+######################################################################
+import io
+
+from analizar_lua import InventarioTerrierFile
+
+
+def _inventariar(texto):
+    tf = InventarioTerrierFile('prueba.lua.ter', False, False, '', '', inventario=[])
+    tf._inventariar_lineas(io.StringIO(texto))
+    return tf.inventario
+
+
+def _interprets(bloque):
+    return [interpret.raw_string for interpret in bloque.interprets]
+
+
+def test_interprets_y_queries_dentro_del_cuerpo_de_un_test():
+    # Como antes de extraer los tests, los interprets dentro de un [[ ]] se inventarían
+    texto = (
+        'block ( AAA(x), "Español" ) "Español" ( x )\n'
+        '\ttests = {\n'
+        '\t\t{ "q1", [[\n'
+        '--& dentro del test\n'
+        'interpret { "z" . CCC(x) } as { y };\n'
+        '\n'
+        ']] },\n'
+        '\t};\n'
+    )
+    bloque, = _inventariar(texto)
+    assert bloque.queries == ['dentro del test']
+    assert _interprets(bloque) == ['interpret { "z" . CCC(x) } as { y };']
+    assert [interpret.blocks_usados for interpret in bloque.interprets] == [['CCC(x)']]
+    caso, = bloque.tests
+    assert caso.test_input == '"q1"'
+    assert caso.test_expected == '--& dentro del test\ninterpret { "z" . CCC(x) } as { y };\n\n'
+    assert (caso.test_lin_nro.start, caso.test_lin_nro.end) == (3, 7)
+
+
+def test_caso_sin_string_largo_no_se_traga_el_bloque():
+    texto = (
+        'block ( AAA(x), "Español" ) "Español" ( x )\n'
+        '\ttests = { { "q2", "x" }, };\n'
+        '\tinterpret { "b" . CCC(x) } as { x };\n'
+        '\n'
+    )
+    bloque, = _inventariar(texto)
+    assert [interpret.blocks_usados for interpret in bloque.interprets] == [['CCC(x)']]
+    caso, = bloque.tests
+    assert (caso.test_input, caso.test_expected) == ('"q2", "x"', '')
+
+
+def test_tests_en_la_linea_que_consume_un_interpret_de_una_linea():
+    texto = (
+        'block ( AAA(x), "Español" ) "Español" ( x )\n'
+        '\tinterpret { "b" . BBB(x) } as { x };\n'
+        '\ttests = {\n'
+        '\t\t{ "q1", delta_request_info = { a = "}" }, [[\n'
+        'esperado }\n'
+        ']] }, -- cierre }\n'
+        '\t\t{ "q3" }\n'
+        '\t};\n'
+    )
+    bloque, = _inventariar(texto)
+    assert [interpret.blocks_usados for interpret in bloque.interprets] == [['BBB(x)']]
+    assert [(caso.test_input, caso.delta_request_info) for caso in bloque.tests] == [
+        ('"q1", delta_request_info = { a = "}" }', True), ('"q3"', False)]
@@ -0,0 +1,164 @@
+######################################################################
+# Programa   : test_equivalencia_inventario.py                       #
+# Descripción: El inventario con el escáner incremental de           #
+#              interprets, por tramos (-s) y con offsets (--offsets) #
+#              es igual al del recorrido secuencial original, que    #
+#              vuelve a correr el regex del interpret en cada línea. #
+######################################################################
+import io
+import re
+from collections import OrderedDict
+
+import pytest
+
+from analizar_lua import InventarioTerrierFile
+from generar_lua_ter import generar
+
+
+BLOCK = re.compile(r'block\s*\(.*\)\s*\"Español\"\s*[\s\S]*?\)')
+BLK_NAME = re.compile(r'([A-Z0-9]\w+\([\s\S]*?\))')
+INTERPRET = re.compile(r'interpret\s*{([\s\S]*)?}\s*as\s*{[\s\S]*};', re.MULTILINE)
+
+
+def inventario_de_referencia(archi):
+    '''
+    Recorrido secuencial original: el regex del interpret se vuelve a
+    correr sobre el texto acumulado en cada línea. La única diferencia es
+    el fin de archivo con un interpret sin cerrar, dónde el original no
+    terminaba nunca: el interpret se descarta, como hace el inventario.
+    '''
+    inventario = []
+    bloque = None
+    cont_lin = 0
+    with open(archi, 'r') as archivo:
+        linea = archivo.readline()
+        while linea:
+            plin = linea
+            cont_lin = cont_lin + 1
+            sent_blk = BLOCK.search(plin)
+            if sent_blk is not None:
+                if bloque is not None:
+                    bloque['fin'] = cont_lin - 1
+                    inventario.append(bloque)
+                bloque = {'nombre': BLK_NAME.search(sent_blk.group()).group(), 'inicio': cont_lin,
+                          'interprets': [], 'queries': []}
+
+            if '--&' in plin:
+                bloque['queries'].append(plin.strip()[4:])
+
+            if ('interpret' in plin) and (not plin.startswith('--')) and (plin.lstrip().startswith('interpret')):
+                texto_int = plin
+                while True:
+                    plin = archivo.readline()
+                    if plin == '':
+                        break
+                    cont_lin = cont_lin + 1
+                    texto_int = texto_int + plin
+                    if INTERPRET.search(texto_int) is not None:
+                        break
+                int_sent = INTERPRET.search(texto_int)
+                if int_sent is not None:
+                    bloque['interprets'].append((int_sent.group(), int_sent.group(1),
+                                                 list(OrderedDict.fromkeys(BLK_NAME.findall(texto_int)))))
+            linea = archivo.readline()
+
+    if bloque is not None:
+        bloque['fin'] = cont_lin
+        inventario.append(bloque)
+    return inventario
+
+
+def como_referencia(inventario):
+    ''' Lista de Bloque con los mismos campos que inventario_de_referencia() '''
+    return [{'nombre': bloque.block_name, 'inicio': bloque.block_lin_nro.start, 'fin': bloque.block_lin_nro.end,
+             'interprets': [(interpret.raw_string, interpret.terrier_expr, interpret.blocks_usados)
+                            for interpret in bloque.interprets],
+             'queries': bloque.queries}
+            for bloque in inventario]
+
+
+# Un interpret de una sola línea (que consume también la línea siguiente,
+# aquí una query) y al final un interpret sin cerrar
+UNA_LINEA = (
+    'block (<r:R>) "Español" UNA_LINEA(<x:int>) =\n'
+    '{\n'
+    '  interpret { "uno" . BLOQUE_000001(x) } as { r = 1; };\n'
+    '--& query consumida por el interpret\n'
+    '  interpret { "dos" . BLOQUE_000002(x) } as { r = 2; };\n'
+    '}\n'
+)
+# Un 'as {...}' con llaves anidadas en varias líneas y un interpret que
+# contiene una declaración de bloque (queda dentro del interpret)
+MULTILINEA = (
+    'block (<r:R>) "Español" ANIDADO(<x:int>) =\n'
+    '{\n'
+    '  interpret {\n'
+    '    "cuatro" . BLOQUE_000004(x)\n'
+    '  } as { r = { a = 1 }\n'
+    '       , b = 2 };\n'
+    '}\n'
+    'block (<r:R>) "Español" CRUZA(<x:int>) =\n'
+    '{\n'
+    '  interpret {\n'
+    '    "cinco"\n'
+    'block (<r:R>) "Español" DENTRO(<x:int>) =\n'
+    '    . BLOQUE_000005(x)\n'
+    '  } as { r = 5; };\n'
+    '}\n'
+)
+SIN_CERRAR = (
+    'block (<r:R>) "Español" SIN_CERRAR(<x:int>) =\n'
+    '{\n'
+    '--& última query\n'
+    '  interpret {\n'
+    '    "tres" . BLOQUE_000003(x)\n'
+)
+
+
+def _escribir(path, bloques, semilla, extra='', fin_de_linea='\n', **opciones):
+    texto = io.StringIO()
+    generar(texto, bloques, semilla, **opciones)
+    with open(path, 'w', newline=fin_de_linea) as fp:
+        fp.write(texto.getvalue() + extra)
+    return str(path)
+
+
+CASOS = {
+    'generado': dict(bloques=60, semilla=1, comentarios=0.5, tests=1),
+    'largos': dict(bloques=40, semilla=2, largo_interpret=7, interprets=3, queries=2),
+    'una_linea': dict(bloques=10, semilla=3, extra=UNA_LINEA + MULTILINEA),
+    'sin_cerrar': dict(bloques=10, semilla=4, extra=UNA_LINEA + MULTILINEA + SIN_CERRAR),
+    'crlf': dict(bloques=10, semilla=5, extra=UNA_LINEA + MULTILINEA + SIN_CERRAR, fin_de_linea='\r\n'),
+}
+
+
+@pytest.fixture(params=sorted(CASOS))
+def archivo(request, tmp_path):
+    return _escribir(tmp_path / f'{request.param}.lua.ter', **CASOS[request.param])
+
+
+def _inventario(archi, **opciones):
+    tf = InventarioTerrierFile(archi, False, False, '', '', **opciones)
+    return como_referencia(tf.inventario)
+
+
+def test_escaner_incremental(archivo):
+    assert _inventario(archivo) == inventario_de_referencia(archivo)
+
+
+def test_por_tramos(archivo):
+    # Con 8 procesos los tramos son de un bloque: el interpret de CRUZA llega al tramo siguiente
+    assert _inventario(archivo, tramos=8) == inventario_de_referencia(archivo)
+
+
+def test_con_offsets(archivo):
+    assert _inventario(archivo, offsets=True) == inventario_de_referencia(archivo)
+
+
+def test_tramos_procesados_en_paralelo(tmp_path):
+    # Sin CR el archivo se divide de verdad (no se recurre al secuencial)
+    archi = _escribir(tmp_path / 'tramos.lua.ter', bloques=80, semilla=6, extra=UNA_LINEA + SIN_CERRAR)
+    tf = InventarioTerrierFile(archi, False, False, '', '', inventario=[])
+    bloques = tf.inventariar_en_tramos(4)
+    assert bloques is not None
+    assert como_referencia(bloques) == inventario_de_referencia(archi)
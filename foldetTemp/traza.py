@@ -0,0 +1,41 @@
+######################################################################
+# Programa   : traza.py                                              #
+# Descripción: Traza de depuración del inventario de analizar_lua.py #
+#              Cada evento (bloque encontrado, inicio y fin de       #
+#              interpret, query, ...) se graba como una línea JSON   #
+#              con el número de línea del lua.ter, el evento y el    #
+#              bloque en curso.                                      #
+#                                                                    #
+#              Solo existe con -d: el inventario chequea que la      #
+#              traza no sea None antes de armar cualquier evento, así#
+#              que sin -d no se formatea nada por línea.             #
+######################################################################
+import json
+import logging
+
+
+class Traza():
+
+    def __init__(self, archivo):
+        ''' archivo (str) -> archivo JSON Lines donde se graban los eventos '''
+        self.archivo = archivo
+        self.fp = open(archivo, 'w', encoding='utf-8')
+        self.cant_eventos = 0
+
+    def evento(self, linea, evento, bloque=None, **datos):
+        '''
+        linea (int) -> número de línea del lua.ter.
+        evento (str) -> transición del estado del inventario.
+        bloque (str) -> bloque en curso.
+        datos -> campos propios del evento.
+        '''
+        registro = {'linea': linea, 'evento': evento, 'bloque': bloque}
+        registro.update(datos)
+        self.fp.write(json.dumps(registro, ensure_ascii=False) + '\n')
+        self.cant_eventos = self.cant_eventos + 1
+        logging.debug('[%s] %s %s %s', linea, evento, bloque or '', datos or '')
+
+    def cerrar(self):
+        self.fp.close()
+        logging.info(f'✓ Traza de {self.cant_eventos} eventos grabada.')
+        logging.info(f'    * Archivo: {self.archivo}')
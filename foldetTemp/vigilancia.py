@@ -0,0 +1,165 @@
+######################################################################
+# Programa   : vigilancia.py                                         #
+# Descripción: Detección de cambios en los archivos lua.ter para el  #
+#              modo --watch de analizar_lua.py.                      #
+#                                                                    #
+#              En Linux usa inotify (vía ctypes, sin dependencias)   #
+#              sobre los directorios de los archivos, así también se #
+#              detectan los editores que graban en un temporal y     #
+#              renombran. Si inotify no está disponible revisa el    #
+#              tamaño y mtime de los archivos cada cierto intervalo. #
+#                                                                    #
+#              Las ráfagas de grabaciones se agrupan: se espera a    #
+#              que no haya eventos durante 'espera' segundos antes   #
+#              de informar los archivos cambiados.                   #
+######################################################################
+import os
+import time
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+
+
+# Constantes de <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+EVENTO = struct.Struct('iIII')
+
+
+def _firma(archi):
+    ''' (tamaño, mtime) del archivo o None si no existe '''
+    try:
+        stat = os.stat(archi)
+    except FileNotFoundError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+class _Inotify():
+    ''' Eventos de los directorios vigilados. Lanza OSError si inotify no está disponible '''
+
+    def __init__(self, directorios):
+        nombre_libc = ctypes.util.find_library('c')
+        if nombre_libc is None:
+            raise OSError('libc no encontrada')
+        libc = ctypes.CDLL(nombre_libc, use_errno=True)
+        if not hasattr(libc, 'inotify_init1'):
+            raise OSError('inotify no disponible')
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1')
+        self.directorios = {}
+        mascara = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+        for directorio in directorios:
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(directorio), mascara)
+            if wd < 0:
+                os.close(self.fd)
+                raise OSError(ctypes.get_errno(), f'inotify_add_watch {directorio}')
+            self.directorios[wd] = directorio
+
+    def leer(self, timeout):
+        '''
+        Espera hasta 'timeout' segundos (None = sin límite) y retorna el set
+        de paths que tuvieron eventos (vacío si no hubo ninguno).
+        '''
+        listos, _, _ = select.select([self.fd], [], [], timeout)
+        if not listos:
+            return set()
+        paths = set()
+        try:
+            datos = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return paths
+        pos = 0
+        while pos < len(datos):
+            wd, _, _, largo = EVENTO.unpack_from(datos, pos)
+            nombre = datos[pos + EVENTO.size:pos + EVENTO.size + largo].rstrip(b'\0')
+            pos = pos + EVENTO.size + largo
+            paths.add(os.path.join(self.directorios.get(wd, ''), os.fsdecode(nombre)))
+        return paths
+
+    def cerrar(self):
+        os.close(self.fd)
+
+
+class Vigilante():
+
+    def __init__(self, archivos, espera=0.3, intervalo=0.5, usar_inotify=True):
+        '''
+        archivos (list) -> archivos lua.ter a vigilar.
+        espera (float) -> segundos sin eventos que cierran una ráfaga de cambios.
+        intervalo (float) -> segundos entre revisiones cuando no hay inotify.
+        usar_inotify (boolean) -> False fuerza la revisión periódica.
+        '''
+        self.archivos = list(archivos)
+        self.espera = espera
+        self.intervalo = intervalo
+        self.firmas = {archi: _firma(archi) for archi in self.archivos}
+        self._por_path = {os.path.abspath(archi): archi for archi in self.archivos}
+
+        self.inotify = None
+        if usar_inotify:
+            try:
+                self.inotify = _Inotify(sorted(set(os.path.dirname(path) for path in self._por_path)))
+            except (OSError, AttributeError) as error:
+                logging.info(f'    * inotify no disponible ({error}), se revisan los archivos cada {intervalo}s.')
+
+    def _cambiados(self):
+        ''' Archivos cuya firma cambió desde la última vez (y la actualiza) '''
+        cambiados = []
+        for archi in self.archivos:
+            firma = _firma(archi)
+            if firma != self.firmas[archi]:
+                self.firmas[archi] = firma
+                cambiados.append(archi)
+        return cambiados
+
+    def esperar_cambios(self):
+        '''
+        Bloquea hasta que uno o más archivos cambien y la ráfaga de
+        grabaciones termine. Retorna la lista de archivos cambiados
+        (los borrados no se informan hasta que vuelvan a existir).
+        '''
+        while True:
+            if self.inotify is not None:
+                if not self._esperar_eventos():
+                    continue
+            else:
+                time.sleep(self.intervalo)
+                if not any(_firma(archi) != self.firmas[archi] for archi in self.archivos):
+                    continue
+                # Ráfaga: se espera a que las firmas dejen de cambiar
+                anteriores = None
+                actuales = [_firma(archi) for archi in self.archivos]
+                while actuales != anteriores:
+                    time.sleep(self.espera)
+                    anteriores, actuales = actuales, [_firma(archi) for archi in self.archivos]
+
+            cambiados = [archi for archi in self._cambiados() if self.firmas[archi] is not None]
+            if cambiados:
+                return cambiados
+
+    def _esperar_eventos(self):
+        ''' True si hubo eventos sobre los archivos vigilados, una vez terminada la ráfaga '''
+        relevantes = False
+        timeout = None
+        while True:
+            paths = self.inotify.leer(timeout)
+            if not paths:
+                return relevantes
+            if any(os.path.abspath(path) in self._por_path for path in paths):
+                relevantes = True
+            if relevantes:
+                timeout = self.espera
+
+    def cerrar(self):
+        if self.inotify is not None:
+            self.inotify.cerrar()
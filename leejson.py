@@ -1,11 +1,43 @@
 # <import>
-import json
-import csv
+import os
+import sys
 # </import>
 
-with open('inventario.json') as f:
-    data = json.load(f)
-for item in data:
+# Lector de inventarios (json, jsonl, snap o SQLite) de analizar_lua.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'foldetTemp'))
+from inventario_io import leer_inventario, es_base_sqlite, es_snapshot
+# almacen_sqlite (sqlite3) y snapshot_inventario se importan solo para
+# esos formatos
+
+nombre_inventario = sys.argv[1] if len(sys.argv) > 1 else 'inventario.json'
+
+# Con una base SQLite (--db de analizar_lua.py) se consulta por índices
+# solo lo que se lista, sin armar cada bloque completo
+if es_base_sqlite(nombre_inventario):
+    from almacen_sqlite import AlmacenInventario
+    almacen = AlmacenInventario(nombre_inventario)
+    for block_name, blocks_usados, queries in almacen.llamados_primer_interpret():
+        print(block_name)
+        print(len(blocks_usados), blocks_usados)
+        print(len(queries), queries)
+        print()
+    almacen.cerrar()
+    sys.exit(0)
+
+# Con un snapshot binario (-f snap) se leen solo los nombres, bloques
+# llamados y queries: los textos de los interprets no se decodifican
+if es_snapshot(nombre_inventario):
+    from snapshot_inventario import SnapshotInventario
+    with SnapshotInventario(nombre_inventario) as snapshot:
+        for block_name, blocks_usados, queries in snapshot.llamados_primer_interpret():
+            print(block_name)
+            print(len(blocks_usados), blocks_usados)
+            print(len(queries), queries)
+            print()
+    sys.exit(0)
+
+# Se recorre bloque a bloque (con '.jsonl' sin cargar todo el inventario)
+for item in leer_inventario(nombre_inventario):
     print(item["block_name"])
     print(len(item["interprets"][0]["blocks_usados"]),
           item["interprets"][0]["blocks_usados"])
@@ -1,5 +1,10 @@
+import os
+import sys
 import csv
-import json
+
+# Lector de inventarios (json o jsonl) de analizar_lua.py
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'foldetTemp'))
+from inventario_io import leer_inventario, es_base_sqlite
 
 data = '''
 {
@@ -13,34 +18,41 @@ data = '''
 }
 '''
 
-with open('inventario.json') as f:
-  info = json.load(f)
-  # print(len(info))
-  info2 = info[0]
-  # print(info2)
-  # print(len(info2))
-# quit()
+nombre_inventario = sys.argv[1] if len(sys.argv) > 1 else 'inventario.json'
 # info = json.loads(data)['Results']
 
-# for linea in info:
+def bloques_csv(nombre_inventario):
+  ''' Bloques con solo las columnas del csv '''
+  if es_base_sqlite(nombre_inventario):
+    # Consulta por índices de la base SQLite (--db de analizar_lua.py)
+    from almacen_sqlite import AlmacenInventario
+    almacen = AlmacenInventario(nombre_inventario)
+    for block_name, queries in almacen.queries_por_bloque():
+      yield {"block_name": block_name, "queries": queries}
+    almacen.cerrar()
+    return
+  # Las mismas columnas que de la base (el json trae además tests, block_hash, etc.)
+  for linea in leer_inventario(nombre_inventario):
+    yield {"block_name": linea["block_name"], "queries": linea["queries"]}
+
+# Se escribe el csv a medida que se leen los bloques
 lf=[]
-for linea in info:
-  del linea["block_at_file"]
-  del linea["block_lin_nro"]
-  del linea["interprets"]
-  cntq = len(linea["queries"])
-  if cntq > 1:
-    print(cntq)
-  # print(linea["block_name"])
-  # lf.append(linea["block_name"])
-  # lf.append(linea["queries"])
-  print(linea)
+with open("samplecsv.csv", 'w') as f:
+  wr = None
+  for linea in bloques_csv(nombre_inventario):
+    cntq = len(linea["queries"])
+    if cntq > 1:
+      print(cntq)
+    # print(linea["block_name"])
+    # lf.append(linea["block_name"])
+    # lf.append(linea["queries"])
+    print(linea)
 
+    # Escribir csv
+    if wr is None:
+      wr = csv.DictWriter(f, fieldnames = linea.keys())
+      wr.writeheader()
+    wr.writerow(linea)
 
-print(lf)
 
-# Escribir csv
-with open("samplecsv.csv", 'w') as f:
-    wr = csv.DictWriter(f, fieldnames = info[1].keys())
-    wr.writeheader()
-    wr.writerows(info)
+print(lf)